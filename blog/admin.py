@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Post, Category, Comment
+from .models import Post, Category, Comment, PostStats
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -14,7 +14,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'category', 'published', 'featured', 'created_date']
+    list_display = ['title', 'author', 'category', 'published', 'featured', 'active_comment_count', 'created_date']
     list_filter = ['published', 'featured', 'category', 'created_date']
     search_fields = ['title', 'content']
     prepopulated_fields = {'slug': ('title',)}
@@ -41,9 +41,16 @@ class CommentAdmin(admin.ModelAdmin):
     actions = ['make_active', 'make_inactive']
     
     def make_active(self, request, queryset):
-        queryset.update(active=True)
+        queryset.set_active(True)
     make_active.short_description = "Mark selected comments as active"
     
     def make_inactive(self, request, queryset):
-        queryset.update(active=False)
-    make_inactive.short_description = "Mark selected comments as inactive"
\ No newline at end of file
+        queryset.set_active(False)
+    make_inactive.short_description = "Mark selected comments as inactive"
+
+@admin.register(PostStats)
+class PostStatsAdmin(admin.ModelAdmin):
+    list_display = ['post', 'date', 'views']
+    list_filter = ['date']
+    date_hierarchy = 'date'
+    readonly_fields = ['post', 'date', 'views']
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+
+        from . import signals, suggestions  # noqa: F401
+        from .middleware import install_query_timer
+
+        connection_created.connect(install_query_timer, dispatch_uid='blog_query_timer')
+        request_started.connect(suggestions.preload, dispatch_uid='blog_suggestion_preload')
@@ -0,0 +1,88 @@
+"""
+Native async versions of the AJAX endpoints in blog.views.
+
+They return the same JSON, but use the async ORM and cache API, so under
+ASGI a request waiting on the database or cache yields the event loop
+instead of holding a worker thread. blog.urls routes to them when
+BLOG_ASYNC_AJAX is on (the default for myproject.asgi); WSGI deployments
+keep the sync views.
+"""
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_POST
+
+from . import likes
+from .middleware import query_budget
+from .models import Post
+from .pagination import CursorPaginator, InvalidCursor
+from .ratelimit import rate_limit
+from .routers import read_from_replica
+from .suggestions import title_index
+from .views import get_client_ip, post_summary
+
+
+@query_budget(3)
+@require_POST
+@rate_limit('like')
+async def like_post(request, post_id):
+    """AJAX view to like/unlike posts"""
+    if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        raise Http404()
+
+    post = await aget_object_or_404(Post.objects.only('id'), id=post_id, published=True)
+
+    visitor = likes.visitor_id(get_client_ip(request))
+    action, like_count = await likes.atoggle_like(post.id, visitor)
+
+    return JsonResponse({
+        'success': True,
+        'action': action,
+        'likes': like_count
+    })
+
+
+@query_budget(2)
+@rate_limit('search_suggestions')
+@read_from_replica
+async def search_suggestions(request):
+    """AJAX view for search autocomplete"""
+    if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'suggestions': []})
+
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'suggestions': []})
+
+    suggestions = await title_index.asuggest(query, limit=5)
+
+    return JsonResponse({'suggestions': suggestions})
+
+
+@query_budget(2)
+@read_from_replica
+async def load_more_posts(request):
+    """AJAX view for infinite scroll"""
+    if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        raise Http404()
+
+    cursor = request.GET.get('cursor')
+    category_id = request.GET.get('category')
+
+    posts = Post.objects.select_related('author', 'category').filter(published=True)
+
+    if category_id and category_id.isdigit():
+        posts = posts.filter(category_id=category_id)
+
+    paginator = CursorPaginator(posts, 6)
+
+    try:
+        page_obj = await paginator.apage(cursor)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'})
+
+    return JsonResponse({
+        'success': True,
+        'posts': [post_summary(post) for post in page_obj],
+        'has_next': page_obj.has_next(),
+        'next_cursor': page_obj.next_cursor
+    })
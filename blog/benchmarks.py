@@ -0,0 +1,319 @@
+"""
+View-level benchmarks: drive every route in blog/urls.py through the test
+client and record latency percentiles, query counts and peak allocations,
+so runs can be compared against a saved JSON baseline. Also replays the
+AJAX endpoints concurrently through the WSGI (sync views) and ASGI (async
+views) handlers to compare throughput.
+"""
+import asyncio
+import gc
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import ModuleType
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import include, path, reverse
+
+from . import related, search
+from .metrics import percentile
+from .models import Category, Post
+from .pagination import encode_cursor
+from .sampledata import SyntheticData
+from .urls import blog_patterns
+
+SORTS = ('newest', 'oldest', 'popular', 'title')
+SEARCH_TERM = 'django'
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+@contextmanager
+def seeded_test_database(posts, comments_per_post=5, seed=0):
+    """Create a throwaway test database filled with synthetic data; yields (posts, comments, seconds)"""
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+    try:
+        started = time.perf_counter()
+        post_count, comment_count = SyntheticData(
+            posts=posts,
+            comments_per_post=comments_per_post,
+            authors=max(1, posts // 200),
+            categories=20,
+            seed=seed,
+        ).run()
+        if search.is_available():
+            search.rebuild_index()
+        if related.is_available():
+            related.rebuild()
+        yield post_count, comment_count, time.perf_counter() - started
+    finally:
+        # The related-posts model file is named after the (test) database
+        related.index_path().unlink(missing_ok=True)
+        related.index_path().with_suffix('.lock').unlink(missing_ok=True)
+        teardown_databases(old_config, verbosity=0)
+
+
+@contextmanager
+def scratch_cache():
+    """
+    Point the shared cache at a throwaway SQLite file for the duration, so
+    benchmarks can clear and fill it without touching the live cache.
+    Worker processes forked inside the block share the scratch file.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        shared = {
+            'BACKEND': 'blog.cache_backends.InstrumentedSQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'CLEANUP_INTERVAL': 0},
+        }
+        with override_settings(CACHES={**settings.CACHES, 'shared': shared}):
+            try:
+                yield
+            finally:
+                caches['shared'].close()
+
+
+@contextmanager
+def quiet_metrics_log():
+    """Keep benchmark traffic out of the request metrics log"""
+    metrics_logger = logging.getLogger('blog.metrics')
+    disabled, metrics_logger.disabled = metrics_logger.disabled, True
+    try:
+        yield
+    finally:
+        metrics_logger.disabled = disabled
+
+
+def deep_cursor(posts, depth=600):
+    """Load-more cursor about ``depth`` posts into a newest-first list (halfway into shorter lists)"""
+    post = posts.order_by('-created_date', '-id')[min(depth, posts.count() // 2)]
+    return encode_cursor(post.created_date, post.pk)
+
+
+def build_routes():
+    """[(name, method, path, headers)] covering every view, from the data currently in the database"""
+    published = Post.objects.filter(published=True)
+    newest = published.select_related('author').order_by('-created_date').first()
+    if newest is None:
+        raise ValueError('No published posts to benchmark')
+    busiest = published.order_by('-active_comment_count', '-created_date').first()
+    category = Category.objects.annotate(
+        posts=Count('post', filter=Q(post__published=True))
+    ).order_by('-posts').first()
+    year, month = newest.created_date.year, newest.created_date.month
+
+    home = reverse('blog:home')
+    routes = []
+    for category_query in ('', f'category={category.id}&'):
+        label = 'category ' if category_query else ''
+        for sort in SORTS:
+            routes.append((f'home {label}{sort}', 'get', f'{home}?{category_query}sort={sort}', {}))
+            routes.append((
+                f'home {label}search {sort}', 'get',
+                f'{home}?{category_query}search={SEARCH_TERM}&sort={sort}', {},
+            ))
+        routes.append((
+            f'home {label}search relevance', 'get',
+            f'{home}?{category_query}search={SEARCH_TERM}&sort=relevance', {},
+        ))
+    routes.append(('home page 2', 'get', f'{home}?page=2', {}))
+    routes.append(('home cursor', 'get', f'{home}?cursor=', {}))
+
+    category_url = reverse('blog:category_posts', args=[category.id])
+    routes += [(f'category {sort}', 'get', f'{category_url}?sort={sort}', {}) for sort in SORTS]
+    load_more = reverse('blog:load_more_posts')
+    routes += [
+        ('post_detail', 'get', newest.get_absolute_url(), {}),
+        ('post_detail busiest', 'get', busiest.get_absolute_url(), {}),
+        ('about', 'get', reverse('blog:about'), {}),
+        ('author_posts', 'get', reverse('blog:author_posts', args=[newest.author.username]), {}),
+        ('archive_year', 'get', reverse('blog:archive_year', args=[year]), {}),
+        ('archive_month', 'get', reverse('blog:archive_month', args=[year, month]), {}),
+        ('archive_calendar', 'get', reverse('blog:archive_calendar'), {}),
+        ('like_post', 'post', reverse('blog:like_post', args=[newest.id]), AJAX),
+        ('search_suggestions', 'get', f'{reverse("blog:search_suggestions")}?q={SEARCH_TERM[:3]}', AJAX),
+        ('load_more_posts', 'get', f'{load_more}?cursor={deep_cursor(published)}', AJAX),
+        ('load_more_posts category', 'get',
+         f'{load_more}?cursor={deep_cursor(published.filter(category=category))}&category={category.id}', AJAX),
+    ]
+    return routes
+
+
+class QueryCounter:
+    """Execute wrapper that only counts; cheaper than logging every query"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, method, path, requests, headers=None):
+    """Latency, query and memory figures for one route"""
+    def send(path):
+        return getattr(client, method)(path, **(headers or {}))
+
+    cache.clear()
+    cold = QueryCounter()
+    with connection.execute_wrapper(cold):
+        response = send(path)
+    send(path)  # warm templates and caches
+
+    gc.collect()  # don't bill the previous route's garbage to this one
+    timings, queries = [], []
+    for _ in range(requests):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            send(path)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+
+    # Traced separately, tracemalloc slows every allocation down
+    tracemalloc.start()
+    try:
+        send(path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+        'cold_queries': cold.count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run(requests=30, routes=None, progress=None):
+    """{route name: figures} for every route"""
+    client = Client()
+    with quiet_metrics_log():
+        results = {}
+        for name, method, path, headers in routes or build_routes():
+            results[name] = dict(measure(client, method, path, requests, headers), path=path)
+            if progress:
+                progress(name, results[name])
+        return results
+
+
+def compare(results, baseline, threshold=0.5, min_ms=5.0):
+    """
+    Regressions against a baseline: any extra query, p50 latency or peak
+    memory more than ``threshold`` above it, or p95 latency (noisier) more
+    than twice that. Latency must also grow by at least ``min_ms`` so timer
+    noise on fast routes is not reported.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['status'] != before['status']:
+            regressions.append(f'{name}: status {before["status"]} -> {current["status"]}')
+        for key in ('queries', 'cold_queries'):
+            if current[key] > before[key]:
+                regressions.append(f'{name}: {key} {before[key]} -> {current[key]}')
+        for key, allowed in (('p50_ms', threshold), ('p95_ms', 2 * threshold)):
+            now, then = current[key], before[key]
+            if now > then * (1 + allowed) and now - then >= min_ms:
+                regressions.append(f'{name}: {key[:3]} {then:.1f} ms -> {now:.1f} ms')
+        if current['peak_kb'] > before['peak_kb'] * (1 + threshold):
+            regressions.append(f'{name}: peak memory {before["peak_kb"]:.0f} KB -> {current["peak_kb"]:.0f} KB')
+    return regressions
+
+
+# Sync vs async AJAX endpoints
+
+AJAX_ENDPOINTS = ('like_post', 'search_suggestions', 'load_more_posts')
+
+
+def ajax_urlconf(views_module):
+    """ROOT_URLCONF stand-in serving the blog with the AJAX endpoints from ``views_module``"""
+    urlconf = ModuleType(f'{views_module.__name__}_urls')
+    urlconf.urlpatterns = [path('', include((blog_patterns(views_module), 'blog')))]
+    return urlconf
+
+
+def ajax_requests(endpoint, count, post_ids, prefixes):
+    """[(method, path, headers)] for ``count`` requests to one AJAX endpoint"""
+    requests = []
+    for n in range(count):
+        # A distinct forwarded address per request, so likes never contend on one visitor
+        headers = {
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-Forwarded-For': f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}',
+        }
+        if endpoint == 'like_post':
+            requests.append(('post', reverse('blog:like_post', args=[post_ids[n % len(post_ids)]]), headers))
+        elif endpoint == 'search_suggestions':
+            query = prefixes[n % len(prefixes)]
+            requests.append(('get', f'{reverse("blog:search_suggestions")}?{urlencode({"q": query})}', headers))
+        else:
+            requests.append(('get', reverse('blog:load_more_posts'), headers))
+    return requests
+
+
+def run_sync(requests, concurrency):
+    """Send requests through the WSGI handler from ``concurrency`` threads; returns (seconds, [(status, ms)])"""
+    results = []
+
+    def worker(batch):
+        client = Client()
+        try:
+            for method, path, headers in batch:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, headers=headers)
+                results.append((response.status_code, (time.perf_counter() - started) * 1000))
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, [requests[i::concurrency] for i in range(concurrency)]))
+    return time.perf_counter() - started, results
+
+
+def run_async(requests, concurrency):
+    """Send requests through the ASGI handler from ``concurrency`` tasks on one event loop"""
+    async def main():
+        client = AsyncClient()
+        results = []
+
+        async def worker(batch):
+            for method, path, headers in batch:
+                started = time.perf_counter()
+                response = await getattr(client, method)(path, headers=headers)
+                results.append((response.status_code, (time.perf_counter() - started) * 1000))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(requests[i::concurrency]) for i in range(concurrency)))
+        return time.perf_counter() - started, results
+
+    return asyncio.run(main())
+
+
+def summarize_run(seconds, results):
+    timings = [ms for _, ms in results]
+    return {
+        'requests': len(results),
+        'rps': len(results) / seconds if seconds else 0,
+        'p50_ms': percentile(timings, 0.5) if timings else 0,
+        'p99_ms': percentile(timings, 0.99) if timings else 0,
+        'errors': sum(1 for status, _ in results if status != 200),
+    }
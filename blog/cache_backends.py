@@ -0,0 +1,510 @@
+import os
+import pickle
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+_missing = object()
+
+# SQLiteCache state lives here, not on the backend: Django creates a backend
+# instance per thread and per async task, all of which share one connection
+# per thread, one schema check and one cleanup thread per (pid, path)
+_sqlite_local = threading.local()
+_sqlite_lock = threading.Lock()
+_sqlite_schemas = set()
+_sqlite_cleaners = {}
+
+# TieredCache local tiers by LOCATION, like LocMemCache's module-level stores,
+# so every thread and async task in a process shares one tier per alias
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class CacheMetricsMixin:
+    """Counts cache hits and misses for the request metrics middleware"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version=version)
+        if value is _missing:
+            metrics.record_cache(misses=1)
+            return default
+        metrics.record_cache(hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        metrics.record_cache(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+
+class AtomicAsyncMixin:
+    """
+    BaseCache.aincr() is an aget() followed by an aset(): concurrent calls
+    lose updates, and the set resets the key's timeout to the default. Run
+    the backend's own atomic incr() and add() in a worker thread instead.
+    """
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.add, thread_sensitive=True)(key, value, timeout, version)
+
+    async def aincr(self, key, delta=1, version=None):
+        return await sync_to_async(self.incr, thread_sensitive=True)(key, delta, version)
+
+    async def adecr(self, key, delta=1, version=None):
+        return await self.aincr(key, -delta, version=version)
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, AtomicAsyncMixin, LocMemCache):
+    pass
+
+
+class SQLiteCache(AtomicAsyncMixin, BaseCache):
+    """
+    Cache shared by every process on the host, stored in a SQLite file
+    (LOCATION) in WAL mode, so readers never block the writer.
+
+    Integers are stored as SQLite integers and everything else pickled, so
+    ``incr`` is a single atomic UPDATE ... RETURNING (SQLite 3.35+) and
+    ``add`` a single upsert that only replaces expired rows. Expired rows
+    are ignored on read and deleted by a background thread every
+    OPTIONS['CLEANUP_INTERVAL'] seconds, which also culls the entries
+    closest to expiry once there are more than MAX_ENTRIES.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+        options = params.get('OPTIONS', {})
+        self.cleanup_interval = options.get('CLEANUP_INTERVAL', 60)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+
+    # Connections: one per thread (shared by every instance), released after each request
+
+    def _connection(self):
+        connections = getattr(_sqlite_local, 'connections', None)
+        if connections is None:
+            connections = _sqlite_local.connections = {}
+        key = (os.getpid(), self.path)
+        connection = connections.get(key)
+        if connection is None:
+            connection = connections[key] = _connect(self.path, self.busy_timeout)
+            self._ensure_cleaner()
+        return connection
+
+    def close(self, **kwargs):
+        """Release the current thread's connection; Django calls this after every request"""
+        connections = getattr(_sqlite_local, 'connections', {})
+        connection = connections.pop((os.getpid(), self.path), None)
+        if connection is not None:
+            connection.close()
+
+    # Values
+
+    @staticmethod
+    def _encode(value):
+        # Plain ints stay native so incr() can run in SQL; bools are pickled
+        return value if type(value) is int else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({", ".join("?" * len(keys))}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time()),
+        ).fetchall()
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._encode(value), expires),
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        # Inserts, or takes over a row that has expired but not been cleaned up yet
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._encode(value), self.get_backend_timeout(timeout), now),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'UPDATE cache SET value = value + ? WHERE key = ? AND typeof(value) = \'integer\' '
+            'AND (expires IS NULL OR expires > ?) RETURNING value',
+            (delta, key, time.time()),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({", ".join("?" * len(keys))})', keys
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    # Expiry
+
+    def cleanup(self):
+        """Delete expired rows, then cull down to MAX_ENTRIES; returns the rows removed"""
+        return _cleanup(self._connection(), self._max_entries, self._cull_frequency)
+
+    def _ensure_cleaner(self):
+        if not self.cleanup_interval:
+            return
+        key = (os.getpid(), self.path)
+        with _sqlite_lock:
+            if key in _sqlite_cleaners:
+                return
+            # Only plain values are passed, so the thread keeps no backend instance alive
+            _sqlite_cleaners[key] = thread = threading.Thread(
+                target=_clean_forever,
+                args=(self.path, self.busy_timeout, self.cleanup_interval, self._max_entries, self._cull_frequency),
+                name='sqlite-cache-cleanup',
+                daemon=True,
+            )
+        thread.start()
+
+
+def _connect(path, busy_timeout):
+    key = (os.getpid(), path)
+    with _sqlite_lock:
+        if key not in _sqlite_schemas:
+            _create_schema(path, busy_timeout)
+            _sqlite_schemas.add(key)
+    connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+def _create_schema(path, busy_timeout):
+    """Create the file and table once per process (WAL mode is stored in the file)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with closing(sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)) as connection:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache '
+            '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+
+
+def _cleanup(connection, max_entries, cull_frequency):
+    removed = connection.execute(
+        'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),)
+    ).rowcount
+    count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+    if count > max_entries:
+        # Like LocMemCache, drop 1/CULL_FREQUENCY of the entries, soonest to expire first
+        cull = count // cull_frequency if cull_frequency else count
+        removed += connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)', (max(cull, count - max_entries),)
+        ).rowcount
+    return removed
+
+
+def _clean_forever(path, busy_timeout, interval, max_entries, cull_frequency):
+    while True:
+        # Jittered so the workers on a host don't all clean at once
+        time.sleep(interval * random.uniform(0.5, 1.5))
+        try:
+            with closing(_connect(path, busy_timeout)) as connection:
+                _cleanup(connection, max_entries, cull_frequency)
+        except sqlite3.Error:
+            pass  # busy or locked; the next pass will catch up
+
+
+def _reset_sqlite_after_fork():
+    # Another thread may have held the lock at fork time; (pid, path) keys keep the rest apart
+    global _sqlite_lock
+    _sqlite_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_sqlite_after_fork)
+
+
+class InstrumentedSQLiteCache(CacheMetricsMixin, SQLiteCache):
+    pass
+
+
+class LocalTier:
+    """Thread-safe LRU of live objects with a per-entry expiry"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _missing
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _missing
+            self._entries.move_to_end(key)
+            return value
+
+    def record(self, hits=0, misses=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            if timeout <= 0:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache(AtomicAsyncMixin, BaseCache):
+    """
+    Per-process LRU in front of another configured cache (OPTIONS['SHARED']).
+    Instances with the same LOCATION share one local tier, so all threads
+    and async tasks of a process see the same entries.
+
+    Only keys matching OPTIONS['LOCAL_KEY_PATTERN'] are kept locally, as the
+    objects themselves, so a local hit costs no round-trip and no unpickling.
+    Those must be keys whose value never changes under the same name, such
+    as the generation-tagged blocks from blog.caching: invalidating a tag
+    changes the key, and the generation keys themselves are always read from
+    the shared cache, so no worker serves an invalidated block. Rewrites of
+    the same key by other workers (early refreshes) show up once the local
+    copy expires after OPTIONS['LOCAL_TIMEOUT'] seconds. Everything else,
+    counters and locks in particular, goes straight to the shared cache.
+
+    Locally cached values are shared between threads, so callers must treat
+    them as read-only.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared = caches[options.get('SHARED', 'shared')]
+        pattern = options.get('LOCAL_KEY_PATTERN')
+        self.local_keys = re.compile(pattern) if pattern else None
+        with _local_tiers_lock:
+            self.local = _local_tiers.get(location)
+            if self.local is None:
+                self.local = _local_tiers[location] = LocalTier(
+                    max_entries=options.get('LOCAL_MAX_ENTRIES', 256),
+                    timeout=options.get('LOCAL_TIMEOUT', 60),
+                )
+
+    def _local_key(self, key, version):
+        """Key in the local tier, or None for keys that bypass it"""
+        if self.local_keys is None or not self.local_keys.match(key):
+            return None
+        return self.shared.make_key(key, version)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        return self.local.timeout if timeout is None else timeout
+
+    def _record_local(self, hits=0, misses=0):
+        self.local.record(hits, misses)
+        metrics.record_cache(hits=hits, local_hits=hits, local_misses=misses)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return self.shared.get(key, default, version=version)
+        value = self.local.get(local_key)
+        if value is not _missing:
+            self._record_local(hits=1)
+            return value
+        self._record_local(misses=1)
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        self.local.set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remote = {}, []
+        for key in keys:
+            local_key = self._local_key(key, version)
+            value = self.local.get(local_key) if local_key else _missing
+            if value is _missing:
+                remote.append((key, local_key))
+            else:
+                found[key] = value
+        self._record_local(hits=len(found), misses=sum(1 for _, local_key in remote if local_key))
+        if remote:
+            fetched = self.shared.get_many([key for key, _ in remote], version=version)
+            for key, local_key in remote:
+                if key in fetched and local_key:
+                    self.local.set(local_key, fetched[key])
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if local_key:
+            self.local.set(local_key, value, self._local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if local_key:
+            if added:
+                self.local.set(local_key, value, self._local_timeout(timeout))
+            else:
+                self.local.discard(local_key)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            if local_key and key not in failed:
+                self.local.set(local_key, value, self._local_timeout(timeout))
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._discard(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._discard(key, version)
+        return self.shared.decr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self._discard(key, version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._discard(key, version)
+        return self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if local_key and self.local.get(local_key) is not _missing:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        return self.shared.clear()
+
+    def close(self, **kwargs):
+        return self.shared.close(**kwargs)
+
+    def _discard(self, key, version):
+        local_key = self._local_key(key, version)
+        if local_key:
+            self.local.discard(local_key)
+
+    def stats(self):
+        """Hit ratios of the local tier for this process"""
+        hits, misses = self.local.hits, self.local.misses
+        lookups = hits + misses
+        return {
+            'entries': len(self.local),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
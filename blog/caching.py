@@ -0,0 +1,124 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import routers
+
+# Generation counters: every cache entry built from a tag embeds the tag's
+# current generation in its key, so bumping the generation makes all of
+# those entries unreachable at once without having to find and delete them.
+GENERATION_KEY = 'cache_generation_{}'
+
+# Tags used by the blog views
+POSTS = 'posts'
+CATEGORIES = 'categories'
+COMMENTS = 'comments'
+SEARCH = 'search'
+
+
+def _new_generation():
+    # Time-based seed so a generation lost to eviction is never reused
+    return time.time_ns() // 1000
+
+
+def get_generations(tags):
+    keys = {tag: GENERATION_KEY.format(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    generations = {}
+    for tag, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            generation = _new_generation()
+            if not cache.add(key, generation, None):
+                generation = cache.get(key, generation)
+        generations[tag] = generation
+    return generations
+
+
+def tagged_key(name, tags):
+    """Cache key for ``name`` that changes whenever one of ``tags`` is invalidated"""
+    generations = get_generations(sorted(tags))
+    suffix = '.'.join(f'{tag}{generations[tag]}' for tag in sorted(tags))
+    return f'{name}:{suffix}'
+
+
+def invalidate(*tags):
+    """Bump the generation of every tag, orphaning entries built from it"""
+    for tag in tags:
+        key = GENERATION_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def get_or_compute(name, tags, compute, timeout=None, beta=1.0):
+    """
+    Return the cached value for ``name``, computing it at most once at a time.
+
+    * Single flight: on a miss only the worker that wins ``cache.add`` on a
+      lock key runs ``compute``; the others wait for its result.
+    * Early recomputation: each read may refresh the value shortly before it
+      expires, with a probability that grows as expiry approaches and with
+      how long ``compute`` took last time ("XFetch", scaled by ``beta``).
+    * Stale while revalidate: entries outlive their timeout by a grace
+      period, so readers keep getting the old value while one worker
+      recomputes it.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'BLOG_CACHE_TIMEOUT', 60 * 60 * 24)
+    key = tagged_key(name, tags)
+    lock_key = f'{key}:lock'
+    lock_timeout = getattr(settings, 'BLOG_CACHE_LOCK_TIMEOUT', 30)
+    grace = getattr(settings, 'BLOG_CACHE_STALE_GRACE', 5 * 60)
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, compute_seconds, expires_at = entry
+        # -log(U) for U in (0, 1] is an exponential sample around 1
+        early = compute_seconds * beta * -math.log(1.0 - random.random())
+        if time.time() + early < expires_at:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value  # someone else is already refreshing it
+        try:
+            # Another worker may have refreshed it just before we took the lock
+            entry = cache.get(key)
+            if entry is not None and entry[2] > expires_at:
+                return entry[0]
+            return _compute_and_store(key, compute, timeout, grace)
+        finally:
+            cache.delete(lock_key)
+
+    # Cold miss: nothing stale to serve, so losers wait for the winner
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, lock_timeout):
+        if time.monotonic() > deadline:
+            return _compute_and_store(key, compute, timeout, grace)
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    try:
+        # It may have been stored between our miss and taking the lock
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        return _compute_and_store(key, compute, timeout, grace)
+    finally:
+        cache.delete(lock_key)
+
+
+def _compute_and_store(key, compute, timeout, grace):
+    # Shared entries outlive the request, so build them from the primary: a
+    # lagging replica would cache pre-invalidation data under the new generation
+    with routers.primary():
+        started = time.perf_counter()
+        value = compute()
+        compute_seconds = time.perf_counter() - started
+        # Lazy querysets are evaluated when pickled, so store inside the block too
+        cache.set(key, (value, compute_seconds, time.time() + timeout), timeout + grace)
+    return value
@@ -0,0 +1,36 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import caching, metrics
+from .models import Post
+from .views import get_categories_with_counts, get_site_stats
+
+
+def get_latest_posts():
+    return list(
+        Post.objects.filter(published=True).order_by('-created_date').only('title', 'slug', 'created_date')[:5]
+    )
+
+
+def lazy_block(name, tags, compute):
+    """A cached block that is only looked up once a template reads it"""
+    def load():
+        # Filled once for every page on the site, so not charged to whichever view gets there first
+        with metrics.outside_budget():
+            return caching.get_or_compute(name, tags, compute)
+    return SimpleLazyObject(load)
+
+
+def site_chrome(request):
+    """
+    Footer data for every page: ``site.categories``, ``site.latest_posts``
+    and ``site.stats``, each shared with the views that show it in full.
+    """
+    return {'site': {
+        'categories': lazy_block(
+            'categories_with_counts', [caching.POSTS, caching.CATEGORIES], get_categories_with_counts
+        ),
+        'latest_posts': lazy_block('latest_posts', [caching.POSTS], get_latest_posts),
+        'stats': lazy_block(
+            'site_stats', [caching.POSTS, caching.CATEGORIES, caching.COMMENTS], get_site_stats
+        ),
+    }}
@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class DeltaBuffer:
+    """
+    Per-process write-behind buffer for counters.
+
+    Requests only add to an in-memory dict; a daemon thread hands the
+    aggregated deltas to ``flush_func`` every ``interval`` seconds (or sooner
+    once ``max_pending`` keys are waiting). Deltas are applied with relative
+    UPDATEs, so any number of worker processes can flush independently.
+    """
+
+    def __init__(self, name, flush_func, interval=10, max_pending=1000):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+        self._database = None
+        self._thread = None
+        self.flushed_batches = 0
+        self.flushed_keys = 0
+        atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def add(self, key, delta=1):
+        if self._add(key, delta) >= self.max_pending:
+            self.flush()
+
+    async def aadd(self, key, delta=1):
+        """add() for async code; an overflow flush runs in a worker thread"""
+        if self._add(key, delta) >= self.max_pending:
+            await sync_to_async(self.flush)()
+
+    def _add(self, key, delta):
+        with self._lock:
+            if not self._deltas:
+                self._database = self._current_database()
+            self._deltas[key] += delta
+            pending = len(self._deltas)
+        self._ensure_thread()
+        return pending
+
+    def pending(self, key=None):
+        with self._lock:
+            if key is None:
+                return dict(self._deltas)
+            return self._deltas.get(key, 0)
+
+    def flush(self):
+        """Write all pending deltas; on failure they are kept for the next attempt"""
+        with self._lock:
+            deltas = {key: delta for key, delta in self._deltas.items() if delta}
+            self._deltas = defaultdict(int)
+        if not deltas:
+            return 0
+        if self._database != self._current_database():
+            # e.g. the exit flush after a test run, once the test database is gone
+            logger.warning('Dropping %d %s counters recorded against another database',
+                           len(deltas), self.name)
+            return 0
+        try:
+            self.flush_func(deltas)
+        except Exception:
+            logger.exception('Flushing %s counters failed; retrying later', self.name)
+            with self._lock:
+                for key, delta in deltas.items():
+                    self._deltas[key] += delta
+            return 0
+        self.flushed_batches += 1
+        self.flushed_keys += len(deltas)
+        return len(deltas)
+
+    @staticmethod
+    def _current_database():
+        return connections['default'].settings_dict['NAME']
+
+    def _ensure_thread(self):
+        if self.interval and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name=f'{self.name}-flusher', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            # Don't keep this thread's database connection open between flushes
+            connections.close_all()
+
+    def _reset_after_fork(self):
+        # The parent flushes its own deltas; the child must not flush them again
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+        self._thread = None
+
+
+class CachedCounter:
+    """
+    Shared running total kept in the cache and updated with atomic incr.
+
+    ``load`` returns the authoritative value (database plus anything still
+    buffered) and is only called when the cache key is missing. It can only
+    see this process's buffer, so a total reloaded while other workers hold
+    unflushed deltas falls short; flush functions call forget() for what
+    they wrote, so such a total is reloaded within one flush interval.
+    """
+
+    def __init__(self, key_format, load, timeout=60 * 60 * 24):
+        self.key_format = key_format
+        self.load = load
+        self.timeout = timeout
+
+    def get(self, obj_id):
+        key = self.key_format.format(obj_id)
+        value = cache.get(key)
+        if value is None:
+            value = self.load(obj_id)
+            # add() so a concurrently incremented value is never overwritten
+            if not cache.add(key, value, self.timeout):
+                value = cache.get(key, value)
+        return value
+
+    def forget(self, obj_ids):
+        """Drop the cached totals of ``obj_ids`` so the next read reloads them"""
+        cache.delete_many([self.key_format.format(obj_id) for obj_id in obj_ids])
+
+    def incr(self, obj_id, delta=1):
+        """Call after buffering the delta, so a cold load already includes it"""
+        key = self.key_format.format(obj_id)
+        try:
+            return max(0, cache.incr(key, delta))
+        except ValueError:
+            value = self.load(obj_id)
+            if cache.add(key, value, self.timeout):
+                return value
+            return max(0, cache.incr(key, delta))
+
+    # Async variants; ``load`` hits the database, so it runs in a worker thread
+
+    async def aget(self, obj_id):
+        key = self.key_format.format(obj_id)
+        value = await cache.aget(key)
+        if value is None:
+            value = await sync_to_async(self.load)(obj_id)
+            if not await cache.aadd(key, value, self.timeout):
+                value = await cache.aget(key, value)
+        return value
+
+    async def aincr(self, obj_id, delta=1):
+        key = self.key_format.format(obj_id)
+        try:
+            return max(0, await cache.aincr(key, delta))
+        except ValueError:
+            value = await sync_to_async(self.load)(obj_id)
+            if await cache.aadd(key, value, self.timeout):
+                return value
+            return max(0, await cache.aincr(key, delta))
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
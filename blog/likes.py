@@ -0,0 +1,114 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from . import trending
+from .counters import CachedCounter, DeltaBuffer, chunked
+from .models import PostLikeCount
+
+# One key per visitor holding the ids of every post they like
+VISITOR_KEY = 'post_likes_visitor_{}'
+
+
+def flush_like_deltas(deltas):
+    """Apply {post_id: delta} to PostLikeCount with one UPDATE per batch"""
+    with transaction.atomic():
+        for batch in chunked(sorted(deltas.items()), 200):
+            post_ids = [post_id for post_id, _ in batch]
+            PostLikeCount.objects.bulk_create(
+                [PostLikeCount(post_id=post_id) for post_id in post_ids],
+                ignore_conflicts=True,
+            )
+            delta = Case(
+                *[When(post_id=post_id, then=Value(d)) for post_id, d in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            PostLikeCount.objects.filter(post_id__in=post_ids).update(
+                count=Greatest(F('count') + delta, Value(0))
+            )
+        # Reload the totals, which may be missing other workers' unflushed likes
+        transaction.on_commit(lambda: like_counter.forget(deltas))
+
+
+like_buffer = DeltaBuffer(
+    'likes',
+    flush_like_deltas,
+    interval=getattr(settings, 'BLOG_COUNTER_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'BLOG_COUNTER_MAX_PENDING', 1000),
+)
+
+
+def visitor_id(ip):
+    """Short stable digest so raw IP addresses never end up in cache keys"""
+    return hashlib.blake2b((ip or '').encode(), digest_size=8).hexdigest()
+
+
+def _stored_count(post_id):
+    stored = PostLikeCount.objects.filter(post_id=post_id).values_list('count', flat=True).first()
+    return max(0, (stored or 0) + like_buffer.pending(post_id))
+
+
+like_counter = CachedCounter('post_likes_{}', _stored_count)
+
+
+def get_like_count(post_id):
+    """Current total: shared cache first, then the database plus unflushed likes"""
+    return like_counter.get(post_id)
+
+
+def toggle_like(post_id, visitor):
+    """Like or unlike a post for one visitor; returns (action, like_count)"""
+    visitor_key = VISITOR_KEY.format(visitor)
+    lock_key = f'{visitor_key}_lock'
+    if not cache.add(lock_key, 1, 5):
+        # Another request from this visitor is mid-toggle; treat as a double click
+        liked = post_id in cache.get(visitor_key, ())
+        return ('liked' if liked else 'unliked'), like_counter.get(post_id)
+
+    try:
+        liked_posts = set(cache.get(visitor_key, ()))
+        if post_id in liked_posts:
+            liked_posts.discard(post_id)
+            action, delta = 'unliked', -1
+        else:
+            liked_posts.add(post_id)
+            action, delta = 'liked', 1
+        cache.set(visitor_key, liked_posts, getattr(settings, 'BLOG_LIKE_DEDUP_TTL', 60 * 60 * 24 * 30))
+    finally:
+        cache.delete(lock_key)
+
+    like_buffer.add(post_id, delta)
+    if delta > 0:
+        trending.record(post_id, 'like')
+    return action, like_counter.incr(post_id, delta)
+
+
+async def atoggle_like(post_id, visitor):
+    """toggle_like() for async views, using the async cache API"""
+    visitor_key = VISITOR_KEY.format(visitor)
+    lock_key = f'{visitor_key}_lock'
+    if not await cache.aadd(lock_key, 1, 5):
+        liked = post_id in await cache.aget(visitor_key, ())
+        return ('liked' if liked else 'unliked'), await like_counter.aget(post_id)
+
+    try:
+        liked_posts = set(await cache.aget(visitor_key, ()))
+        if post_id in liked_posts:
+            liked_posts.discard(post_id)
+            action, delta = 'unliked', -1
+        else:
+            liked_posts.add(post_id)
+            action, delta = 'liked', 1
+        await cache.aset(visitor_key, liked_posts, getattr(settings, 'BLOG_LIKE_DEDUP_TTL', 60 * 60 * 24 * 30))
+    finally:
+        await cache.adelete(lock_key)
+
+    await like_buffer.aadd(post_id, delta)
+    if delta > 0:
+        await trending.arecord(post_id, 'like')
+    return action, await like_counter.aincr(post_id, delta)
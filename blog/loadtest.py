@@ -0,0 +1,230 @@
+"""
+Local multi-process load testing of the WSGI application.
+
+``start_workers`` binds one listening socket and forks N processes that each
+serve ``myproject.wsgi.application`` from it one request at a time (like a
+pre-fork server with sync workers). ``run_load`` replays a weighted traffic
+mix against them from a pool of client threads. Every worker has its own
+database connection, per-process cache tier and counter buffers, and they
+share one SQLite cache tier (a scratch file when run from the ``loadtest``
+command), so lock contention and per-process cache effects show up as they
+would in production.
+"""
+import http.client
+import multiprocessing
+import random
+import signal
+import socket
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from .likes import like_buffer
+from .metrics import percentile
+from .models import Post
+from .pagination import encode_cursor
+from .stats import view_buffer
+from .trending import trending_buffer
+
+HOST = '127.0.0.1'
+DEFAULT_MIX = 'home=70,post_detail=20,like=5,suggest=5'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(listener):
+    # No rate limits: a few client threads stand in for many visitors
+    override_settings(
+        DEBUG=False, ALLOWED_HOSTS=[HOST], BLOG_QUERY_BUDGET_RAISE=False, BLOG_RATE_LIMITS={}
+    ).enable()
+    from myproject.wsgi import application
+
+    server = WSGIServer((HOST, 0), QuietHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name, server.server_port = listener.getsockname()
+    server.setup_environ()
+    server.set_app(application)
+    # Finish the current request on SIGTERM; shutdown() has to come from another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    finally:
+        # multiprocessing children skip atexit, so flush the counter buffers here
+        like_buffer.flush()
+        view_buffer.flush()
+        trending_buffer.flush()
+        connections.close_all()
+
+
+def start_workers(count):
+    """Fork ``count`` server processes sharing one socket; returns (processes, port)"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, 0))
+    listener.listen(256)
+    # Children must open their own database connections
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_serve, args=(listener,), daemon=True) for _ in range(count)]
+    for process in processes:
+        process.start()
+    port = listener.getsockname()[1]
+    listener.close()
+    return processes, port
+
+
+def stop_workers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+
+def parse_mix(text):
+    """'home=70,post_detail=20' -> [('home', 70.0), ('post_detail', 20.0)]"""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in REQUESTS:
+            raise ValueError(f'Unknown request type {name.strip()!r}; choose from {", ".join(REQUESTS)}')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+class Targets:
+    """Posts and prefixes the traffic is spread over, read once before forking"""
+
+    def __init__(self, posts=50):
+        rows = list(
+            Post.objects.filter(published=True).order_by('-created_date').values_list('id', 'slug', 'title')[:posts]
+        )
+        if not rows:
+            raise ValueError('No published posts to load test')
+        self.post_ids = [row[0] for row in rows]
+        self.slugs = [row[1] for row in rows]
+        self.prefixes = sorted({title[:3].lower() for _, _, title in rows if len(title) >= 3})
+        # Load-more cursors for pages 2-5 of the home list (6 posts per page)
+        newest = Post.objects.filter(published=True).order_by('-created_date', '-id')
+        self.cursors = [
+            encode_cursor(created, post_id)
+            for post_id, created in list(newest.values_list('id', 'created_date')[:24])[5::6]
+        ] or ['']
+
+
+# Each request type returns (method, path, ajax, form data or None)
+
+def _home(rng, targets):
+    return 'GET', reverse('blog:home'), False, None
+
+
+def _post_detail(rng, targets):
+    return 'GET', reverse('blog:post_detail', args=[rng.choice(targets.slugs)]), False, None
+
+
+def _comment(rng, targets):
+    data = {
+        'name': f'Load tester {rng.randint(1, 1000)}',
+        'email': 'load@example.com',
+        'content': f'Comment number {rng.randint(1, 10 ** 6)} from the load test.',
+    }
+    return 'POST', reverse('blog:post_detail', args=[rng.choice(targets.slugs)]), False, data
+
+
+def _like(rng, targets):
+    return 'POST', reverse('blog:like_post', args=[rng.choice(targets.post_ids)]), True, None
+
+
+def _suggest(rng, targets):
+    query = urlencode({'q': rng.choice(targets.prefixes)})
+    return 'GET', f'{reverse("blog:search_suggestions")}?{query}', True, None
+
+
+def _load_more(rng, targets):
+    query = urlencode({'cursor': rng.choice(targets.cursors)})
+    return 'GET', f'{reverse("blog:load_more_posts")}?{query}', True, None
+
+
+REQUESTS = {
+    'home': _home,
+    'post_detail': _post_detail,
+    'comment': _comment,
+    'like': _like,
+    'suggest': _suggest,
+    'load_more': _load_more,
+}
+
+
+def _client(port, targets, mix, deadline, client_number, seed, results):
+    rng = random.Random(seed * 1000 + client_number)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    # Any well-formed token works for the double-submit CSRF check; the
+    # forwarded address makes every client a distinct visitor for likes
+    token = get_random_string(32)
+    base_headers = {
+        'Cookie': f'csrftoken={token}',
+        'X-CSRFToken': token,
+        'X-Forwarded-For': f'10.0.{client_number // 256}.{client_number % 256}',
+    }
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, ajax, data = REQUESTS[name](rng, targets)
+        headers = dict(base_headers, **({'X-Requested-With': 'XMLHttpRequest'} if ajax else {}))
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection(HOST, port, timeout=30)
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            outcome = response.status
+            connection.close()
+        except (OSError, http.client.HTTPException) as exc:
+            outcome = type(exc).__name__
+        results.append((name, outcome, (time.perf_counter() - started) * 1000))
+
+
+def run_load(port, targets, mix, concurrency=16, duration=10, seed=0):
+    """Replay the mix for ``duration`` seconds; returns [(request name, status or error, ms)]"""
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_client, args=(port, targets, mix, deadline, number, seed, results))
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results, duration):
+    latencies = [ms for _, _, ms in results]
+    outcomes = Counter(outcome for _, outcome, _ in results)
+    errors = sum(count for outcome, count in outcomes.items()
+                 if not isinstance(outcome, int) or outcome >= 500)
+    return {
+        'requests': len(results),
+        'rps': len(results) / duration,
+        'p50_ms': percentile(latencies, 0.5) if latencies else 0,
+        'p99_ms': percentile(latencies, 0.99) if latencies else 0,
+        'error_rate': errors / len(results) if results else 0,
+        'outcomes': dict(outcomes),
+    }
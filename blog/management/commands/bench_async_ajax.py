@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from blog import async_views, benchmarks, views
+from blog.loadtest import Targets
+
+MODES = (('sync', views, benchmarks.run_sync), ('async', async_views, benchmarks.run_async))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent throughput of the sync AJAX views under the WSGI handler '
+        'with the async ones under the ASGI handler, on a seeded test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000, help='Synthetic posts to seed')
+        parser.add_argument('--comments-per-post', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', default='1,8,32',
+                            help='Comma-separated numbers of concurrent clients to run in turn')
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Requests per endpoint, concurrency and mode')
+        parser.add_argument('--endpoints', default=','.join(benchmarks.AJAX_ENDPOINTS),
+                            help=f'Comma-separated subset of: {", ".join(benchmarks.AJAX_ENDPOINTS)}')
+        parser.add_argument('--current-db', action='store_true',
+                            help='Benchmark the configured database as is instead of a seeded test database')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError as exc:
+            raise CommandError(exc)
+        endpoints = [name.strip() for name in options['endpoints'].split(',')]
+        unknown = set(endpoints) - set(benchmarks.AJAX_ENDPOINTS)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], BLOG_QUERY_BUDGET_RAISE=False, BLOG_RATE_LIMITS={}
+        ), benchmarks.scratch_cache():
+            if options['current_db']:
+                self.run_benchmark(endpoints, levels, options)
+            else:
+                with benchmarks.seeded_test_database(
+                    options['posts'], options['comments_per_post'], options['seed']
+                ) as (posts, comments, seconds):
+                    self.stdout.write(f'Seeded {posts} posts and {comments} comments in {seconds:.1f}s')
+                    self.run_benchmark(endpoints, levels, options)
+
+    def run_benchmark(self, endpoints, levels, options):
+        try:
+            targets = Targets()
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(
+            f'{"endpoint":<20} {"clients":>7} {"mode":>6} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>6}'
+        )
+        with benchmarks.quiet_metrics_log():
+            for endpoint in endpoints:
+                for level in levels:
+                    rps = {}
+                    for mode, module, run in MODES:
+                        with override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(module)):
+                            requests = benchmarks.ajax_requests(
+                                endpoint, options['requests'], targets.post_ids, targets.prefixes
+                            )
+                            run(requests[:level], level)  # warm caches and the suggestion index
+                            summary = benchmarks.summarize_run(*run(requests, level))
+                        rps[mode] = summary['rps']
+                        self.stdout.write(
+                            f'{endpoint:<20} {level:>7} {mode:>6} {summary["rps"]:>8.1f} '
+                            f'{summary["p50_ms"]:>8.2f} {summary["p99_ms"]:>8.2f} {summary["errors"]:>6}'
+                        )
+                    if rps['sync']:
+                        self.stdout.write(f'{"":<20} {"":>7} {"":>6} {rps["async"] / rps["sync"]:>7.2f}x')
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.cache_backends import SQLiteCache
+
+# Roughly the size of a cached sidebar block
+PAYLOAD = [{'id': i, 'title': f'Post title {i}', 'excerpt': 'lorem ipsum ' * 20} for i in range(10)]
+
+
+def make_backend(name, directory):
+    if name == 'locmem':
+        return LocMemCache('bench', {'OPTIONS': {'MAX_ENTRIES': 1000000}})
+    if name == 'filebased':
+        return FileBasedCache(os.path.join(directory, 'files'), {'OPTIONS': {'MAX_ENTRIES': 1000000}})
+    return SQLiteCache(os.path.join(directory, 'cache.sqlite3'),
+                       {'OPTIONS': {'MAX_ENTRIES': 1000000, 'CLEANUP_INTERVAL': 0}})
+
+
+BACKENDS = ('locmem', 'filebased', 'sqlite')
+
+
+def _incr_worker(name, directory, operations, start):
+    backend = make_backend(name, directory)
+    start.wait()
+    for _ in range(operations):
+        backend.incr('shared_counter')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare cache backends (LocMemCache, FileBasedCache, SQLiteCache): single-process '
+        'operation throughput and incr correctness with several processes on one key'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default=','.join(BACKENDS), help=f'Subset of: {", ".join(BACKENDS)}')
+        parser.add_argument('--operations', type=int, default=5000, help='Operations per test')
+        parser.add_argument('--processes', type=int, default=4, help='Processes incrementing one key')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backends'].split(',')]
+        unknown = set(names) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f'Unknown backends: {", ".join(sorted(unknown))}')
+        operations = options['operations']
+
+        self.stdout.write(f'{"backend":<10} {"operation":<22} {"ops/s":>10} {"us/op":>8}  notes')
+        for name in names:
+            with tempfile.TemporaryDirectory() as directory:
+                backend = make_backend(name, directory)
+                keys = [f'key{i}' for i in range(operations)]
+                backend.set('counter', 0)
+                tests = [
+                    ('set', lambda i: backend.set(keys[i], PAYLOAD)),
+                    ('get hit', lambda i: backend.get(keys[i])),
+                    ('get miss', lambda i: backend.get(f'missing{i}')),
+                    ('add (existing key)', lambda i: backend.add(keys[i], PAYLOAD)),
+                    ('incr', lambda i: backend.incr('counter')),
+                    ('delete', lambda i: backend.delete(keys[i])),
+                ]
+                for operation, run in tests:
+                    started = time.perf_counter()
+                    for i in range(operations):
+                        run(i)
+                    self.write_row(name, operation, operations, time.perf_counter() - started)
+                self.run_shared_incr(name, directory, operations, options['processes'])
+                backend.close()
+
+    def run_shared_incr(self, name, directory, operations, processes):
+        backend = make_backend(name, directory)
+        backend.set('shared_counter', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        start = context.Event()
+        workers = [
+            context.Process(target=_incr_worker, args=(name, directory, operations, start))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        started = time.perf_counter()
+        start.set()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - started
+
+        expected = operations * processes
+        final = backend.get('shared_counter')
+        if name == 'locmem':
+            note = 'not shared: every process counted into its own memory'
+        elif final == expected:
+            note = f'{final}/{expected}, no lost updates'
+        else:
+            note = f'{final}/{expected}, {expected - final} increments lost'
+        self.write_row(name, f'incr x{processes} processes', expected, seconds, note)
+
+    def write_row(self, name, operation, count, seconds, note=''):
+        self.stdout.write(
+            f'{name:<10} {operation:<22} {count / seconds:>10.0f} {seconds / count * 1e6:>8.1f}  {note}'
+        )
@@ -0,0 +1,103 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog import benchmarks, loadtest
+from blog.models import Comment
+from blog.sampledata import SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test each database profile in BLOG_DB_PROFILES with a mix of readers and '
+        'comment writers, on copies of one seeded SQLite file, and compare throughput and errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(settings.BLOG_DB_PROFILES),
+                            help='Comma-separated profile names from BLOG_DB_PROFILES')
+        parser.add_argument('--mix', default='home=45,post_detail=45,comment=10',
+                            help=f'Weighted request types out of: {", ".join(loadtest.REQUESTS)}')
+        parser.add_argument('--workers', type=int, default=4, help='Server processes')
+        parser.add_argument('--concurrency', type=int, default=16, help='Client threads')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per profile')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds per profile')
+        parser.add_argument('--posts', type=int, default=5000, help='Synthetic posts to seed')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',')]
+        unknown = set(profiles) - set(settings.BLOG_DB_PROFILES)
+        if unknown:
+            raise CommandError(f'Unknown profiles: {", ".join(sorted(unknown))}')
+        try:
+            mix = loadtest.parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        # Shared with every thread and forked worker, like the test runner's database switch
+        database = connections['default'].settings_dict
+        original = copy.deepcopy(database)
+        try:
+            # Seeding invalidates cache tags, so keep it off the live cache too
+            with tempfile.TemporaryDirectory() as directory, benchmarks.scratch_cache():
+                template = os.path.join(directory, 'template.sqlite3')
+                self.use_database(template, 'default')
+                call_command('migrate', verbosity=0)
+                posts, comments = SyntheticData(posts=options['posts'], seed=options['seed']).run()
+                connections.close_all()
+                self.stdout.write(f'Seeded {posts} posts and {comments} comments')
+
+                self.stdout.write(
+                    f'{"profile":<12} {"requests":>9} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} '
+                    f'{"errors":>7} {"comments":>9}  statuses'
+                )
+                for profile in profiles:
+                    path = os.path.join(directory, f'{profile}.sqlite3')
+                    shutil.copy(template, path)
+                    self.use_database(path, profile)
+                    self.run_profile(profile, mix, options)
+        finally:
+            connections.close_all()
+            database.clear()
+            database.update(original)
+
+    def use_database(self, path, profile):
+        connections.close_all()
+        connections['default'].settings_dict.update(
+            {'NAME': path, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}},
+            **copy.deepcopy(settings.BLOG_DB_PROFILES[profile]),
+        )
+
+    def run_profile(self, profile, mix, options):
+        targets = loadtest.Targets()
+        comments_before = Comment.objects.count()
+        # Every profile starts cold, on a scratch cache its workers share
+        with benchmarks.scratch_cache():
+            processes, port = loadtest.start_workers(options['workers'])
+            try:
+                if options['warmup']:
+                    loadtest.run_load(
+                        port, targets, mix, options['concurrency'], options['warmup'], options['seed']
+                    )
+                results = loadtest.run_load(
+                    port, targets, mix, options['concurrency'], options['duration'], options['seed']
+                )
+            finally:
+                loadtest.stop_workers(processes)
+
+        written = Comment.objects.count() - comments_before
+        summary = loadtest.summarize(results, options['duration'])
+        statuses = ', '.join(f'{outcome}: {n}' for outcome, n in sorted(
+            summary['outcomes'].items(), key=lambda item: str(item[0])
+        ))
+        self.stdout.write(
+            f'{profile:<12} {summary["requests"]:>9} {summary["rps"]:>8.1f} {summary["p50_ms"]:>8.1f} '
+            f'{summary["p99_ms"]:>8.1f} {summary["error_rate"]:>6.1%} {written:>9}  {statuses}'
+        )
@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from blog import benchmarks
+from blog.models import Post
+from blog.stats import view_buffer
+from blog.trending import trending_buffer
+
+
+class Command(BaseCommand):
+    help = 'Measure post_detail request time with view counting on and off, on a seeded test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per mode')
+        parser.add_argument('--posts', type=int, default=1000, help='Synthetic posts to seed')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Views, cache entries and metrics all go to throwaway stores, never the live ones
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], BLOG_QUERY_BUDGET_RAISE=False, BLOG_RATE_LIMITS={}
+        ), benchmarks.scratch_cache(), benchmarks.quiet_metrics_log(), benchmarks.seeded_test_database(
+            options['posts'], comments_per_post=2, seed=options['seed']
+        ) as (posts, comments, seconds):
+            self.stdout.write(f'Seeded {posts} posts and {comments} comments in {seconds:.1f}s')
+            post = Post.objects.filter(published=True).order_by('-created_date').first()
+            if post is None:
+                raise CommandError('No published post to benchmark; seed more posts.')
+
+            url = post.get_absolute_url()
+            results = {}
+            for label, enabled in (('off', False), ('on', True)):
+                with override_settings(BLOG_TRACK_VIEWS=enabled):
+                    client = Client()
+                    client.get(url)  # warm up caches and templates
+                    timings = []
+                    for _ in range(options['requests']):
+                        started = time.perf_counter()
+                        client.get(url)
+                        timings.append((time.perf_counter() - started) * 1000)
+                results[label] = timings
+
+            # Flushed while the seeded database is still there
+            flush_started = time.perf_counter()
+            flushed = view_buffer.flush()
+            flush_ms = (time.perf_counter() - flush_started) * 1000
+            trending_buffer.flush()
+
+        for label, timings in results.items():
+            timings.sort()
+            self.stdout.write(
+                f'counting {label:>3}: mean {statistics.mean(timings):.2f} ms, '
+                f'p50 {timings[len(timings) // 2]:.2f} ms, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms'
+            )
+        overhead = statistics.mean(results['on']) - statistics.mean(results['off'])
+        self.stdout.write(f'overhead per request: {overhead:.3f} ms')
+        self.stdout.write(f'flush of {flushed} buckets took {flush_ms:.2f} ms')
@@ -0,0 +1,98 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from blog import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every blog route on a seeded test database and compare latency, '
+        'query counts and memory against a JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000, help='Synthetic posts to seed')
+        parser.add_argument('--comments-per-post', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per route')
+        parser.add_argument('--current-db', action='store_true',
+                            help='Benchmark the configured database as is instead of a seeded test database')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'var' / 'bench_baseline.json'),
+                            help='Baseline file to compare against (and to write with --save)')
+        parser.add_argument('--save', action='store_true', help='Write this run as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help='Allowed relative growth of p50 latency and peak memory (p95 gets twice this); '
+                                 'query counts must never grow')
+        parser.add_argument('--min-ms', type=float, default=5.0,
+                            help='Ignore p95 growth smaller than this many milliseconds')
+
+    def handle(self, *args, **options):
+        meta = {
+            'posts': options['posts'],
+            'comments_per_post': options['comments_per_post'],
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'current_db': options['current_db'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+        # Measure the views as production runs them: no query log, no budget enforcement,
+        # and no rate limits (every benchmark request comes from the same client).
+        # Caches are cleared between routes, so they run against a scratch cache
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], BLOG_QUERY_BUDGET_RAISE=False, BLOG_RATE_LIMITS={}
+        ), benchmarks.scratch_cache():
+            if options['current_db']:
+                results = self.run_benchmark(options)
+            else:
+                with benchmarks.seeded_test_database(
+                    options['posts'], options['comments_per_post'], options['seed']
+                ) as (posts, comments, seconds):
+                    self.stdout.write(f'Seeded {posts} posts and {comments} comments in {seconds:.1f}s')
+                    results = self.run_benchmark(options)
+
+        path = Path(options['baseline'])
+        if options['save']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            meta['created'] = timezone.now().isoformat()
+            path.write_text(json.dumps({'meta': meta, 'routes': results}, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {path}'))
+            return
+        if not path.exists():
+            self.stdout.write(f'No baseline at {path}; run with --save to create one.')
+            return
+
+        baseline = json.loads(path.read_text())
+        changed = [key for key in ('posts', 'comments_per_post', 'seed', 'current_db')
+                   if baseline['meta'].get(key) != meta[key]]
+        if changed:
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded with different {", ".join(changed)}; comparison may be meaningless.'
+            ))
+        regressions = benchmarks.compare(
+            results, baseline['routes'], threshold=options['threshold'], min_ms=options['min_ms']
+        )
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}'))
+
+    def run_benchmark(self, options):
+        self.stdout.write(
+            f'{"route":<32} {"status":>6} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"queries":>7} {"cold q":>6} {"peak KB":>8}'
+        )
+
+        def progress(name, result):
+            self.stdout.write(
+                f'{name:<32} {result["status"]:>6} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                f'{result["queries"]:>7} {result["cold_queries"]:>6} {result["peak_kb"]:>8.0f}'
+            )
+
+        return benchmarks.run(requests=options['requests'], progress=progress)
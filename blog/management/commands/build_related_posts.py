@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the TF-IDF model and the precomputed related posts for every post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int,
+                            help='Related posts stored per post (default: BLOG_RELATED_TOP_K)')
+        parser.add_argument('--batch-size', type=int, default=256,
+                            help='Posts scored per sparse matrix multiply')
+
+    def handle(self, *args, **options):
+        if not related.is_available():
+            raise CommandError('Related posts need numpy and scipy installed.')
+
+        started = time.perf_counter()
+        model = related.rebuild(top_k=options['top_k'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Built related posts for {len(model.post_ids)} posts '
+            f'({len(model.vocabulary)} terms) in {time.perf_counter() - started:.2f}s'
+        ))
+        self.stdout.write(f'Model saved to {related.index_path()}')
@@ -1,12 +1,34 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from blog.models import Category, Post
+from blog.sampledata import SyntheticData
 from django.utils.text import slugify
 
 class Command(BaseCommand):
-    help = 'Load sample data for the blog'
+    help = 'Load sample data for the blog, or generate synthetic data at scale with --posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int,
+                            help='Generate this many synthetic posts instead of the sample posts')
+        parser.add_argument('--comments-per-post', type=int, default=5,
+                            help='Average comments per post (Zipf-distributed across posts)')
+        parser.add_argument('--authors', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--years', type=int, default=5,
+                            help='Spread post dates over this many years up to today')
+        parser.add_argument('--zipf-exponent', type=float, default=1.1,
+                            help='Skew of comments, authors and categories; higher is more skewed')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk insert and per transaction')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed reproduces the same data')
 
     def handle(self, *args, **options):
+        if options['posts'] is not None:
+            return self.generate(options)
+
         # Create categories
         categories_data = [
             {'name': 'Technology', 'description': 'Posts about technology and programming'},
@@ -171,4 +193,28 @@ Remember, work-life balance looks different for everyone. Find what works best f
             if created:
                 self.stdout.write(f'Created post: {post.title}')
 
-        self.stdout.write(self.style.SUCCESS('Successfully loaded sample data!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully loaded sample data!'))
+
+    def generate(self, options):
+        for name in ('posts', 'authors', 'categories', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be at least 1')
+
+        started = time.perf_counter()
+        generator = SyntheticData(
+            posts=options['posts'],
+            comments_per_post=options['comments_per_post'],
+            authors=options['authors'],
+            categories=options['categories'],
+            years=options['years'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            zipf_exponent=options['zipf_exponent'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        posts, comments = generator.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {posts} posts and {comments} comments in {time.perf_counter() - started:.1f}s'
+        ))
+        # Bulk inserts skip the signals that maintain these
+        self.stdout.write('Run rebuild_search_index and build_related_posts to index the new posts.')
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import benchmarks, loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the WSGI app from N local worker processes and replay a traffic mix '
+        'against it, reporting throughput, latency and errors per worker count'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,8',
+                            help='Comma-separated worker process counts to run in turn')
+        parser.add_argument('--mix', default=loadtest.DEFAULT_MIX,
+                            help=f'Weighted request types out of: {", ".join(loadtest.REQUESTS)}')
+        parser.add_argument('--concurrency', type=int, default=16, help='Client threads')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per worker count')
+        parser.add_argument('--warmup', type=float, default=2,
+                            help='Unmeasured seconds per worker count to warm caches')
+        parser.add_argument('--posts', type=int, default=50,
+                            help='Spread post_detail and like traffic over this many recent posts')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = [int(count) for count in options['workers'].split(',')]
+            mix = loadtest.parse_mix(options['mix'])
+            targets = loadtest.Targets(posts=options['posts'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(
+            f'{"workers":>7} {"requests":>9} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}  statuses'
+        )
+        for count in worker_counts:
+            # Each round's workers share a fresh scratch cache instead of the live one
+            with benchmarks.scratch_cache():
+                processes, port = loadtest.start_workers(count)
+                try:
+                    if options['warmup']:
+                        loadtest.run_load(
+                            port, targets, mix, options['concurrency'], options['warmup'], options['seed']
+                        )
+                    results = loadtest.run_load(
+                        port, targets, mix, options['concurrency'], options['duration'], options['seed']
+                    )
+                finally:
+                    loadtest.stop_workers(processes)
+
+            summary = loadtest.summarize(results, options['duration'])
+            statuses = ', '.join(f'{outcome}: {n}' for outcome, n in sorted(
+                summary['outcomes'].items(), key=lambda item: str(item[0])
+            ))
+            self.stdout.write(
+                f'{count:>7} {summary["requests"]:>9} {summary["rps"]:>8.1f} {summary["p50_ms"]:>8.1f} '
+                f'{summary["p99_ms"]:>8.1f} {summary["error_rate"]:>6.1%}  {statuses}'
+            )
+            if options['verbosity'] > 1:
+                for name, _ in mix:
+                    subset = [result for result in results if result[0] == name]
+                    if subset:
+                        part = loadtest.summarize(subset, options['duration'])
+                        self.stdout.write(
+                            f'{"":>7} {name:>9} {part["rps"]:>8.1f} {part["p50_ms"]:>8.1f} '
+                            f'{part["p99_ms"]:>8.1f} {part["error_rate"]:>6.1%}'
+                        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import ArchiveMonth
+
+
+class Command(BaseCommand):
+    help = 'Recount the archive calendar (published posts per month) from the posts table'
+
+    def handle(self, *args, **options):
+        months = ArchiveMonth.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {months} archive months'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog import search, search_cache
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for published posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of posts inserted per batch')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING(
+                'Full-text search requires SQLite FTS5; nothing to rebuild.'
+            ))
+            return
+
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        search_cache.clear()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} published posts'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog import caching, trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending scores from comment and view history (e.g. after changing the half-life)'
+
+    def handle(self, *args, **options):
+        posts = trending.rebuild()
+        caching.invalidate(caching.POSTS)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trending scores for {posts} posts'))
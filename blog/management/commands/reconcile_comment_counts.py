@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from blog.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.active_comment_count from the comments table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report posts whose counter has drifted')
+
+    def handle(self, *args, **options):
+        counts = Comment.objects.filter(post=OuterRef('pk'), active=True).order_by().values(
+            'post'
+        ).annotate(n=Count('id')).values('n')
+        actual = Coalesce(Subquery(counts), 0)
+
+        drifted = Post.objects.annotate(actual=actual).exclude(active_comment_count=F('actual'))
+        for post in drifted.only('id', 'title', 'active_comment_count')[:20]:
+            self.stdout.write(
+                f'{post.title}: stored {post.active_comment_count}, actual {post.actual}'
+            )
+
+        if options['dry_run']:
+            self.stdout.write(f'{drifted.count()} posts have drifted counters')
+            return
+
+        fixed = Post.objects.filter(pk__in=drifted.values('pk')).update(active_comment_count=actual)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} posts'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Backfill word count, reading time and rendered HTML for existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Posts updated per transaction')
+        parser.add_argument('--missing', action='store_true',
+                            help='Only posts that have never been rendered')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk').only('pk', 'content')
+        if options['missing']:
+            posts = posts.filter(content_html='')
+
+        # bulk_update rather than save(): no signals, and updated_date is kept
+        batch, total = [], 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            post.render_content()
+            batch.append(post)
+            if len(batch) >= options['batch_size']:
+                total += self.write(batch)
+        total += self.write(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {total} posts'))
+
+    def write(self, batch):
+        with transaction.atomic():
+            Post.objects.bulk_update(batch, Post.RENDERED_FIELDS)
+        written = len(batch)
+        batch.clear()
+        return written
@@ -0,0 +1,64 @@
+import json
+import statistics
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.metrics import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarize the request metrics log: p50/p95 time and queries per URL name, '
+        'and cache hit ratios per tier'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Metrics log file (defaults to BLOG_METRICS_LOG)')
+
+    def handle(self, *args, **options):
+        path = options['log'] or getattr(settings, 'BLOG_METRICS_LOG', None)
+        if not path:
+            raise CommandError('No metrics log configured; pass --log or set BLOG_METRICS_LOG')
+
+        by_url = defaultdict(list)
+        try:
+            with open(path, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # budget warnings and other plain lines
+                    by_url[entry.get('url_name') or entry.get('path')].append(entry)
+        except FileNotFoundError:
+            raise CommandError(f'Metrics log {path} does not exist')
+
+        header = f'{"url name":<28} {"count":>7} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"max q":>6}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for url_name, entries in sorted(by_url.items(), key=lambda item: str(item[0])):
+            times = [entry['total_ms'] for entry in entries]
+            queries = [entry['queries'] for entry in entries]
+            self.stdout.write(
+                f'{str(url_name):<28} {len(entries):>7} {percentile(times, 0.5):>9.1f} '
+                f'{percentile(times, 0.95):>9.1f} {statistics.mean(queries):>8.1f} {max(queries):>6}'
+            )
+
+        self.write_cache_tiers([entry for entries in by_url.values() for entry in entries])
+
+    def write_cache_tiers(self, entries):
+        totals = {key: sum(entry.get(key, 0) for entry in entries) for key in (
+            'cache_hits', 'cache_misses', 'cache_local_hits', 'cache_local_misses'
+        )}
+        # Local hits never reach the shared cache; everything else is a shared lookup
+        local_lookups = totals['cache_local_hits'] + totals['cache_local_misses']
+        shared_hits = totals['cache_hits'] - totals['cache_local_hits']
+        shared_lookups = shared_hits + totals['cache_misses']
+        self.stdout.write('')
+        for tier, hits, lookups in (
+            ('local', totals['cache_local_hits'], local_lookups),
+            ('shared', shared_hits, shared_lookups),
+        ):
+            ratio = f'{hits / lookups:.1%}' if lookups else 'n/a'
+            self.stdout.write(f'cache {tier:<7} {lookups:>9} lookups {ratio:>7} hit ratio')
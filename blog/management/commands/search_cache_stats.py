@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blog import search_cache
+
+
+class Command(BaseCommand):
+    help = 'Report the search-result cache: cached searches, memory used and hit rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Retire every cached search afterwards')
+
+    def handle(self, *args, **options):
+        for name, value in search_cache.stats().items():
+            self.stdout.write(f'{name}: {value}')
+        if options['clear']:
+            search_cache.clear()
+            self.stdout.write(self.style.SUCCESS('Cleared the search cache'))
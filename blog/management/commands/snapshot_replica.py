@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def snapshot(source, target, timeout=5):
+    """Copy the whole source database into target with SQLite's online backup API"""
+    primary = sqlite3.connect(str(source), timeout=timeout)
+    replica = sqlite3.connect(str(target), timeout=timeout)
+    try:
+        # One step: readers of the replica see the old or the new copy, never a mix
+        primary.backup(replica, pages=-1)
+    finally:
+        replica.close()
+        primary.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh a SQLite read replica stand-in from the primary database, '
+        'once or every --interval seconds'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Replica alias to refresh')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep refreshing every this many seconds (keep it below '
+                                 'BLOG_REPLICA_STICKY_SECONDS)')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias == 'default' or alias not in settings.DATABASES:
+            raise CommandError(f'{alias!r} is not a replica alias in DATABASES')
+        for name in ('default', alias):
+            if connections[name].vendor != 'sqlite':
+                raise CommandError(f'{name!r} is not a SQLite database; use the real replication instead')
+        source = connections['default'].settings_dict['NAME']
+        target = connections[alias].settings_dict['NAME']
+
+        while True:
+            started = time.perf_counter()
+            try:
+                snapshot(source, target)
+            except sqlite3.Error as exc:
+                if not options['interval']:
+                    raise CommandError(f'Copying {source} to {target} failed: {exc}')
+                # e.g. "database is locked" by a long write; the next round retries
+                self.stderr.write(f'Copying {source} to {target} failed: {exc}; retrying')
+            else:
+                self.stdout.write(f'Copied {source} to {target} in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(max(0.0, options['interval'] - (time.perf_counter() - started)))
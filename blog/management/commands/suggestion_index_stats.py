@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog.suggestions import title_index
+
+
+class Command(BaseCommand):
+    help = 'Build the autocomplete title index and report its size and build time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int,
+                            help='Override BLOG_SUGGESTION_INDEX_MAX_BYTES for this run')
+
+    def handle(self, *args, **options):
+        if options['max_bytes'] is not None:
+            title_index.max_bytes = options['max_bytes']
+
+        title_index.build()
+        for name, value in title_index.stats().items():
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,66 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Metrics for the request currently being handled; None outside a request
+current = contextvars.ContextVar('blog_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        # Part of ``queries`` spent filling site-wide blocks, outside the view's budget
+        self.unbudgeted_queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Lookups answered (or not) by the per-process tier of TieredCache
+        self.cache_local_hits = 0
+        self.cache_local_misses = 0
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+
+def record_query(seconds):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.sql_seconds += seconds
+
+
+@contextmanager
+def outside_budget():
+    """Queries in this block are still reported, but not charged to the view's @query_budget"""
+    metrics = current.get()
+    before = metrics.queries if metrics is not None else 0
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.unbudgeted_queries += metrics.queries - before
+
+
+def record_template(seconds):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.template_seconds += seconds
+
+
+def record_cache(hits=0, misses=0, local_hits=0, local_misses=0):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+        metrics.cache_local_hits += local_hits
+        metrics.cache_local_misses += local_misses
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, e.g. percentile(timings, 0.95)"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,133 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('blog.metrics')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare how many SQL queries a view may issue per request"""
+    def decorator(view_func):
+        # Tag the view itself rather than wrapping it, so async views stay coroutine functions
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def _timed_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    connection_created hook: time every query on every connection.
+
+    Async views run their queries on worker threads with their own
+    connections, so the timer can't be installed per request from the
+    middleware; it records into whichever request context issued the query.
+    """
+    if _timed_query not in connection.execute_wrappers:
+        # First in the list, so execute_wrapper() blocks that are open while
+        # the connection is created still pop their own wrapper on exit
+        connection.execute_wrappers.insert(0, _timed_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Collects query count, SQL time, template render time and cache hits per
+    request, reports them in a Server-Timing header and a JSON log line on
+    the ``blog.metrics`` logger, and enforces @query_budget declarations.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        self.report(request, response, request_metrics)
+        self.check_budget(request, request_metrics)
+        return response
+
+    def report(self, request, response, request_metrics):
+        total_ms = request_metrics.total_seconds * 1000
+        sql_ms = request_metrics.sql_seconds * 1000
+        template_ms = request_metrics.template_seconds * 1000
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={sql_ms:.1f};desc="{request_metrics.queries} queries"',
+            f'tpl;dur={template_ms:.1f}',
+            f'cache;desc="{request_metrics.cache_hits} hits ({request_metrics.cache_local_hits} local), '
+            f'{request_metrics.cache_misses} misses"',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'url_name': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': request_metrics.queries,
+            'unbudgeted_queries': request_metrics.unbudgeted_queries,
+            'sql_ms': round(sql_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'cache_hits': request_metrics.cache_hits,
+            'cache_misses': request_metrics.cache_misses,
+            'cache_local_hits': request_metrics.cache_local_hits,
+            'cache_local_misses': request_metrics.cache_local_misses,
+            'total_ms': round(total_ms, 2),
+        }))
+
+    def check_budget(self, request, request_metrics):
+        # Read from the resolved view rather than in process_view, which an
+        # async middleware chain would have to run in a worker thread
+        match = request.resolver_match
+        budget = getattr(match.func, 'query_budget', None) if match else None
+        queries = request_metrics.queries - request_metrics.unbudgeted_queries
+        if budget is None or queries <= budget:
+            return
+        message = (
+            f'{match.view_name if match else request.path} issued {queries} '
+            f'queries (budget {budget}) for {request.get_full_path()}'
+        )
+        if getattr(settings, 'BLOG_QUERY_BUDGET_RAISE', settings.DEBUG):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# The index as first created, copied here so later changes to blog.search
+# cannot change what this migration does
+FTS_TABLE = 'blog_post_fts'
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, content, excerpt, author, category_id UNINDEXED, "
+    "tokenize = 'porter unicode61')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(CREATE_SQL)
+    for post in Post.objects.filter(published=True).select_related('author').iterator():
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, excerpt, author, category_id) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [post.pk, post.title, post.content, post.excerpt,
+             post.author.username, post.category_id],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_active_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostLikeCount',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='like_counter', serialize=False, to='blog.post')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
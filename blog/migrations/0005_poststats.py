@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_postlikecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='blog.post')),
+            ],
+            options={
+                'verbose_name_plural': 'Post stats',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'date'), name='unique_post_stats_per_day')],
+            },
+        ),
+    ]
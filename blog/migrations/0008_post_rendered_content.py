@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+
+def backfill_reading_stats(apps, schema_editor):
+    # A frozen copy of blog.rendering.reading_stats. content_html stays empty
+    # (post_detail falls back to the plain content) until
+    # `manage.py render_post_content --missing` has been run
+    Post = apps.get_model('blog', 'Post')
+    batch = []
+    for post in Post.objects.only('pk', 'content').iterator(chunk_size=500):
+        post.word_count = len(post.content.split())
+        post.reading_time = max(1, round(post.word_count / 200))
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ['word_count', 'reading_time'])
+            batch.clear()
+    Post.objects.bulk_update(batch, ['word_count', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reading_stats, migrations.RunPython.noop),
+    ]
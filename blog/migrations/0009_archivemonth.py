@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:57
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_archive_months(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+    counts = Post.objects.filter(published=True).annotate(
+        year=ExtractYear('created_date'), month=ExtractMonth('created_date')
+    ).order_by().values('year', 'month').annotate(n=Count('id'))
+    ArchiveMonth.objects.bulk_create(
+        [ArchiveMonth(year=row['year'], month=row['month'], post_count=row['n']) for row in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_rendered_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month'), name='unique_archive_month')],
+            },
+        ),
+        migrations.RunPython(backfill_archive_months, migrations.RunPython.noop),
+    ]
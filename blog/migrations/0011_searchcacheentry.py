@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_trendingscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=250, unique=True)),
+                ('terms', models.JSONField(default=list)),
+                ('category', models.PositiveIntegerField(null=True)),
+                ('sort', models.CharField(max_length=20)),
+                ('result_count', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Bytes')),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Search cache entries',
+            },
+        ),
+    ]
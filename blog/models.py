@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import ExtractMonth, ExtractYear, Greatest
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 
+from . import caching, rendering
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -26,20 +30,145 @@ class Post(models.Model):
     updated_date = models.DateTimeField(auto_now=True)
     published = models.BooleanField(default=False)
     featured = models.BooleanField(default=False)
+    # Denormalized number of active comments, kept in sync by Comment
+    active_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Derived from content on save, so detail pages do no text processing
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False, help_text="Minutes")
+    content_html = models.TextField(blank=True, editable=False)
+    RENDERED_FIELDS = ('word_count', 'reading_time', 'content_html')
+    # Archive month not known yet because published/created_date were deferred
+    DEFERRED_MONTH = object()
     
     class Meta:
         ordering = ['-created_date']
+        # Every listing filters on published=True, which Django renders as a
+        # bare `WHERE "published"` that SQLite cannot match against a leading
+        # index column. Partial indexes on that condition are used instead
+        # (and only hold published rows).
+        indexes = [
+            models.Index(fields=['created_date'], condition=Q(published=True), name='post_published_created_idx'),
+            models.Index(fields=['category', 'created_date'], condition=Q(published=True), name='post_category_created_idx'),
+            models.Index(fields=['category', 'active_comment_count', 'created_date'], condition=Q(published=True), name='post_category_popular_idx'),
+            models.Index(fields=['category', 'title'], condition=Q(published=True), name='post_category_title_idx'),
+            models.Index(fields=['author', 'created_date'], condition=Q(published=True), name='post_author_created_idx'),
+            models.Index(fields=['active_comment_count', 'created_date'], condition=Q(published=True), name='post_popular_idx'),
+            models.Index(fields=['title'], condition=Q(published=True), name='post_published_title_idx'),
+        ]
         
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember which ArchiveMonth currently counts this post
+        if self.pk and not {'published', 'created_date'} & self.get_deferred_fields():
+            self._archived_month = self.archive_month()
+        else:
+            self._archived_month = None if not self.pk else self.DEFERRED_MONTH
+    
     def __str__(self):
         return self.title
     
     def get_absolute_url(self):
         return reverse('blog:post_detail', args=[self.slug])
     
+    def archive_month(self):
+        """(year, month) in the current time zone if published, else None"""
+        if not self.published:
+            return None
+        created = timezone.localtime(self.created_date) if timezone.is_aware(self.created_date) else self.created_date
+        return created.year, created.month
+    
     def save(self, *args, **kwargs):
         if not self.excerpt:
             self.excerpt = self.content[:250] + "..."
-        super().save(*args, **kwargs)
+        self.render_content()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *self.RENDERED_FIELDS}
+        if update_fields is not None and not {'published', 'created_date'} & set(update_fields):
+            return super().save(*args, **kwargs)
+        
+        archive_month = self.archive_month()
+        with transaction.atomic():
+            if self._archived_month is self.DEFERRED_MONTH:
+                stored = Post.objects.filter(pk=self.pk).only('published', 'created_date').first()
+                self._archived_month = stored.archive_month() if stored else None
+            super().save(*args, **kwargs)
+            if archive_month != self._archived_month:
+                ArchiveMonth.objects.move(self._archived_month, archive_month)
+        self._archived_month = archive_month
+    
+    def render_content(self):
+        """Derive word count, reading time and sanitized HTML from the Markdown content"""
+        self.word_count, self.reading_time = rendering.reading_stats(self.content)
+        self.content_html = rendering.render_markdown(self.content)
+
+class ArchiveMonthQuerySet(models.QuerySet):
+    def adjust(self, year_month, delta):
+        year, month = year_month
+        self.bulk_create([ArchiveMonth(year=year, month=month)], ignore_conflicts=True)
+        self.filter(year=year, month=month).update(
+            post_count=Greatest(F('post_count') + delta, Value(0))
+        )
+    
+    def move(self, old, new):
+        """Move one published post between months (None = not published)"""
+        with transaction.atomic():
+            if old:
+                self.adjust(old, -1)
+            if new:
+                self.adjust(new, 1)
+    
+    def rebuild(self):
+        """Recount every month from the posts table (after bulk imports or updates)"""
+        counts = Post.objects.filter(published=True).annotate(
+            year=ExtractYear('created_date'), month=ExtractMonth('created_date')
+        ).order_by().values('year', 'month').annotate(n=Count('id'))
+        with transaction.atomic():
+            self.all().delete()
+            created = self.bulk_create(
+                [ArchiveMonth(year=row['year'], month=row['month'], post_count=row['n']) for row in counts]
+            )
+        caching.invalidate(caching.POSTS)
+        return len(created)
+
+
+class ArchiveMonth(models.Model):
+    """Published posts per calendar month, kept in sync by Post.save"""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    post_count = models.PositiveIntegerField(default=0)
+    
+    objects = ArchiveMonthQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_archive_month'),
+        ]
+    
+    def __str__(self):
+        return f'{self.year}-{self.month:02d}: {self.post_count} posts'
+
+
+class CommentQuerySet(models.QuerySet):
+    def set_active(self, active):
+        """Bulk (de)activate comments and adjust the per-post counters to match"""
+        with transaction.atomic():
+            changing = self.filter(active=not active)
+            per_post = list(
+                changing.order_by().values('post_id').annotate(n=Count('id'))
+            )
+            updated = changing.update(active=active)
+            for row in per_post:
+                delta = row['n'] if active else -row['n']
+                Post.objects.filter(pk=row['post_id']).update(
+                    active_comment_count=F('active_comment_count') + delta
+                )
+        if updated:
+            # Queryset updates bypass the post_save signal
+            caching.invalidate(caching.COMMENTS)
+        return updated
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -49,8 +178,134 @@ class Comment(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     active = models.BooleanField(default=True)
     
+    objects = CommentQuerySet.as_manager()
+    
+    # Counted post not known yet because active/post were deferred
+    DEFERRED_POST = object()
+    
     class Meta:
         ordering = ['-created_date']
+        indexes = [
+            models.Index(fields=['post', 'created_date'], condition=Q(active=True), name='comment_post_active_idx'),
+        ]
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember what the counters currently include for this comment
+        if self.pk and not {'active', 'post_id'} & self.get_deferred_fields():
+            self._counted_post_id = self.post_id if self.active else None
+        else:
+            self._counted_post_id = None if not self.pk else self.DEFERRED_POST
+    
+    def __str__(self):
+        return f'Comment by {self.name} on {self.post.title}'
+    
+    def stored_counted_post_id(self):
+        """The post whose counter includes this comment, as currently saved"""
+        if self._counted_post_id is self.DEFERRED_POST:
+            stored = Comment.objects.filter(pk=self.pk).values_list('post_id', 'active').first()
+            self._counted_post_id = stored[0] if stored and stored[1] else None
+        return self._counted_post_id
+    
+    def save(self, *args, **kwargs):
+        counted_post_id = self.post_id if self.active else None
+        with transaction.atomic():
+            self.stored_counted_post_id()
+            super().save(*args, **kwargs)
+            if counted_post_id != self._counted_post_id:
+                if self._counted_post_id:
+                    Post.objects.filter(pk=self._counted_post_id).update(
+                        active_comment_count=F('active_comment_count') - 1
+                    )
+                if counted_post_id:
+                    Post.objects.filter(pk=counted_post_id).update(
+                        active_comment_count=F('active_comment_count') + 1
+                    )
+        self._counted_post_id = counted_post_id
+
+
+class PostLikeCount(models.Model):
+    """Persistent like total per post, written in batches by blog.likes"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='like_counter')
+    count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.count} likes on {self.post_id}'
+
+
+class PostStats(models.Model):
+    """Daily view bucket per post, written in batches by blog.stats"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Post stats"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'date'], name='unique_post_stats_per_day'),
+        ]
+    
+    def __str__(self):
+        return f'{self.views} views on {self.post_id} ({self.date})'
+
+
+class RelatedPost(models.Model):
+    """Precomputed content-similar posts, built by blog.related"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='unique_related_post_rank'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.3f})'
+
+
+class TrendingScore(models.Model):
+    """Time-decayed activity score per published post, maintained by blog.trending"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    # Copied from the post so a per-category list is one index range
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, db_index=False, related_name='+')
+    # Relative to TrendingEpoch.started; only comparable between rows
+    score = models.FloatField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+            models.Index(fields=['category', '-score'], name='trending_category_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3g}'
+
+
+class TrendingEpoch(models.Model):
+    """Reference time every TrendingScore is stored against (a single row)"""
+    started = models.DateTimeField()
+    
+    def __str__(self):
+        return f'Trending epoch {self.started:%Y-%m-%d %H:%M}'
+
+
+class SearchCacheEntry(models.Model):
+    """A search whose results are in the cache, kept so post changes can find it (see blog.search_cache)"""
+    key = models.CharField(max_length=250, unique=True)
+    # Normalized query terms, category filter and sort the results were built from
+    terms = models.JSONField(default=list)
+    category = models.PositiveIntegerField(null=True)
+    sort = models.CharField(max_length=20)
+    result_count = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0, help_text="Bytes")
+    expires = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name_plural = "Search cache entries"
     
     def __str__(self):
-        return f'Comment by {self.name} on {self.post.title}'
\ No newline at end of file
+        return f'{" ".join(self.terms)} ({self.sort}, {self.result_count} results)'
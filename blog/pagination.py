@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_date, pk, backwards=False):
+    """Pack a (created_date, id) position into an opaque URL-safe token"""
+    payload = json.dumps([created_date.isoformat(), pk, int(backwards)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, pk, backwards = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created, pk = datetime.fromisoformat(created), int(pk)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError, OverflowError):
+        # OverflowError: int() of an Infinity pk
+        raise InvalidCursor(token)
+    if not -2 ** 63 <= pk < 2 ** 63:
+        # Too large to bind as an SQL integer
+        raise InvalidCursor(token)
+    return created, pk, bool(backwards)
+
+
+class CursorPage:
+    """One page of a keyset-paginated list; iterates like a Paginator Page"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, descending=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Newest first: the next page holds older posts
+        self.descending = descending
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CountedPaginator(Paginator):
+    """A Paginator whose total is already known (e.g. from ArchiveMonth), so no COUNT(*) runs"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over (created_date, id).
+
+    Each page is a single indexed range query with LIMIT per_page + 1, so
+    fetching page 10 000 costs the same as fetching page 1 and no COUNT(*)
+    is ever issued.
+    """
+
+    def __init__(self, queryset, per_page, descending=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = descending
+
+    def _ordered(self, reverse):
+        descending = self.descending != reverse
+        if descending:
+            return self.queryset.order_by('-created_date', '-id')
+        return self.queryset.order_by('created_date', 'id')
+
+    def _after(self, created_date, pk, reverse):
+        # "After" in the direction we are currently walking
+        descending = self.descending != reverse
+        if descending:
+            return Q(created_date__lt=created_date) | Q(created_date=created_date, id__lt=pk)
+        return Q(created_date__gt=created_date) | Q(created_date=created_date, id__gt=pk)
+
+    def _query(self, cursor):
+        """(queryset, backwards) for the page following or preceding the cursor"""
+        if not cursor:
+            return self._ordered(reverse=False), False
+        created_date, pk, backwards = decode_cursor(cursor)
+        queryset = self._ordered(reverse=backwards).filter(
+            self._after(created_date, pk, reverse=backwards)
+        )
+        return queryset, backwards
+
+    def page(self, cursor=None):
+        """Return the page following (or, for backwards cursors, preceding) the cursor"""
+        queryset, backwards = self._query(cursor)
+        return self._page(list(queryset[:self.per_page + 1]), cursor, backwards)
+
+    async def apage(self, cursor=None):
+        """page() for async views"""
+        queryset, backwards = self._query(cursor)
+        return self._page([row async for row in queryset[:self.per_page + 1]], cursor, backwards)
+
+    def _page(self, rows, cursor, backwards):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            first, last = rows[0], rows[-1]
+            # Walking backwards we came from the following page, so it exists
+            if backwards or has_more:
+                next_cursor = encode_cursor(last.created_date, last.pk)
+            if (backwards and has_more) or (cursor and not backwards):
+                previous_cursor = encode_cursor(first.created_date, first.pk, backwards=True)
+        return CursorPage(rows, next_cursor, previous_cursor, self.descending)
+
+
+def use_cursor_pagination(request, sort_by='newest'):
+    """Cursor mode is opt-in per request (?cursor=) or site-wide via settings"""
+    if sort_by not in ('newest', 'oldest'):
+        return False
+    return 'cursor' in request.GET or getattr(settings, 'BLOG_CURSOR_PAGINATION', False)
@@ -0,0 +1,143 @@
+"""
+Sliding-window rate limiting on top of the shared cache.
+
+Each (scope, client) pair keeps one counter per fixed window, incremented
+atomically with ``cache.incr``. A request is allowed while
+
+    previous window count * (share of the previous window still inside the
+    sliding window) + current window count <= limit
+
+which smooths out the burst a plain fixed window allows at its boundary.
+A check costs two cache round-trips (``incr`` on the current window, ``get``
+on the previous one), or one when the current window alone is over the
+limit. Rejected requests are counted too, so hammering a limit keeps it
+closed.
+
+Rates come from ``settings.BLOG_RATE_LIMITS`` ({scope: 'N/period'}) when
+the request is checked; a scope that is missing or None is not limited.
+"""
+import hashlib
+import math
+import re
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+KEY = 'ratelimit_{}_{}_{}'
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """'3/h' -> (3, 3600); '100/10m' -> (100, 600)"""
+    match = RATE_RE.match(rate.replace(' ', ''))
+    if not match:
+        raise ValueError(f'Invalid rate {rate!r}; expected e.g. "30/m" or "100/10m"')
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * UNITS[unit]
+
+
+def get_rate(scope):
+    rate = getattr(settings, 'BLOG_RATE_LIMITS', {}).get(scope)
+    return parse_rate(rate) if rate else None
+
+
+def client_ip(request):
+    """Client IP address, honouring X-Forwarded-For"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def client_key(request):
+    """Short digest of the client IP, so raw addresses never end up in cache keys"""
+    return hashlib.blake2b((client_ip(request) or '').encode(), digest_size=8).hexdigest()
+
+
+def _window(period, now):
+    window, offset = divmod(now, period)
+    return int(window), offset / period
+
+
+def _decide(limit, period, count, previous, elapsed):
+    """(allowed, retry_after seconds) for the weighted sliding-window count"""
+    estimate = previous * (1 - elapsed) + count
+    if estimate <= limit:
+        return True, 0
+    if count > limit:
+        # Wait for the next window, then until this window's share is small enough
+        wait = (1 - elapsed) + (1 - (limit - 1) / count)
+    else:
+        wait = (1 - (limit - count) / previous) - elapsed
+    return False, max(1, math.ceil(wait * period))
+
+
+def hit(scope, ident, now=None):
+    """Count one request by ``ident`` against ``scope``; returns (allowed, retry_after)"""
+    rate = get_rate(scope)
+    if rate is None:
+        return True, 0
+    limit, period = rate
+    window, elapsed = _window(period, time.time() if now is None else now)
+    key = KEY.format(scope, ident, window)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Kept for two periods so it can serve as the next window's previous count
+        count = 1 if cache.add(key, 1, 2 * period) else cache.incr(key)
+    if count > limit:
+        return _decide(limit, period, count, 0, elapsed)
+    previous = cache.get(KEY.format(scope, ident, window - 1), 0)
+    return _decide(limit, period, count, previous, elapsed)
+
+
+async def ahit(scope, ident, now=None):
+    """hit() for async views, using the async cache API"""
+    rate = get_rate(scope)
+    if rate is None:
+        return True, 0
+    limit, period = rate
+    window, elapsed = _window(period, time.time() if now is None else now)
+    key = KEY.format(scope, ident, window)
+    try:
+        count = await cache.aincr(key)
+    except ValueError:
+        count = 1 if await cache.aadd(key, 1, 2 * period) else await cache.aincr(key)
+    if count > limit:
+        return _decide(limit, period, count, 0, elapsed)
+    previous = await cache.aget(KEY.format(scope, ident, window - 1), 0)
+    return _decide(limit, period, count, previous, elapsed)
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse(
+        {'success': False, 'message': 'Too many requests. Please try again later.'}, status=429
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, key=client_key):
+    """View decorator: answer 429 once ``key(request)`` goes over the scope's rate"""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                allowed, retry_after = await ahit(scope, key(request))
+                if not allowed:
+                    return too_many_requests(retry_after)
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                allowed, retry_after = hit(scope, key(request))
+                if not allowed:
+                    return too_many_requests(retry_after)
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
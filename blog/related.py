@@ -0,0 +1,385 @@
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.text import slugify
+
+from .counters import chunked
+from .models import Post, RelatedPost
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    np = sparse = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[^\W_]{3,}', re.UNICODE)
+
+# Title words count as much as this many occurrences in the body
+TITLE_WEIGHT = 3
+
+# Ids per IN (...) query, well under SQLite's bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+STOP_WORDS = frozenset('''
+    about after again also all and any are because been before being between both but can
+    could did does doing down during each few for from further had has have having her here
+    hers him his how into its just more most not now off once only other our out over own
+    same she should some such than that the their them then there these they this those
+    through too under until very was were what when where which while who whom why will
+    with would you your yours
+'''.split())
+
+
+def is_available():
+    return np is not None
+
+
+def document_terms(title, content):
+    text = f'{title} ' * TITLE_WEIGHT + content
+    return [term for term in TOKEN_RE.findall(text.lower()) if term not in STOP_WORDS]
+
+
+def index_path():
+    """One model file per database, so test databases never touch the real one"""
+    directory = Path(getattr(settings, 'BLOG_RELATED_INDEX_DIR', Path(tempfile.gettempdir())))
+    database = slugify(Path(str(connection.settings_dict['NAME'])).name) or 'default'
+    return directory / f'related-{database}.npz'
+
+
+_model_lock = threading.Lock()
+
+
+@contextmanager
+def model_lock(path):
+    """
+    Hold the model file for a whole load-modify-save cycle. Saves from
+    concurrent requests would otherwise overwrite each other's changes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _model_lock, open(path.with_suffix('.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+class SimilarityModel:
+    """
+    TF-IDF document vectors for published posts.
+
+    ``matrix`` is a CSR matrix with one L2-normalized row per post (in
+    ``post_ids`` order), so the dot product of two rows is their cosine
+    similarity.
+    """
+
+    def __init__(self, post_ids, vocabulary, idf, matrix):
+        self.post_ids = list(post_ids)
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+        self.row_of = {post_id: row for row, post_id in enumerate(self.post_ids)}
+
+    @classmethod
+    def fit(cls, documents):
+        """Build the model from an iterable of (post_id, terms)"""
+        post_ids, indptr, indices, data = [], [0], [], []
+        vocabulary = {}
+        for post_id, terms in documents:
+            counts = {}
+            for term in terms:
+                column = vocabulary.setdefault(term, len(vocabulary))
+                counts[column] = counts.get(column, 0) + 1
+            post_ids.append(post_id)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), indptr),
+            shape=(len(post_ids), len(vocabulary)),
+        )
+        document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+        idf = (np.log((1 + len(post_ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return cls(post_ids, vocabulary, idf, cls._weight(counts, idf))
+
+    @staticmethod
+    def _weight(counts, idf):
+        """Sublinear tf * idf, then L2-normalize every row"""
+        weighted = counts.copy()
+        weighted.data = 1 + np.log(weighted.data)
+        weighted = weighted.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(weighted).astype(np.float32).tocsr()
+
+    def vectorize(self, terms):
+        """Vector for one document using the fitted vocabulary (unknown terms are ignored)"""
+        counts = {}
+        for term in terms:
+            column = self.vocabulary.get(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        row = sparse.csr_matrix(
+            (np.asarray(list(counts.values()), dtype=np.float32),
+             np.asarray(list(counts.keys()), dtype=np.int32), [0, len(counts)]),
+            shape=(1, len(self.vocabulary)),
+        )
+        return self._weight(row, self.idf)
+
+    def set_row(self, post_id, vector):
+        row = self.row_of.get(post_id)
+        if row is None:
+            self.matrix = sparse.vstack([self.matrix, vector], format='csr')
+            self.row_of[post_id] = len(self.post_ids)
+            self.post_ids.append(post_id)
+        else:
+            self.matrix = sparse.vstack(
+                [self.matrix[:row], vector, self.matrix[row + 1:]], format='csr'
+            )
+
+    def remove_row(self, post_id):
+        if post_id in self.row_of:
+            self.set_row(post_id, sparse.csr_matrix((1, self.matrix.shape[1]), dtype=np.float32))
+
+    def neighbors(self, post_ids, top_k, batch_size=256):
+        """{post_id: [(related_id, score), ...]} for the given posts, best first"""
+        rows = [self.row_of[post_id] for post_id in post_ids if post_id in self.row_of]
+        transposed = self.matrix.T.tocsc()
+        result = {}
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            scores = (self.matrix[batch] @ transposed).toarray()
+            scores[np.arange(len(batch)), batch] = 0  # never relate a post to itself
+            k = min(top_k, scores.shape[1] - 1)
+            if k <= 0:
+                break
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for offset, row in enumerate(batch):
+                columns = candidates[offset]
+                columns = columns[np.argsort(-scores[offset, columns])]
+                result[self.post_ids[row]] = [
+                    (self.post_ids[column], float(scores[offset, column]))
+                    for column in columns if scores[offset, column] > 0
+                ]
+        return result
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = np.empty(len(self.vocabulary), dtype=object)
+        for term, column in self.vocabulary.items():
+            terms[column] = term
+        # Write to a temporary file first so readers never see half a model
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.npz', delete=False) as tmp:
+            np.savez(
+                tmp,
+                post_ids=np.asarray(self.post_ids, dtype=np.int64),
+                terms=terms.astype(str),
+                idf=self.idf,
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.asarray(self.matrix.shape),
+            )
+        os.replace(tmp.name, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            matrix = sparse.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']), shape=tuple(stored['shape'])
+            )
+            vocabulary = {term: column for column, term in enumerate(stored['terms'].tolist())}
+            return cls(stored['post_ids'].tolist(), vocabulary, stored['idf'], matrix)
+
+
+def _published_documents():
+    posts = Post.objects.filter(published=True).order_by('id').values_list('id', 'title', 'content')
+    for post_id, title, content in posts.iterator(chunk_size=2000):
+        yield post_id, document_terms(title, content)
+
+
+def _store(neighbors):
+    """Replace the RelatedPost rows of every post in ``neighbors``"""
+    with transaction.atomic():
+        for post_ids in chunked(neighbors, QUERY_CHUNK_SIZE):
+            RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create(
+            [
+                RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+                for post_id, related in neighbors.items()
+                for rank, (related_id, score) in enumerate(related)
+            ],
+            batch_size=1000,
+        )
+
+
+def rebuild(top_k=None, batch_size=256):
+    """Full rebuild of the model and of every post's related list"""
+    top_k = top_k or getattr(settings, 'BLOG_RELATED_TOP_K', 5)
+    started = time.perf_counter()
+    path = index_path()
+    with model_lock(path):
+        model = SimilarityModel.fit(_published_documents())
+        neighbors = model.neighbors(model.post_ids, top_k, batch_size=batch_size)
+        with transaction.atomic():
+            RelatedPost.objects.all().delete()
+            _store(neighbors)
+        model.save(path)
+    logger.info('Rebuilt related posts for %d posts in %.2fs',
+                len(model.post_ids), time.perf_counter() - started)
+    return model
+
+
+_pending = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def schedule_update(post_id):
+    """
+    Refresh related posts after one post was saved or deleted, without
+    holding up the request: with BLOG_RELATED_UPDATE_IN_BACKGROUND the id is
+    queued for a daemon thread, which applies everything queued so far with
+    one model load and save. Updates still queued when the process exits
+    are lost until the next rebuild. Otherwise (tests) it runs right away.
+    """
+    if not getattr(settings, 'BLOG_RELATED_UPDATE_IN_BACKGROUND', False):
+        update_posts([post_id])
+        return
+    _pending.put(post_id)
+    _ensure_worker()
+
+
+def apply_pending(post_ids=()):
+    """Apply ``post_ids`` plus everything queued; returns the ids that were updated"""
+    post_ids = set(post_ids)
+    while True:
+        try:
+            post_ids.add(_pending.get_nowait())
+        except queue.Empty:
+            break
+    if post_ids:
+        try:
+            update_posts(sorted(post_ids))
+        except Exception:
+            logger.exception('Updating related posts for %d posts failed', len(post_ids))
+    return post_ids
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run_updates, name='related-updater', daemon=True)
+                _worker.start()
+
+
+def _run_updates():
+    while True:
+        apply_pending([_pending.get()])
+        # Don't keep this thread's database connection open while idle
+        connections.close_all()
+
+
+def _reset_after_fork():
+    global _pending, _worker, _worker_lock
+    _pending = queue.Queue()
+    _worker = None
+    _worker_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def update_posts(post_ids):
+    """
+    Incrementally refresh after some posts were saved or deleted.
+
+    Only those posts' rows are re-vectorized (against the vocabulary of the
+    last full rebuild) and only lists that can change are recomputed: their
+    own, the ones that already point at them, and the ones they now beat
+    among their BLOG_RELATED_MAX_CANDIDATES most similar posts. Updates and
+    rebuilds hold model_lock(), so concurrent updates apply in turn.
+    """
+    path = index_path()
+    if not is_available() or not path.exists():
+        return
+    with model_lock(path):
+        _update_posts(list(post_ids), path)
+
+
+def update_post(post_id):
+    """update_posts() for a single post"""
+    update_posts([post_id])
+
+
+def _update_posts(post_ids, path):
+    top_k = getattr(settings, 'BLOG_RELATED_TOP_K', 5)
+    model = SimilarityModel.load(path)
+
+    posts = {
+        post_id: (title, content) for post_id, title, content in
+        Post.objects.filter(pk__in=post_ids, published=True).values_list('id', 'title', 'content')
+    }
+    vectors = {}
+    for post_id in post_ids:
+        if post_id in posts:
+            vectors[post_id] = model.vectorize(document_terms(*posts[post_id]))
+            model.set_row(post_id, vectors[post_id])
+        else:
+            model.remove_row(post_id)
+
+    affected = set()
+    for chunk in chunked(post_ids, QUERY_CHUNK_SIZE):
+        affected.update(RelatedPost.objects.filter(related_id__in=chunk).values_list('post_id', flat=True))
+    for post_id, vector in vectors.items():
+        if vector.nnz:
+            affected.add(post_id)
+            affected.update(_outranked(model, post_id, vector, top_k))
+
+    for chunk in chunked(post_ids, QUERY_CHUNK_SIZE):
+        RelatedPost.objects.filter(post_id__in=chunk).delete()
+    if affected:
+        _store(model.neighbors(sorted(affected), top_k))
+    model.save(path)
+
+
+def _outranked(model, post_id, vector, top_k):
+    """Posts among the most similar to ``post_id`` whose list it now belongs in"""
+    max_candidates = getattr(settings, 'BLOG_RELATED_MAX_CANDIDATES', 200)
+    similarities = (model.matrix @ vector.T).toarray().ravel()
+    similarities[model.row_of[post_id]] = 0
+    rows = np.flatnonzero(similarities > 0)
+    if len(rows) > max_candidates:
+        rows = rows[np.argpartition(-similarities[rows], max_candidates - 1)[:max_candidates]]
+    candidates = {model.post_ids[row]: similarities[row] for row in rows}
+
+    # A candidate's list changes if it is not full or the new score beats its worst entry
+    current = {}
+    for chunk in chunked(candidates, QUERY_CHUNK_SIZE):
+        for owner, score in RelatedPost.objects.filter(post_id__in=chunk).values_list('post_id', 'score'):
+            count, worst = current.get(owner, (0, score))
+            current[owner] = (count + 1, min(worst, score))
+    outranked = []
+    for owner, similarity in candidates.items():
+        count, worst = current.get(owner, (0, 0))
+        if count < top_k or similarity > worst:
+            outranked.append(owner)
+    return outranked
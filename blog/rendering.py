@@ -0,0 +1,163 @@
+import re
+
+from django.utils.html import escape
+
+# Markdown subset for post bodies, rendered once on save.
+# The source is HTML-escaped before any markup is added, so the output can
+# only contain the tags produced here: paragraphs, headings, lists, block
+# quotes, code, rules, strong/em and links with safe URL schemes.
+
+WORDS_PER_MINUTE = 200
+
+FENCE_RE = re.compile(r'^\s*```')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+QUOTE_RE = re.compile(r'^\s*>\s?(.*)$')
+BULLET_RE = re.compile(r'^\s*[-*+]\s+(.*)$')
+NUMBERED_RE = re.compile(r'^\s*(\d{1,9})[.)]\s+(.*)$')
+
+CODE_SPAN_RE = re.compile(r'`([^`\n]+)`')
+LINK_RE = re.compile(r'\[([^\]\n]+)\]\(([^()\s]+)\)')
+STRONG_RE = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+EM_RE = re.compile(r'(?<![\w*])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![\w*])|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+SAFE_URL_RE = re.compile(r'^(https?://|mailto:|/|#)', re.IGNORECASE)
+PLACEHOLDER_RE = re.compile('\x00(\\d+)\x00')
+
+
+def reading_stats(text):
+    """(word count, reading time in minutes) of a post body"""
+    word_count = len(text.split())
+    return word_count, max(1, round(word_count / WORDS_PER_MINUTE))
+
+
+def _emphasis(text):
+    text = STRONG_RE.sub(r'<strong>\2</strong>', text)
+    return EM_RE.sub(lambda match: f'<em>{match.group(1) or match.group(2)}</em>', text)
+
+
+def render_inline(text):
+    # NUL never belongs in a post and is reserved for the placeholders below
+    text = escape(text.replace('\x00', ''))
+    # Finished code spans and links are set aside as placeholders, so nothing
+    # inside them (code, or the underscores of a URL) is formatted again
+    parts = []
+
+    def keep(html):
+        parts.append(html)
+        return f'\x00{len(parts) - 1}\x00'
+
+    def restore(text):
+        return PLACEHOLDER_RE.sub(lambda match: parts[int(match.group(1))], text)
+
+    def link(match):
+        label, url = match.groups()
+        if not SAFE_URL_RE.match(url):
+            return match.group(0)
+        return keep(f'<a href="{url}" rel="nofollow">{restore(_emphasis(label))}</a>')
+
+    text = CODE_SPAN_RE.sub(lambda match: keep(f'<code>{match.group(1)}</code>'), text)
+    text = LINK_RE.sub(link, text)
+    return restore(_emphasis(text))
+
+
+def _list_item(line):
+    """('ul' | 'ol', number, text) for a list item line, else None"""
+    match = BULLET_RE.match(line)
+    if match:
+        return 'ul', None, match.group(1)
+    match = NUMBERED_RE.match(line)
+    if match:
+        return 'ol', int(match.group(1)), match.group(2)
+    return None
+
+
+def _next_content_line(lines, index):
+    while index < len(lines) and not lines[index].strip():
+        index += 1
+    return lines[index] if index < len(lines) else None
+
+
+def render_markdown(text):
+    """Sanitized HTML for a post body"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    html, paragraph = [], []
+
+    def end_paragraph():
+        if paragraph:
+            html.append(f'<p>{render_inline(" ".join(paragraph))}</p>')
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if FENCE_RE.match(line):
+            end_paragraph()
+            code = []
+            i += 1
+            while i < len(lines) and not FENCE_RE.match(lines[i]):
+                code.append(lines[i])
+                i += 1
+            html.append(f'<pre><code>{escape(chr(10).join(code))}</code></pre>')
+            i += 1
+            continue
+
+        if not stripped:
+            end_paragraph()
+            i += 1
+            continue
+
+        heading = HEADING_RE.match(stripped)
+        if heading:
+            end_paragraph()
+            level = len(heading.group(1))
+            html.append(f'<h{level}>{render_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+
+        if RULE_RE.match(line):
+            end_paragraph()
+            html.append('<hr>')
+            i += 1
+            continue
+
+        if QUOTE_RE.match(line):
+            end_paragraph()
+            quoted = []
+            while i < len(lines) and QUOTE_RE.match(lines[i]):
+                quoted.append(QUOTE_RE.match(lines[i]).group(1))
+                i += 1
+            html.append(f'<blockquote>{render_markdown(chr(10).join(quoted))}</blockquote>')
+            continue
+
+        item = _list_item(line)
+        if item:
+            end_paragraph()
+            kind, start, _ = item
+            items = []
+            while i < len(lines):
+                item = _list_item(lines[i])
+                if item and item[0] == kind:
+                    items.append([item[2]])
+                elif lines[i].strip() and lines[i][:1].isspace() and items:
+                    items[-1].append(lines[i].strip())  # indented continuation line
+                elif not lines[i].strip():
+                    # A blank line only ends the list if the next item is not of the same kind
+                    following = _next_content_line(lines, i)
+                    following = following is not None and _list_item(following)
+                    if not (following and following[0] == kind):
+                        break
+                else:
+                    break
+                i += 1
+            start_attr = f' start="{start}"' if kind == 'ol' and start != 1 else ''
+            body = ''.join(f'<li>{render_inline(" ".join(parts))}</li>' for parts in items)
+            html.append(f'<{kind}{start_attr}>{body}</{kind}>')
+            continue
+
+        paragraph.append(stripped)
+        i += 1
+
+    end_paragraph()
+    return '\n'.join(html)
@@ -0,0 +1,114 @@
+"""
+Read replicas.
+
+Views decorated with @read_from_replica run their queries against one of
+the aliases in settings.BLOG_READ_REPLICAS; everything else, and every
+write, goes to ``default``. After a client sends a POST (or any other
+unsafe request) ReplicaPinMiddleware sets a short-lived cookie that keeps
+its reads on the primary, so it sees its own writes even while the
+replicas lag behind.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Database alias reads are routed to for the current view; None means default
+_read_alias = contextvars.ContextVar('blog_read_alias', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'BLOG_READ_REPLICAS', []))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are snapshots of the primary, never migrated themselves
+        if db in replica_aliases():
+            return False
+        return None
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block, even in a replica-routed view"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def choose_replica(request):
+    """Replica alias for this request, or None to stay on the primary"""
+    replicas = replica_aliases()
+    if not replicas or request.method not in SAFE_METHODS or request.COOKIES.get(PIN_COOKIE):
+        return None
+    return random.choice(replicas)
+
+
+def read_from_replica(view_func):
+    """Route a read-only view's queries to a replica (see module docstring)"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            token = _read_alias.set(choose_replica(request))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+    else:
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            token = _read_alias.set(choose_replica(request))
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Pins a client's reads to the primary for a while after it writes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and replica_aliases():
+            # Must outlast the replication lag (the snapshot interval for SQLite stand-ins)
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'BLOG_REPLICA_STICKY_SECONDS', 30),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,241 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Everything is drawn from one ``random.Random(seed)``, so the same options
+against the same starting database always produce the same rows. Comment
+counts, authors and categories follow Zipf distributions (a few posts get
+most of the comments, a few authors write most of the posts) and post dates
+are spread evenly over the last ``years`` years.
+"""
+import bisect
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import caching, rendering, trending
+from .models import ArchiveMonth, Category, Comment, Post
+
+WORDS = '''
+    able about account across action active actual adapt advice after again agent agree ahead
+    album allow almost alone along already always amount analysis ancient angle animal annual
+    answer anyone apart apple approach area argue around arrive article artist aspect assume
+    attack autumn avoid balance basic beach beauty become before begin behind believe benefit
+    better beyond bicycle bird blue board boat body book border bottle brain branch bread bridge
+    bright bring budget build business butter cabin camera campaign capital carbon career carry
+    castle center chance change chapter cheese choice circle city classic clean climate close
+    cloud coast coffee collect colour common compare complete concept concert consider cook
+    corner country couple course cover craft create culture current cycle daily dance data
+    debate decide deep design detail develop device dinner direct discover distance django
+    doctor double dream drive early earth easy economy edge effect effort energy engine enjoy
+    enough entire error escape event evidence exact example expert explore factor family famous
+    farm feature field figure final finance flight flower focus follow forest format forward
+    fresh friend future garden gather general gentle giant glass global golden good grain green
+    group growth guide habit handle harbor health heavy history holiday honest horizon house
+    human idea image impact improve include index island journey kitchen knowledge lake language
+    large layer learn lesson letter level library light limit listen local logic machine market
+    memory method middle minute mirror model modern moment morning mountain museum music nature
+    network night north notice number object ocean office orange order origin paper pattern
+    people pepper period person picture planet plant play pocket poetry policy popular practice
+    present process project python query quick quiet radio rain reason recipe record region
+    remote report result river road rocket room route rule salad sample season second secret
+    server service shadow signal silver simple single sister skill small smart social software
+    solid sound source space speed spring square stable station story street strong studio
+    style summer system table teacher theory thread ticket timber today tomato travel tree
+    trust update valley value video village vision voice water weather window winter wonder
+    world writer yellow young
+'''.split()
+
+NAMES = '''
+    Alex Amira Ben Carla Dana Elena Farid Grace Hana Ivan Jonas Karim Lena Mariam Nadia Omar
+    Priya Quinn Rami Sara Tariq Uma Victor Wei Yara Zain
+'''.split()
+
+# Share of generated posts that are published / featured, and of comments that are active
+PUBLISHED_RATIO = 0.9
+FEATURED_RATIO = 0.01
+ACTIVE_COMMENT_RATIO = 0.97
+
+POST_FIELDS = (
+    'id', 'title', 'slug', 'content', 'excerpt', 'author', 'category', 'created_date',
+    'updated_date', 'published', 'featured', 'active_comment_count',
+    'word_count', 'reading_time', 'content_html',
+)
+COMMENT_FIELDS = ('post', 'name', 'email', 'content', 'created_date', 'active')
+
+
+def zipf_weights(n, exponent):
+    return [1 / rank ** exponent for rank in range(1, n + 1)]
+
+
+def zipf_counts(n, total, exponent, rng):
+    """Split ``total`` over ``n`` items by Zipf rank, with ranks shuffled over the items"""
+    weights = zipf_weights(n, exponent)
+    scale = total / sum(weights)
+    ranks = list(range(n))
+    rng.shuffle(ranks)
+    counts = []
+    for rank in ranks:
+        expected = weights[rank] * scale
+        whole = int(expected)
+        counts.append(whole + (rng.random() < expected - whole))
+    return counts
+
+
+def sentence(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize()
+
+
+def paragraphs(rng, count, min_words=30, max_words=80):
+    return '\n\n'.join(sentence(rng, min_words, max_words) + '.' for _ in range(count))
+
+
+def insert_rows(model, fields, rows):
+    """
+    Plain executemany INSERT of value tuples. Building model instances and
+    compiling bulk_create batches costs more than the insert itself at
+    millions of rows, and this also keeps explicit auto_now_add dates.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows
+        )
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class SyntheticData:
+    def __init__(self, posts, comments_per_post=5, authors=10, categories=8, years=5,
+                 batch_size=5000, seed=0, zipf_exponent=1.1, log=None):
+        self.posts = posts
+        self.comments_per_post = comments_per_post
+        self.authors = authors
+        self.categories = categories
+        self.years = years
+        self.batch_size = batch_size
+        self.zipf_exponent = zipf_exponent
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        # Anchor dates to the start of today so re-runs on the same day match exactly
+        self.end = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=365 * years)
+
+    def run(self):
+        self.author_ids = self.create_authors()
+        self.category_ids = self.create_categories()
+        self.author_weights = list(accumulate(zipf_weights(len(self.author_ids), self.zipf_exponent)))
+        self.category_weights = list(accumulate(zipf_weights(len(self.category_ids), self.zipf_exponent)))
+        # Posts get explicit ids so comments can reference them without reading them back
+        self.first_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        # Reused pools keep per-row generation cheap; titles and bodies stay unique
+        self.comment_texts = [sentence(self.rng, 4, 30) + '.' for _ in range(5000)]
+        self.emails = [f'{name.lower()}{n}@example.com' for name in NAMES for n in range(1, 200)]
+        comment_counts = zipf_counts(
+            self.posts, self.posts * self.comments_per_post, self.zipf_exponent, self.rng
+        )
+        created_posts = created_comments = 0
+        for start in range(0, self.posts, self.batch_size):
+            counts = comment_counts[start:start + self.batch_size]
+            with transaction.atomic():
+                posts = self.create_posts(start, counts)
+            created_comments += self.create_comments(posts)
+            created_posts += len(posts)
+            self.log(f'{created_posts}/{self.posts} posts, {created_comments} comments')
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post]):
+                cursor.execute(sql)
+        # Bulk inserts bypass Post.save and the signals that invalidate cached blocks
+        ArchiveMonth.objects.rebuild()
+        trending.rebuild()
+        caching.invalidate(caching.POSTS, caching.CATEGORIES, caching.COMMENTS, caching.SEARCH)
+        return created_posts, created_comments
+
+    def create_authors(self):
+        names = [f'author{i:05d}' for i in range(1, self.authors + 1)]
+        existing = set(User.objects.filter(username__startswith='author').values_list('username', flat=True))
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, email=f'{name}@example.com', password=password)
+             for name in names if name not in existing],
+            batch_size=self.batch_size,
+        )
+        ids = dict(User.objects.filter(username__startswith='author').values_list('username', 'id'))
+        return [ids[name] for name in names]
+
+    def create_categories(self):
+        names = [f'Topic {i:04d}' for i in range(1, self.categories + 1)]
+        existing = set(Category.objects.filter(name__startswith='Topic ').values_list('name', flat=True))
+        Category.objects.bulk_create(
+            [Category(name=name, description=sentence(self.rng, 6, 12))
+             for name in names if name not in existing],
+            batch_size=self.batch_size,
+        )
+        ids = dict(Category.objects.filter(name__startswith='Topic ').values_list('name', 'id'))
+        return [ids[name] for name in names]
+
+    def pick(self, ids, cumulative_weights):
+        return ids[bisect.bisect(cumulative_weights, self.rng.random() * cumulative_weights[-1])]
+
+    def create_posts(self, start, comment_counts):
+        """Insert one batch of posts; returns (id, created_date, comments, active comments) per post"""
+        rng = self.rng
+        span = (self.end - self.start).total_seconds()
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows, posts = [], []
+        for i, comment_count in enumerate(comment_counts, start=start):
+            post_id = self.first_id + i
+            title = sentence(rng, 3, 8)
+            content = paragraphs(rng, rng.randint(1, 4))
+            published = rng.random() < PUBLISHED_RATIO
+            # Evenly spread with jitter, so ids still grow with dates as in a real blog
+            created_date = self.start + timedelta(seconds=span * (i + rng.random()) / self.posts)
+            active = sum(rng.random() < ACTIVE_COMMENT_RATIO for _ in range(comment_count))
+            rows.append((
+                post_id, title, f'{slugify(title)[:180]}-{post_id}', content, content[:250] + '...',
+                self.pick(self.author_ids, self.author_weights),
+                self.pick(self.category_ids, self.category_weights),
+                connection.ops.adapt_datetimefield_value(created_date), now,
+                published, published and rng.random() < FEATURED_RATIO, active,
+                *rendering.reading_stats(content), rendering.render_markdown(content),
+            ))
+            posts.append((post_id, created_date, comment_count, active))
+        insert_rows(Post, POST_FIELDS, rows)
+        return posts
+
+    def generate_comments(self, posts):
+        rng = self.rng
+        adapt = connection.ops.adapt_datetimefield_value
+        for post_id, created_date, total, active in posts:
+            window = (self.end - created_date).total_seconds()
+            for n in range(total):
+                yield (
+                    post_id, rng.choice(NAMES), rng.choice(self.emails), rng.choice(self.comment_texts),
+                    # Most comments arrive soon after the post is published
+                    adapt(created_date + timedelta(seconds=window * rng.random() ** 3)),
+                    # The first (total - active) are the inactive ones, so the counter is exact
+                    n >= total - active,
+                )
+
+    def create_comments(self, posts):
+        created = 0
+        for batch in batched(self.generate_comments(posts), self.batch_size):
+            with transaction.atomic():
+                insert_rows(Comment, COMMENT_FIELDS, batch)
+            created += len(batch)
+        return created
@@ -0,0 +1,192 @@
+import os
+import re
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+# Full-text search backed by an SQLite FTS5 virtual table.
+# The rowid of every FTS row is the id of the published Post it indexes.
+FTS_TABLE = 'blog_post_fts'
+
+# bm25() column weights: title, content, excerpt, author
+RANK_WEIGHTS = (10.0, 1.0, 2.0, 5.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+TOKENIZER = 'porter unicode61'
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, content, excerpt, author, category_id UNINDEXED, "
+    f"tokenize = '{TOKENIZER}')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def is_available():
+    """FTS5 is only used on SQLite; other backends fall back to icontains"""
+    return connection.vendor == 'sqlite'
+
+
+def build_match_expression(query, column=None):
+    """Turn free text into a safe FTS5 prefix query (all terms must match)"""
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ''
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    if column:
+        return f'{column} : ({terms})'
+    return terms
+
+
+# Private in-memory FTS table per thread, used to tokenize text exactly as the index does
+_scratch = threading.local()
+
+
+def _scratch_db():
+    if getattr(_scratch, 'pid', None) != os.getpid():
+        db = sqlite3.connect(':memory:')
+        db.execute(f"CREATE VIRTUAL TABLE scratch USING fts5(text, tokenize = '{TOKENIZER}')")
+        db.execute("CREATE VIRTUAL TABLE scratch_terms USING fts5vocab(scratch, 'instance')")
+        _scratch.db, _scratch.pid = db, os.getpid()
+    return _scratch.db
+
+
+def analyze(texts):
+    """The indexed terms (lowercased, Porter-stemmed) of each text, in order"""
+    db = _scratch_db()
+    with db:
+        db.execute("DELETE FROM scratch")
+        db.executemany("INSERT INTO scratch (rowid, text) VALUES (?, ?)", enumerate(texts))
+        terms = [[] for _ in texts]
+        for doc, term in db.execute("SELECT doc, term FROM scratch_terms ORDER BY doc, col, offset"):
+            terms[doc].append(term)
+    return terms
+
+
+def index_post(post):
+    """Insert, refresh or remove a single post in the full-text index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        if post.published:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content, excerpt, author, category_id) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [post.pk, post.title, post.content, post.excerpt,
+                 post.author.username, post.category_id],
+            )
+
+
+def unindex_post(post_id):
+    """Remove a post from the full-text index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Recreate the index from scratch and return the number of indexed posts"""
+    if not is_available():
+        return 0
+    posts = Post.objects.filter(published=True).select_related('author').values_list(
+        'id', 'title', 'content', 'excerpt', 'author__username', 'category_id'
+    ).order_by('id')
+
+    total = 0
+    # Searches keep seeing the old index until the new one is complete
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        batch = []
+        for row in posts.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_rows(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert_rows(cursor, batch)
+            total += len(batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _insert_rows(cursor, rows):
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, content, excerpt, author, category_id) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        rows,
+    )
+
+
+def search_post_ids(query, category_id=None, limit=None):
+    """Return ids of matching published posts, best match first"""
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    if limit is None:
+        limit = getattr(settings, 'BLOG_SEARCH_MAX_RESULTS', 1000)
+
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [expression]
+    if category_id:
+        sql += " AND category_id = %s"
+        params.append(int(category_id))
+    sql += f" ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_posts(queryset, query):
+    """Restrict a Post queryset to posts matching the search query"""
+    if not is_available():
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(excerpt__icontains=query) |
+            Q(author__username__icontains=query)
+        ).distinct()
+
+    expression = build_match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]
+    ))
+
+
+class RankedPosts:
+    """
+    Sequence of posts in relevance order that the Paginator can slice.
+    Only the ids of the current page are fetched from the posts table.
+    """
+
+    def __init__(self, post_ids, queryset):
+        self.post_ids = post_ids
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.post_ids)
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = self.post_ids[index]
+            posts = self.queryset.order_by().in_bulk(ids)
+            return [posts[post_id] for post_id in ids if post_id in posts]
+        return self[index:index + 1][0]
@@ -0,0 +1,220 @@
+"""
+Search-result cache.
+
+A search (query, category filter, sort) is normalized to the terms the
+full-text index actually matches on, lowercased and Porter-stemmed, in a
+canonical order, so "Running  Django" and "django runs" share one entry.
+The entry holds the ordered ids of every matching post (packed 8 bytes per
+id), and each page is then a slice of that list plus one ``in_bulk`` fetch;
+the total comes from the list's length instead of a COUNT query.
+
+Every cached search is also recorded in SearchCacheEntry. When a post is
+published, edited or deleted, the entries whose terms and category could
+match its old or new text are deleted, and the rest stay cached. The
+'popular' sort also depends on comment counts, so those entries carry the
+comments tag and any comment change retires them.
+
+Searches matching more than BLOG_SEARCH_CACHE_MAX_IDS posts are not
+cached; that verdict is remembered for BLOG_SEARCH_CACHE_BROAD_TIMEOUT
+seconds so repeats don't fetch the ids again. At most once a minute a miss
+also purges expired entries and the ones closest to expiry beyond
+BLOG_SEARCH_CACHE_MAX_QUERIES.
+"""
+import hashlib
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import caching, routers, search
+from .counters import chunked
+from .models import Post, SearchCacheEntry
+
+ORDERING = {
+    'newest': ('-created_date',),
+    'oldest': ('created_date',),
+    'popular': ('-active_comment_count', '-created_date'),
+    'title': ('title',),
+}
+
+HITS_KEY = 'search_cache_hits'
+MISSES_KEY = 'search_cache_misses'
+# Bumped on every post change, so a result computed across one is not stored
+CHANGES_KEY = 'search_cache_changes'
+# Held for PURGE_INTERVAL seconds by whichever process purges the entries
+PURGE_KEY = 'search_cache_purge'
+PURGE_INTERVAL = 60
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def normalize(query):
+    """Canonical form of a search query, or None when it cannot be cached"""
+    if not search.is_available():
+        # icontains matches the whole string, only case is irrelevant
+        return [query.lower()]
+    tokens = search.TOKEN_RE.findall(query.lower())
+    phrases = [' '.join(terms) for terms in search.analyze(tokens)]
+    if not phrases or not all(phrases):
+        return None
+    # All terms must match, so order and repeats don't change the results
+    return sorted(set(phrases))
+
+
+def _tags(sort):
+    return [caching.SEARCH, caching.COMMENTS] if sort == 'popular' else [caching.SEARCH]
+
+
+def _compute(query, category_id, sort, limit):
+    if sort == 'relevance':
+        return search.search_post_ids(query, category_id=category_id)
+    posts = Post.objects.filter(published=True)
+    if category_id:
+        posts = posts.filter(category_id=category_id)
+    ids = list(search.filter_posts(posts, query).order_by(*ORDERING[sort]).values_list('id', flat=True)[:limit + 1])
+    return None if len(ids) > limit else ids
+
+
+def post_ids(query, category_id=None, sort='relevance'):
+    """Ordered ids of the published posts matching a search, or None if it is too broad to cache"""
+    terms = normalize(query)
+    if terms is None or (sort not in ORDERING and sort != 'relevance'):
+        return None
+    category_id = int(category_id) if category_id else None
+    digest = hashlib.blake2b(repr((terms, category_id, sort)).encode(), digest_size=12).hexdigest()
+    key = caching.tagged_key(f'search_{digest}', _tags(sort))
+    broad_key = caching.tagged_key(f'search_broad_{digest}', [caching.SEARCH])
+
+    found = cache.get_many([key, broad_key])
+    if key in found:
+        _count(HITS_KEY)
+        return array('q', found[key]).tolist()
+    if broad_key in found:
+        return None
+    _count(MISSES_KEY)
+    if cache.add(PURGE_KEY, True, PURGE_INTERVAL):
+        purge()
+
+    limit = getattr(settings, 'BLOG_SEARCH_CACHE_MAX_IDS', 5000)
+    timeout = getattr(settings, 'BLOG_SEARCH_CACHE_TIMEOUT', 10 * 60)
+    changes = cache.get(CHANGES_KEY)
+    # Cached results outlive the request, so build them from the primary (see caching)
+    with routers.primary():
+        ids = _compute(query, category_id, sort, limit)
+    if ids is None:
+        cache.set(broad_key, True, getattr(settings, 'BLOG_SEARCH_CACHE_BROAD_TIMEOUT', 60))
+        return None
+    packed = array('q', ids).tobytes()
+    SearchCacheEntry.objects.bulk_create(
+        [SearchCacheEntry(
+            key=key, terms=terms, category=category_id, sort=sort, result_count=len(ids),
+            size=len(packed), expires=timezone.now() + timedelta(seconds=timeout),
+        )],
+        update_conflicts=True, unique_fields=['key'], update_fields=['result_count', 'size', 'expires'],
+    )
+    cache.set(key, packed, timeout)
+    if cache.get(CHANGES_KEY) != changes:
+        # A post changed while we searched and may not have seen our entry yet
+        cache.delete(key)
+    return ids
+
+
+def searchable(post):
+    """(category id, indexed texts) of a published post, None if unpublished"""
+    if not post.published:
+        return None
+    return post.category_id, (post.title, post.content, post.excerpt, post.author.username)
+
+
+def stored_searchable(post_id):
+    """searchable() for the post as currently saved in the database"""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'published', 'category_id', 'title', 'content', 'excerpt', 'author__username'
+    ).first()
+    if row is None or not row[0]:
+        return None
+    return row[1], row[2:]
+
+
+class _Document:
+    """One version of a post, matched against cached searches"""
+
+    def __init__(self, category_id, texts):
+        self.category_id = category_id
+        if search.is_available():
+            self.terms = sorted({term for terms in search.analyze(texts) for term in terms})
+        else:
+            self.texts = [text.lower() for text in texts]
+
+    def has_prefix(self, prefix):
+        i = bisect_left(self.terms, prefix)
+        return i < len(self.terms) and self.terms[i].startswith(prefix)
+
+    def could_match(self, entry):
+        if entry.category is not None and entry.category != self.category_id:
+            return False
+        if not search.is_available():
+            return any(entry.terms[0] in text for text in self.texts)
+        # Every query term is a prefix match; inside a phrase only the last
+        # one really is, so this errs towards invalidating
+        return all(self.has_prefix(term) for phrase in entry.terms for term in phrase.split())
+
+
+def invalidate_post(before, after):
+    """Drop cached searches either version of a changed post (searchable() or None) could match"""
+    _count(CHANGES_KEY)
+    versions = [_Document(*version) for version in (before, after) if version]
+    if not versions:
+        return 0
+    SearchCacheEntry.objects.filter(expires__lte=timezone.now()).delete()
+    stale = [
+        entry for entry in SearchCacheEntry.objects.only('key', 'terms', 'category')
+        if any(version.could_match(entry) for version in versions)
+    ]
+    if stale:
+        cache.delete_many([entry.key for entry in stale])
+        SearchCacheEntry.objects.filter(pk__in=[entry.pk for entry in stale]).delete()
+    return len(stale)
+
+
+def purge(max_entries=None):
+    """Drop expired entries, then the ones closest to expiry beyond ``max_entries``; returns how many"""
+    if max_entries is None:
+        max_entries = getattr(settings, 'BLOG_SEARCH_CACHE_MAX_QUERIES', 2000)
+    removed, _ = SearchCacheEntry.objects.filter(expires__lte=timezone.now()).delete()
+    # Every cached search needs its entry to be invalidated, so evict both
+    excess = list(SearchCacheEntry.objects.order_by('-expires').values_list('key', flat=True)[max_entries:])
+    for keys in chunked(excess, 500):
+        cache.delete_many(keys)
+        SearchCacheEntry.objects.filter(key__in=keys).delete()
+    return removed + len(excess)
+
+
+def clear():
+    """Retire every cached search (after bulk imports or an index rebuild)"""
+    caching.invalidate(caching.SEARCH)
+    SearchCacheEntry.objects.all().delete()
+
+
+def stats():
+    live = SearchCacheEntry.objects.filter(expires__gt=timezone.now())
+    totals = live.aggregate(results=Sum('result_count'), size=Sum('size'))
+    hits, misses = cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0)
+    return {
+        'cached searches': live.count(),
+        'cached post ids': totals['results'] or 0,
+        'memory bytes': totals['size'] or 0,
+        'hits': hits,
+        'misses': misses,
+        'hit rate': f'{hits / (hits + misses):.1%}' if hits + misses else 'n/a',
+    }
@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, related, search, search_cache, suggestions, trending
+from .models import ArchiveMonth, Post, Category, Comment
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    """Keep the full-text and autocomplete indexes in sync with the saved post"""
+    search.index_post(instance)
+    suggestions.update_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop deleted posts from the full-text and autocomplete indexes"""
+    search.unindex_post(instance.pk)
+    suggestions.remove_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Comment)
+def remember_counted_post(sender, instance, **kwargs):
+    """Comments loaded with only()/defer() look up their counted post while the row still exists"""
+    instance.stored_counted_post_id()
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    """Deletes (including admin bulk deletes and cascades) bypass Comment.save"""
+    if instance._counted_post_id:
+        Post.objects.filter(pk=instance._counted_post_id).update(
+            active_comment_count=F('active_comment_count') - 1
+        )
+
+
+@receiver(post_delete, sender=Post)
+def decrement_archive_month(sender, instance, **kwargs):
+    """Deletes (including admin bulk deletes) bypass Post.save"""
+    if isinstance(instance._archived_month, tuple):
+        ArchiveMonth.objects.adjust(instance._archived_month, -1)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_caches(sender, **kwargs):
+    caching.invalidate(caching.POSTS)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_caches(sender, **kwargs):
+    caching.invalidate(caching.CATEGORIES)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_caches(sender, **kwargs):
+    caching.invalidate(caching.COMMENTS)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def update_related_posts(sender, instance, **kwargs):
+    """Refresh the affected related-post lists once the change is committed"""
+    post_id = instance.pk
+    transaction.on_commit(lambda: related.schedule_update(post_id))
+
+
+@receiver(post_save, sender=Post)
+def update_trending_post(sender, instance, **kwargs):
+    trending.sync_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def record_trending_comment(sender, instance, created, **kwargs):
+    """Bulk-created comments bypass this; trending.rebuild() picks them up"""
+    if created and instance.active:
+        trending.record(instance.post_id, 'comment')
+
+
+@receiver(pre_save, sender=Post)
+def remember_searchable_post(sender, instance, raw=False, **kwargs):
+    """Cached searches the stored version matches must go too (see below)"""
+    instance._searchable_before = None if raw or instance.pk is None else search_cache.stored_searchable(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_cached_searches(sender, instance, **kwargs):
+    search_cache.invalidate_post(
+        getattr(instance, '_searchable_before', None), search_cache.searchable(instance)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_cached_searches_on_delete(sender, instance, **kwargs):
+    search_cache.invalidate_post(search_cache.searchable(instance), None)
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import trending
+from .counters import CachedCounter, DeltaBuffer, chunked
+from .models import PostStats
+
+
+def flush_view_deltas(deltas):
+    """Apply {(post_id, date): views} to the daily PostStats buckets"""
+    with transaction.atomic():
+        for batch in chunked(sorted(deltas.items()), 200):
+            PostStats.objects.bulk_create(
+                [PostStats(post_id=post_id, date=day) for (post_id, day), _ in batch],
+                ignore_conflicts=True,
+            )
+            match = Q()
+            whens = []
+            for (post_id, day), views in batch:
+                match |= Q(post_id=post_id, date=day)
+                whens.append(When(post_id=post_id, date=day, then=Value(views)))
+            PostStats.objects.filter(match).update(
+                views=F('views') + Case(*whens, default=Value(0), output_field=IntegerField())
+            )
+        # Reload the totals, which may be missing other workers' unflushed views
+        transaction.on_commit(lambda: view_counter.forget({post_id for post_id, _ in deltas}))
+
+
+view_buffer = DeltaBuffer(
+    'views',
+    flush_view_deltas,
+    interval=getattr(settings, 'BLOG_COUNTER_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'BLOG_COUNTER_MAX_PENDING', 1000),
+)
+
+
+def _stored_views(post_id):
+    stored = PostStats.objects.filter(post_id=post_id).aggregate(total=Sum('views'))['total']
+    pending = sum(
+        views for (pending_id, _), views in view_buffer.pending().items() if pending_id == post_id
+    )
+    return (stored or 0) + pending
+
+
+view_counter = CachedCounter('post_views_{}', _stored_views)
+
+
+def record_view(post_id):
+    """Count one page view and return the post's new total"""
+    if not getattr(settings, 'BLOG_TRACK_VIEWS', True):
+        return view_counter.get(post_id)
+    view_buffer.add((post_id, timezone.localdate()))
+    trending.record(post_id, 'view')
+    return view_counter.incr(post_id)
+
+
+def daily_views(post_id, days=30):
+    """[(date, views), ...] for the last ``days`` days, oldest first"""
+    since = timezone.localdate() - timezone.timedelta(days=days - 1)
+    return list(
+        PostStats.objects.filter(post_id=post_id, date__gte=since).order_by('date').values_list('date', 'views')
+    )
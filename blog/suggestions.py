@@ -0,0 +1,292 @@
+import heapq
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'Café' and 'cafe' share a prefix"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+class TitlePrefixIndex:
+    """
+    Per-process autocomplete index over published post titles.
+
+    Titles are split into normalized tokens stored as a sorted list of
+    (token, -post_id) pairs, so every prefix lookup is a bisect followed by
+    a short scan that sees the newest posts for each token first. A scan
+    stops after ``max_scan`` entries, so one or two letter queries cost the
+    same on any number of posts. Newer posts win when the memory budget is
+    exceeded; the ids are also kept in a heap, so finding the oldest post
+    to evict is O(log n).
+
+    The index is built once per process, in the background on the first
+    request (see preload()), and then kept current by the post signals
+    through add() and remove().
+    """
+
+    def __init__(self, max_bytes=None, max_scan=None):
+        self.max_bytes = max_bytes
+        self.max_scan = max_scan
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._build_thread = None
+        self._entries = []
+        self._titles = {}
+        self._normalized = {}
+        self._sizes = {}
+        self._ids = []  # min-heap of post ids; ids no longer in _titles are skipped lazily
+        self._bytes = 0
+        self._built = False
+        self._changes = None  # add()/remove() calls made while build() runs, replayed after it
+        self.build_seconds = 0.0
+        self.truncated = False
+        self.lookups = 0
+
+    # Building and maintenance
+
+    def build(self):
+        """Load every published title, newest first, until the budget is spent"""
+        started = time.perf_counter()
+        with self._lock:
+            self._changes = []
+        try:
+            titles = Post.objects.filter(published=True).order_by('-id').values_list('id', 'title')
+
+            entries = []
+            sizes = {}
+            total = 0
+            truncated = False
+            for post_id, title in titles.iterator(chunk_size=2000):
+                normalized = normalize(title)
+                post_entries = self._post_entries(post_id, normalized)
+                size = self._estimate_size(title, normalized, post_entries)
+                if self.max_bytes and total + size > self.max_bytes:
+                    truncated = True
+                    break
+                entries.extend(post_entries)
+                sizes[post_id] = (title, normalized, size)
+                total += size
+        except BaseException:
+            with self._lock:
+                self._changes = None
+            raise
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._titles = {post_id: title for post_id, (title, _, _) in sizes.items()}
+            self._normalized = {post_id: normalized for post_id, (_, normalized, _) in sizes.items()}
+            self._sizes = {post_id: size for post_id, (_, _, size) in sizes.items()}
+            self._ids = sorted(sizes)
+            self._bytes = total
+            self.truncated = truncated
+            self._built = True
+            # Saves that committed while the titles were being read
+            changes, self._changes = self._changes, None
+            for post_id, title in changes:
+                if title is None:
+                    self._remove(post_id)
+                else:
+                    self._add(post_id, title)
+            self.build_seconds = time.perf_counter() - started
+
+        logger.info(
+            'Built suggestion index: %d posts, %d tokens, ~%d bytes in %.3fs%s',
+            len(self._titles), len(self._entries), self._bytes, self.build_seconds,
+            ' (truncated by memory budget)' if truncated else '',
+        )
+
+    @property
+    def built(self):
+        return self._built
+
+    def ensure_built(self):
+        """Build now unless already built; waits for a build running in the background"""
+        if self._built:
+            return
+        with self._build_lock:
+            if not self._built:
+                self.build()
+
+    def build_in_background(self):
+        with self._lock:
+            if self._built or self._build_thread is not None:
+                return
+            self._build_thread = threading.Thread(
+                target=self._build_and_close, name='suggestion-index-build', daemon=True
+            )
+        self._build_thread.start()
+
+    def _build_and_close(self):
+        try:
+            self.ensure_built()
+        except Exception:
+            logger.exception('Building the suggestion index failed; the first lookup will retry')
+        finally:
+            self._build_thread = None
+            connections.close_all()
+
+    def add(self, post_id, title):
+        """Index (or re-index) a single post title"""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((post_id, title))
+            if self._built:
+                self._add(post_id, title)
+
+    def remove(self, post_id):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((post_id, None))
+            self._remove(post_id)
+
+    def _add(self, post_id, title):
+        self._remove(post_id)
+        normalized = normalize(title)
+        post_entries = self._post_entries(post_id, normalized)
+        size = self._estimate_size(title, normalized, post_entries)
+        for entry in post_entries:
+            insort(self._entries, entry)
+        self._titles[post_id] = title
+        self._normalized[post_id] = normalized
+        self._sizes[post_id] = size
+        self._bytes += size
+        heapq.heappush(self._ids, post_id)
+        if len(self._ids) > 2 * len(self._titles) + 64:
+            self._ids = sorted(self._titles)  # drop the skipped ids of removed or re-added posts
+        # Evict the oldest posts if we went over budget
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._titles) > 1:
+            oldest = heapq.heappop(self._ids)
+            if oldest in self._titles:
+                self._remove(oldest)
+                self.truncated = True
+
+    def _remove(self, post_id):
+        if self._titles.pop(post_id, None) is None:
+            return
+        for entry in self._post_entries(post_id, self._normalized.pop(post_id)):
+            index = bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+        self._bytes -= self._sizes.pop(post_id, 0)
+
+    @staticmethod
+    def _post_entries(post_id, normalized):
+        return [(token, -post_id) for token in set(TOKEN_RE.findall(normalized))]
+
+    @staticmethod
+    def _estimate_size(title, normalized, entries):
+        size = sys.getsizeof(title) + sys.getsizeof(normalized) + 2 * sys.getsizeof(0)
+        for entry in entries:
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[0]) + 8
+        return size
+
+    # Lookups
+
+    def _prefix_matches(self, prefix):
+        matches = set()
+        index = bisect_left(self._entries, (prefix,))
+        end = len(self._entries)
+        if self.max_scan:
+            end = min(end, index + self.max_scan)
+        while index < end:
+            token, negated_id = self._entries[index]
+            if not token.startswith(prefix):
+                break
+            matches.add(-negated_id)
+            index += 1
+        return matches
+
+    def suggest(self, query, limit=5):
+        """Return titles where every query term prefixes some title word"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.ensure_built()
+
+        with self._lock:
+            self.lookups += 1
+            # Match the rarest-looking (longest) term first to keep sets small
+            terms.sort(key=len, reverse=True)
+            candidates = self._prefix_matches(terms[0])
+            for term in terms[1:]:
+                if not candidates:
+                    break
+                candidates &= self._prefix_matches(term)
+
+            normalized_query = normalize(query.strip())
+            ranked = heapq.nsmallest(
+                limit,
+                candidates,
+                key=lambda post_id: (not self._normalized[post_id].startswith(normalized_query), -post_id),
+            )
+            return [self._titles[post_id] for post_id in ranked]
+
+    async def asuggest(self, query, limit=5):
+        """suggest() for async views; only a build leaves the event loop"""
+        if tokenize(query) and not self._built:
+            await sync_to_async(self.ensure_built)()
+        return self.suggest(query, limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'posts': len(self._titles),
+                'tokens': len(self._entries),
+                'approx_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'truncated': self.truncated,
+                'build_seconds': round(self.build_seconds, 4),
+                'lookups': self.lookups,
+            }
+
+
+title_index = TitlePrefixIndex(
+    max_bytes=getattr(settings, 'BLOG_SUGGESTION_INDEX_MAX_BYTES', 16 * 1024 * 1024),
+    max_scan=getattr(settings, 'BLOG_SUGGESTION_MAX_SCAN', 5000),
+)
+
+
+if hasattr(os, 'register_at_fork'):
+    # A build thread started before the fork does not run in the child
+    os.register_at_fork(after_in_child=lambda: setattr(title_index, '_build_thread', None))
+
+
+def preload(**kwargs):
+    """request_started hook: start building the index in the background on a process's first request"""
+    if not title_index.built and getattr(settings, 'BLOG_SUGGESTION_INDEX_PRELOAD', True):
+        title_index.build_in_background()
+
+
+def update_post(post):
+    """Signal hook: mirror a saved post into the index"""
+    if post.published:
+        title_index.add(post.pk, post.title)
+    else:
+        title_index.remove(post.pk)
+
+
+def remove_post(post_id):
+    title_index.remove(post_id)
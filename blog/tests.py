@@ -1,3 +1,1201 @@
-from django.test import TestCase
+import asyncio
+import base64
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import ResolverMatch, get_resolver, resolve
+
+from . import (
+    async_views, benchmarks, cache_backends, caching, likes, ratelimit, related, rendering, routers, search,
+    search_cache, stats, suggestions, trending, views,
+)
+from .context_processors import site_chrome
+from .counters import DeltaBuffer
+from .cache_backends import SQLiteCache, TieredCache
+from .management.commands.snapshot_replica import snapshot
+from .middleware import QueryBudgetExceeded, RequestMetricsMiddleware, query_budget
+from .models import (
+    ArchiveMonth, Category, Comment, Post, PostLikeCount, PostStats, RelatedPost, SearchCacheEntry, TrendingEpoch,
+    TrendingScore,
+)
+from .pagination import CursorPaginator, InvalidCursor, decode_cursor, encode_cursor
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_compute(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return 'value'
+
+    def run_parallel(self, workers=16, **kwargs):
+        barrier = threading.Barrier(workers)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(caching.get_or_compute('block', ['posts'], self.slow_compute, **kwargs))
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_cold_miss_computes_once(self):
+        results = self.run_parallel()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['value'] * 16)
+
+    def test_expiry_recomputes_once_while_serving_stale(self):
+        self.run_parallel(timeout=1, beta=0)
+        time.sleep(1.1)
+        results = self.run_parallel(timeout=1, beta=0)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(results, ['value'] * 16)
+
+    def test_invalidate_forces_recompute(self):
+        caching.get_or_compute('block', ['posts'], self.slow_compute)
+        caching.invalidate('comments')
+        caching.get_or_compute('block', ['posts'], self.slow_compute)
+        self.assertEqual(self.calls, 1)
+        caching.invalidate('posts')
+        caching.get_or_compute('block', ['posts'], self.slow_compute)
+        self.assertEqual(self.calls, 2)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        for location in ('worker0', 'worker1', 'bounded'):
+            self.addCleanup(cache_backends._local_tiers.pop, location, None)
+        # Distinct locations stand in for separate worker processes
+        self.workers = [self.worker(f'worker{i}') for i in range(2)]
+
+    def worker(self, location, **options):
+        return TieredCache(location, {'OPTIONS': dict({
+            'SHARED': 'shared', 'LOCAL_KEY_PATTERN': r'^block:[^:]+$',
+            'LOCAL_MAX_ENTRIES': 2, 'LOCAL_TIMEOUT': 60,
+        }, **options)})
+
+    def test_instances_share_local_tier(self):
+        first = self.workers[0]
+        first.set('block:posts1', ['a'])
+        thread_instance = []
+        thread = threading.Thread(target=lambda: thread_instance.append(self.worker('worker0')))
+        thread.start()
+        thread.join()
+        other = thread_instance[0]
+        self.assertIs(other.local, first.local)
+        self.assertIs(other.get('block:posts1'), first.get('block:posts1'))
+        self.assertEqual(first.stats()['hits'], 2)
+
+    def test_local_tier_serves_matching_keys_only(self):
+        first, second = self.workers
+        first.set('block:posts1', ['a'])
+        first.set('counter', 1)
+        value = second.get('block:posts1')
+        self.assertIs(second.get('block:posts1'), value)  # the same object, not unpickled again
+        self.assertEqual(second.stats()['hits'], 1)
+        first.incr('counter')
+        self.assertEqual(second.get('counter'), 2)
+        self.assertEqual(second.stats()['misses'], 1)
+
+    def test_invalidation_through_generation_keys(self):
+        first, second = self.workers
+        first.set('block:posts1', 'old')
+        self.assertEqual(second.get('block:posts1'), 'old')
+        # A new generation is a new key, so no worker can serve the old value
+        first.set('block:posts2', 'new')
+        self.assertEqual(second.get('block:posts2'), 'new')
+
+    def test_local_tier_is_bounded(self):
+        worker = self.worker('bounded', LOCAL_TIMEOUT=0.05)
+        for i in range(3):
+            worker.set(f'block:posts{i}', i)
+        self.assertEqual(len(worker.local), 2)
+        caches['shared'].set('block:posts2', 'rewritten')
+        self.assertEqual(worker.get('block:posts2'), 2)
+        time.sleep(0.1)
+        self.assertEqual(worker.get('block:posts2'), 'rewritten')
+
+
+def _incr_in_child(path, times):
+    backend = SQLiteCache(path, {'OPTIONS': {'CLEANUP_INTERVAL': 0}})
+    for _ in range(times):
+        backend.incr('hits')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {'OPTIONS': {'CLEANUP_INTERVAL': 0, 'MAX_ENTRIES': 10}})
+        self.addCleanup(self.cache.close)
+
+    def test_cache_api(self):
+        self.cache.set('post', {'title': 'Hello'})
+        self.assertEqual(self.cache.get('post'), {'title': 'Hello'})
+        self.assertFalse(self.cache.add('post', 'other'))
+        self.assertTrue(self.cache.add('new', True))
+        self.assertIs(self.cache.get('new'), True)
+        self.assertEqual(self.cache.get_many(['post', 'missing']), {'post': {'title': 'Hello'}})
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('count', 5)
+        self.assertEqual(self.cache.incr('count', 2), 7)
+        self.assertTrue(self.cache.delete('count'))
+        self.assertIsNone(self.cache.get('count'))
+
+    def test_expired_entries_are_ignored_and_cleaned_up(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('long', 1, timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.cache.set('short', 1, timeout=0.05)
+        for i in range(12):
+            self.cache.set(f'filler{i}', i)
+        time.sleep(0.1)
+        self.assertGreaterEqual(self.cache.cleanup(), 4)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('long'), 1)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('hits', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_incr_in_child, args=(self.path, 200)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('hits'), 800)
+
+    def test_async_incr_is_atomic_and_keeps_the_timeout(self):
+        self.cache.set('hits', 0, timeout=3600)
+
+        async def burst():
+            await asyncio.gather(*(self.cache.aincr('hits') for _ in range(50)))
+
+        async_to_sync(burst)()
+        self.assertEqual(self.cache.get('hits'), 50)
+        with closing(sqlite3.connect(self.path)) as db:
+            expires = db.execute("SELECT expires FROM cache WHERE key LIKE '%hits'").fetchone()[0]
+        self.assertGreater(expires, time.time() + 3000)
+        self.assertTrue(async_to_sync(self.cache.aadd)('fresh', 1))
+        self.assertFalse(async_to_sync(self.cache.aadd)('fresh', 2))
+
+    def test_instances_share_connection_and_cleaner(self):
+        options = {'OPTIONS': {'CLEANUP_INTERVAL': 3600}}
+        first, second = SQLiteCache(self.path, options), SQLiteCache(self.path, options)
+        self.addCleanup(first.close)
+        connection = first._connection()
+        self.assertIs(second._connection(), connection)
+
+        with mock.patch('blog.cache_backends._create_schema') as create_schema:
+            thread = threading.Thread(target=lambda: (SQLiteCache(self.path, options).set('k', 1), second.close()))
+            thread.start()
+            thread.join()
+        create_schema.assert_not_called()
+        cleaners = [key for key in cache_backends._sqlite_cleaners if key[1] == self.path]
+        self.assertEqual(cleaners, [(os.getpid(), self.path)])
+
+        second.close()  # called on request_finished
+        self.assertIsNot(first._connection(), connection)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    router = routers.ReplicaRouter()
+
+    @staticmethod
+    @routers.read_from_replica
+    def view(request):
+        return routers.ReplicaRouter().db_for_read(Post)
+
+    @override_settings(BLOG_READ_REPLICAS=['replica'])
+    def test_reads_go_to_replica_unless_pinned(self):
+        factory = RequestFactory()
+        self.assertEqual(self.view(factory.get('/')), 'replica')
+        self.assertIsNone(self.view(factory.post('/')))
+        pinned = factory.get('/')
+        pinned.COOKIES[routers.PIN_COOKIE] = '1'
+        self.assertIsNone(self.view(pinned))
+        self.assertIsNone(self.router.db_for_read(Post))  # outside decorated views
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'blog'))
+
+    def test_no_replicas_configured(self):
+        self.assertIsNone(self.view(RequestFactory().get('/')))
+
+    @override_settings(BLOG_READ_REPLICAS=['replica'], BLOG_REPLICA_STICKY_SECONDS=15)
+    def test_writes_pin_the_client_to_the_primary(self):
+        middleware = routers.ReplicaPinMiddleware(lambda request: HttpResponse('ok'))
+        self.assertNotIn(routers.PIN_COOKIE, middleware(RequestFactory().get('/')).cookies)
+        cookie = middleware(RequestFactory().post('/')).cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+
+    def test_snapshot_copies_the_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source, target = (os.path.join(directory.name, name) for name in ('primary.db', 'replica.db'))
+        with closing(sqlite3.connect(source)) as primary:
+            primary.execute('CREATE TABLE post (title TEXT)')
+            primary.execute("INSERT INTO post VALUES ('Hello')")
+            primary.commit()
+        snapshot(source, target)
+        with closing(sqlite3.connect(target)) as replica:
+            self.assertEqual(replica.execute('SELECT title FROM post').fetchall(), [('Hello',)])
+
+    def test_snapshot_loop_retries_after_errors(self):
+        copy = mock.Mock(side_effect=[sqlite3.OperationalError('database is locked'), None, KeyboardInterrupt])
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('blog.management.commands.snapshot_replica.snapshot', copy), \
+                mock.patch('blog.management.commands.snapshot_replica.time.sleep'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('snapshot_replica', interval=1, stdout=stdout, stderr=stderr)
+            copy.side_effect = sqlite3.OperationalError('database is locked')
+            with self.assertRaises(CommandError):
+                call_command('snapshot_replica', stdout=stdout, stderr=stderr)
+        self.assertEqual(copy.call_count, 4)
+        self.assertIn('database is locked; retrying', stderr.getvalue())
+        self.assertIn('Copied', stdout.getvalue())
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run EXPLAIN QUERY PLAN on every query a view issues and fail on full
+    table scans or sorts that need a temporary B-tree.
+    """
+
+    # Queries allowed to sort without an index: bm25 relevance ranking and
+    # search results re-sorted by date (both bounded by the match count), and
+    # the per-category post counts (grouped over the small category table).
+    ALLOWED = ('blog_post_fts', 'FROM "blog_category"')
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        cls.category = Category.objects.create(name='Tech')
+        for i in range(6):
+            post = Post.objects.create(
+                title=f'Django tips {i}', slug=f'django-tips-{i}', content='Some content about Django',
+                author=author, category=cls.category, published=True, featured=i == 0,
+            )
+            Comment.objects.create(post=post, name='Reader', email='r@example.com', content='Nice')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+
+    def full_scans(self, url, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, url)
+
+        problems = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'blog_' not in sql or any(a in sql for a in self.ALLOWED):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                full_scan = step.startswith('SCAN blog_') and 'INDEX' not in step
+                if full_scan or 'TEMP B-TREE' in step:
+                    problems.append((step, sql))
+        return problems
+
+    def test_list_views_use_indexes(self):
+        year, month = self.post.created_date.year, self.post.created_date.month
+        urls = [
+            '/', '/?sort=oldest', '/?sort=popular', '/?sort=title', '/?cursor=',
+            f'/?category={self.category.id}', f'/?category={self.category.id}&sort=popular',
+            f'/?category={self.category.id}&sort=title', '/?search=django',
+            f'/category/{self.category.id}/', f'/category/{self.category.id}/?sort=popular',
+            f'/category/{self.category.id}/?sort=title', f'/category/{self.category.id}/?cursor=',
+            '/author/writer/', '/author/writer/?cursor=', f'/archive/{year}/',
+            f'/archive/{year}/{month}/', f'/archive/{year}/{month}/?cursor=', '/about/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.full_scans(url), [])
+
+    def test_post_detail_uses_indexes(self):
+        self.assertEqual(self.full_scans(self.post.get_absolute_url()), [])
+
+    def test_ajax_views_use_indexes(self):
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        self.assertEqual(self.full_scans('/ajax/load-more-posts/', **ajax), [])
+        self.assertEqual(self.full_scans(f'/ajax/load-more-posts/?category={self.category.id}', **ajax), [])
+        self.assertEqual(self.full_scans('/ajax/archive-calendar/'), [])
+
+
+class QueryBudgetTests(TestCase):
+    def run_view(self, budget, queries):
+        @query_budget(budget)
+        def view(request):
+            for _ in range(queries):
+                Post.objects.exists()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.resolver_match = ResolverMatch(view, (), {})
+        return RequestMetricsMiddleware(lambda request: view(request))(request)
+
+    def test_server_timing_reports_queries(self):
+        response = self.run_view(budget=5, queries=2)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(BLOG_QUERY_BUDGET_RAISE=True)
+    def test_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.run_view(budget=1, queries=3)
+
+    @override_settings(BLOG_QUERY_BUDGET_RAISE=False)
+    def test_over_budget_warns(self):
+        with self.assertLogs('blog.metrics', 'WARNING'):
+            self.run_view(budget=1, queries=3)
+
+
+class AsyncAjaxTests(TestCase):
+    ajax = {'X-Requested-With': 'XMLHttpRequest'}
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Tech')
+        cls.posts = [
+            Post.objects.create(
+                title=f'Django post {i}', slug=f'django-post-{i}', content='Django content',
+                author=author, category=category, published=True,
+            )
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_async_views_match_sync_views(self):
+        urls = ['/ajax/load-more-posts/', '/ajax/search-suggestions/?q=djan']
+        with override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(views)):
+            expected = [self.client.get(url, headers=self.ajax).json() for url in urls]
+        with override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(async_views)):
+            for url, sync_json in zip(urls, expected):
+                with self.subTest(url=url):
+                    response = async_to_sync(AsyncClient().get)(url, headers=self.ajax)
+                    self.assertEqual(response.json(), sync_json)
+            # Queries run on the async ORM's worker thread are still counted
+            response = async_to_sync(AsyncClient().get)(urls[0], headers=self.ajax)
+            self.assertIn('desc="1 queries"', response['Server-Timing'])
+            next_page = async_to_sync(AsyncClient().get)(
+                f'/ajax/load-more-posts/?cursor={expected[0]["next_cursor"]}', headers=self.ajax
+            ).json()
+        self.assertEqual([p['id'] for p in next_page['posts']], [self.posts[1].id, self.posts[0].id])
+
+    @override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(async_views))
+    async def test_like_toggles(self):
+        client = AsyncClient()
+        url = f'/ajax/like-post/{self.posts[0].id}/'
+        self.assertTrue(asyncio.iscoroutinefunction(async_views.like_post))
+        liked = (await client.post(url, headers=self.ajax)).json()
+        unliked = (await client.post(url, headers=self.ajax)).json()
+        self.assertEqual((liked['action'], liked['likes']), ('liked', 1))
+        self.assertEqual((unliked['action'], unliked['likes']), ('unliked', 0))
+        self.assertEqual((await client.get(url, headers=self.ajax)).status_code, 405)
+        self.assertEqual((await client.post('/ajax/like-post/0/', headers=self.ajax)).status_code, 404)
+
+    @override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(async_views))
+    async def test_concurrent_likes_are_all_counted(self):
+        client = AsyncClient()
+        post_id = self.posts[1].id
+        url = f'/ajax/like-post/{post_id}/'
+        self.assertEqual(await likes.like_counter.aget(post_id), 0)
+        responses = await asyncio.gather(*(
+            client.post(url, headers={**self.ajax, 'X-Forwarded-For': f'10.0.0.{n}'}) for n in range(40)
+        ))
+        self.assertEqual(sorted(response.json()['likes'] for response in responses), list(range(1, 41)))
+        self.assertEqual(await likes.like_counter.aget(post_id), 40)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(BLOG_RATE_LIMITS={'test': '100/h'})
+    def test_concurrent_hits_never_exceed_limit(self):
+        now = 3600 * 1000 + 10
+        allowed = []
+
+        def client():
+            for _ in range(25):
+                allowed.append(ratelimit.hit('test', 'ip', now=now)[0])
+
+        threads = [threading.Thread(target=client) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 100)
+
+    @override_settings(BLOG_RATE_LIMITS={'like': '30/m'})
+    def test_concurrent_async_hits_never_exceed_limit(self):
+        async def burst():
+            return await asyncio.gather(*(ratelimit.ahit('like', 'ip', now=600 * 1000) for _ in range(60)))
+
+        results = async_to_sync(burst)()
+        self.assertEqual([allowed for allowed, _ in results].count(True), 30)
+        self.assertEqual(cache.get(ratelimit.KEY.format('like', 'ip', 10000)), 60)
+
+    @override_settings(BLOG_RATE_LIMITS={'test': '10/m'})
+    def test_previous_window_is_weighted(self):
+        start = 60 * 1000
+        self.assertTrue(all(ratelimit.hit('test', 'ip', now=start + 50)[0] for _ in range(10)))
+        self.assertEqual(ratelimit.hit('test', 'ip', now=start + 55), (False, 16))
+        # 30% into the next window 70% of the previous one still counts: 11 * 0.7 = 7.7
+        results = [ratelimit.hit('test', 'ip', now=start + 78) for _ in range(3)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, False])
+        self.assertTrue(ratelimit.hit('test', 'other', now=start + 78)[0])
+
+    @override_settings(BLOG_RATE_LIMITS={'like': '2/m', 'comment': '1/h'})
+    def test_views_are_limited(self):
+        author = User.objects.create_user('writer', password='x')
+        post = Post.objects.create(
+            title='Limited', slug='limited', content='Body', author=author, published=True
+        )
+        url = f'/ajax/like-post/{post.id}/'
+        ajax = {'X-Requested-With': 'XMLHttpRequest'}
+        statuses = [self.client.post(url, headers=ajax).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        with override_settings(ROOT_URLCONF=benchmarks.ajax_urlconf(async_views)):
+            response = async_to_sync(AsyncClient().post)(url, headers=ajax)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        comment = {'name': 'Ann', 'email': 'ann@example.com', 'content': 'Nice post'}
+        self.client.post(post.get_absolute_url(), comment)
+        self.client.post(post.get_absolute_url(), comment)
+        self.assertEqual(Comment.objects.filter(post=post).count(), 1)
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Tech')
+        for i in range(3):
+            Post.objects.create(
+                title=f'Django post {i}', slug=f'django-post-{i}', content='Django content',
+                author=author, category=category, published=True,
+            )
+
+    def test_every_route_responds(self):
+        routes = benchmarks.build_routes()
+        names = {url.name for url in get_resolver('blog.urls').url_patterns}
+        visited = {resolve(path.split('?')[0]).url_name for _, _, path, _ in routes}
+        self.assertEqual(visited, names)
+
+        with override_settings(BLOG_QUERY_BUDGET_RAISE=False):
+            results = benchmarks.run(requests=1, routes=routes)
+        self.assertEqual({name: r['status'] for name, r in results.items() if r['status'] != 200}, {})
+
+        for name, _, path, headers in routes:
+            if name.startswith('load_more_posts'):
+                data = self.client.get(path, **headers).json()
+                self.assertEqual((data['success'], len(data['posts'])), (True, 1), name)
+
+    def test_scratch_cache_leaves_the_shared_cache_alone(self):
+        cache.set('kept', 1)
+        with benchmarks.scratch_cache():
+            self.assertIsInstance(caches['shared'], SQLiteCache)
+            self.assertIsNone(cache.get('kept'))
+            cache.set('scratch', 1)
+            cache.clear()
+        self.assertEqual(cache.get('kept'), 1)
+        self.assertIsNone(cache.get('scratch'))
+
+    def test_compare_flags_extra_queries_and_slowdowns(self):
+        before = {'status': 200, 'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 3, 'cold_queries': 5, 'peak_kb': 100}
+        same = dict(before, p50_ms=11.0)
+        worse = dict(before, p50_ms=30.0, queries=4)
+        self.assertEqual(benchmarks.compare({'home': same}, {'home': before}), [])
+        self.assertEqual(len(benchmarks.compare({'home': worse}, {'home': before})), 2)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        same_time = timezone.now() - timedelta(days=1)
+        cls.posts = [
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='x', author=author, published=True,
+                                created_date=same_time if i < 3 else same_time + timedelta(minutes=i))
+            for i in range(8)
+        ]
+
+    def walk(self, paginator):
+        pages, page = [], paginator.page()
+        while True:
+            pages.append([post.title for post in page])
+            if not page.has_next():
+                return pages, page
+            page = paginator.page(page.next_cursor)
+
+    def test_walks_forwards_and_backwards_across_equal_timestamps(self):
+        paginator = CursorPaginator(Post.objects.all(), 3)
+        pages, last = self.walk(paginator)
+        self.assertEqual(pages, [
+            ['Post 7', 'Post 6', 'Post 5'], ['Post 4', 'Post 3', 'Post 2'], ['Post 1', 'Post 0'],
+        ])
+        middle = paginator.page(last.previous_cursor)
+        self.assertEqual([post.title for post in middle], pages[1])
+        first = paginator.page(middle.previous_cursor)
+        self.assertEqual([post.title for post in first], pages[0])
+        self.assertFalse(first.has_previous())
+
+        pages, _ = self.walk(CursorPaginator(Post.objects.all(), 5, descending=False))
+        self.assertEqual(pages, [[f'Post {i}' for i in range(5)], ['Post 5', 'Post 6', 'Post 7']])
+
+    def test_malformed_cursors_are_rejected(self):
+        infinite = base64.urlsafe_b64encode(b'["2024-01-01T00:00:00",Infinity,0]').decode()
+        huge = encode_cursor(timezone.now(), 2 ** 64)
+        for token in ('!!', 'bm90IGpzb24', infinite, huge):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+        self.assertEqual(self.client.get(
+            '/ajax/load-more-posts/', {'cursor': infinite}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        ).json()['success'], False)
+        response = self.client.get('/', {'cursor': infinite})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].object_list[0].title, 'Post 7')
+
+    def test_link_labels_follow_the_sort_order(self):
+        page = self.client.get('/', {'cursor': '', 'sort': 'oldest'})
+        self.assertContains(page, 'Newer<i')
+        self.assertNotContains(page, 'Older<i')
+        page = self.client.get('/', {'cursor': ''})
+        self.assertContains(page, 'Older<i')
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer', password='x')
+
+    def post(self, title, content='Notes', **kwargs):
+        return Post.objects.create(title=title, slug=title.lower().replace(' ', '-'), content=content,
+                                   author=self.author, **{'published': True, **kwargs})
+
+    def test_index_follows_saves_and_deletes(self):
+        post = self.post('Django tips', published=False)
+        self.assertEqual(search.search_post_ids('django'), [])
+        post.published = True
+        post.save()
+        self.assertEqual(search.search_post_ids('djan'), [post.pk])
+        post.title = 'Flask tips'
+        post.save()
+        self.assertEqual(search.search_post_ids('django'), [])
+        self.assertEqual(search.search_post_ids('flask tip'), [post.pk])
+        post.delete()
+        self.assertEqual(search.search_post_ids('flask'), [])
+
+    def test_title_matches_rank_above_content_matches(self):
+        in_content = self.post('Weekly notes', content='Running django on a small server')
+        in_title = self.post('Django server setup', content='Notes from the week')
+        self.assertEqual(search.search_post_ids('server django'), [in_title.pk, in_content.pk])
+        self.assertEqual(search.search_post_ids('"; DROP TABLE'), [])
+
+    def test_rebuild_indexes_only_published_posts(self):
+        published = self.post('Django tips')
+        self.post('Django drafts', published=False)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(search.rebuild_index(batch_size=1), 1)
+        self.assertEqual(search.search_post_ids('django'), [published.pk])
+
+
+class RelatedPostTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(BLOG_RELATED_INDEX_DIR=directory.name, BLOG_RELATED_TOP_K=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user('writer', password='x')
+        self.pasta, self.sauce, self.django = [
+            self.post(title, content) for title, content in (
+                ('Pasta dinner', 'Boil the pasta and stir in tomato sauce'),
+                ('Tomato sauce', 'Simmer tomato and garlic for the sauce'),
+                ('Django models', 'Define django models and run migrations'),
+            )
+        ]
+
+    def post(self, title, content):
+        return Post.objects.create(title=title, slug=title.lower().replace(' ', '-'), content=content,
+                                   author=self.author, published=True)
+
+    def related(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by('rank').values_list('related__title', flat=True))
+
+    def test_rebuild_then_incremental_updates(self):
+        related.rebuild()
+        self.assertEqual(self.related(self.pasta), ['Tomato sauce'])
+
+        garlic = self.post('Garlic pasta', 'Pasta with garlic and tomato')
+        related.update_post(garlic.id)  # normally run on commit
+        self.assertEqual(self.related(garlic), ['Pasta dinner', 'Tomato sauce'])
+        self.assertIn('Garlic pasta', self.related(self.pasta))
+
+        garlic.delete()
+        related.update_post(garlic.id)
+        self.assertEqual(self.related(self.pasta), ['Tomato sauce'])
+
+    def test_saves_are_queued_for_the_background_worker(self):
+        related.rebuild()
+        with override_settings(BLOG_RELATED_UPDATE_IN_BACKGROUND=True), \
+                mock.patch.object(related, '_ensure_worker'), \
+                self.captureOnCommitCallbacks(execute=True):
+            garlic = self.post('Garlic pasta', 'Pasta with garlic and tomato')
+        self.assertEqual(self.related(garlic), [])
+        self.assertEqual(related.apply_pending(), {garlic.id})
+        self.assertEqual(self.related(garlic), ['Pasta dinner', 'Tomato sauce'])
+
+    def test_concurrent_model_updates_are_serialized(self):
+        model = related.rebuild()
+        path = related.index_path()
+        vector = model.vectorize(related.document_terms('Pasta', 'tomato'))
+
+        def add_row(post_id):
+            with related.model_lock(path):
+                stored = related.SimilarityModel.load(path)
+                time.sleep(0.01)
+                stored.set_row(post_id, vector)
+                stored.save(path)
+
+        threads = [threading.Thread(target=add_row, args=(1000 + i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            set(related.SimilarityModel.load(path).post_ids) - set(model.post_ids), set(range(1000, 1008))
+        )
+
+
+class SuggestionIndexTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('writer', password='x')
+        for title in ('Cooking with Django', 'Django café notes', 'Coffee and code', 'Draft about coffee'):
+            Post.objects.create(title=title, slug=title.lower().replace(' ', '-'), content='x', author=author,
+                                published=not title.startswith('Draft'))
+        self.index = suggestions.TitlePrefixIndex()
+        self.index.build()
+
+    def test_title_prefix_matches_rank_first_then_newest(self):
+        self.assertEqual(self.index.suggest('co'), ['Coffee and code', 'Cooking with Django'])
+        self.assertEqual(self.index.suggest('django'), ['Django café notes', 'Cooking with Django'])
+        self.assertEqual(self.index.suggest('CAFE no'), ['Django café notes'])
+        self.assertEqual(self.index.suggest('django', limit=1), ['Django café notes'])
+
+    def test_add_remove_and_scan_cap(self):
+        self.index.add(100, 'Coding katas')
+        self.assertEqual(self.index.suggest('cod'), ['Coding katas', 'Coffee and code'])
+        self.index.remove(100)
+        self.assertEqual(self.index.suggest('cod'), ['Coffee and code'])
+        self.assertEqual(self.index.stats()['tokens'], 9)
+
+        self.index.max_scan = 1
+        self.assertEqual(len(self.index.suggest('c')), 1)
+
+    def test_budget_evicts_oldest_posts(self):
+        self.index.max_bytes = self.index.stats()['approx_bytes']
+        self.index.add(100, 'Coding katas')
+        self.index.add(101, 'Coding dojo')
+        self.assertEqual(self.index.suggest('coding'), ['Coding dojo', 'Coding katas'])
+        self.assertEqual(self.index.suggest('cooking'), [])  # the oldest post was evicted
+        self.assertTrue(self.index.stats()['truncated'])
+
+    def test_changes_during_a_build_are_kept(self):
+        index = suggestions.TitlePrefixIndex()
+        original = Post.objects.filter
+
+        def filter_and_save(*args, **kwargs):
+            index.add(100, 'Coding katas')  # a save committed while the titles are read
+            return original(*args, **kwargs)
+
+        with mock.patch.object(Post.objects, 'filter', filter_and_save):
+            index.build()
+        self.assertEqual(index.suggest('cod'), ['Coding katas', 'Coffee and code'])
+
+
+class LikeCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Drop likes left by earlier tests; their posts are gone
+        with mock.patch.object(likes.like_buffer, 'flush_func'):
+            likes.like_buffer.flush()
+        author = User.objects.create_user('writer', password='x')
+        self.post = Post.objects.create(title='A', slug='a', content='x', author=author, published=True)
+
+    def run_parallel(self, target, count):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker(i):
+            barrier.wait()
+            results.append(target(i))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def stored(self):
+        return PostLikeCount.objects.filter(post=self.post).values_list('count', flat=True).first()
+
+    def test_concurrent_toggles_are_all_counted_and_persisted(self):
+        self.assertEqual(likes.get_like_count(self.post.id), 0)  # load the counter before the threads start
+        results = self.run_parallel(lambda i: likes.toggle_like(self.post.id, f'visitor{i}'), 24)
+        self.assertEqual(sorted(count for _, count in results), list(range(1, 25)))
+        self.assertEqual(likes.like_buffer.flush(), 1)
+        self.assertEqual(self.stored(), 24)
+
+        # Once the cached total is gone it is rebuilt from the database and the buffer
+        likes.toggle_like(self.post.id, 'visitor0')
+        cache.delete(likes.like_counter.key_format.format(self.post.id))
+        self.assertEqual(likes.get_like_count(self.post.id), 23)
+
+    def test_flush_reloads_totals_missing_other_workers_likes(self):
+        likes.toggle_like(self.post.id, 'visitor')
+        cache.delete(likes.like_counter.key_format.format(self.post.id))
+        # Another worker reloads the evicted total without this process's buffered like
+        with mock.patch.object(likes.like_buffer, 'pending', return_value=0):
+            self.assertEqual(likes.get_like_count(self.post.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_buffer.flush()
+        self.assertEqual(likes.get_like_count(self.post.id), 1)
+
+    def test_double_clicks_toggle_at_most_once(self):
+        likes.get_like_count(self.post.id)
+        results = self.run_parallel(lambda i: likes.toggle_like(self.post.id, 'visitor'), 8)
+        liked = self.post.id in cache.get(likes.VISITOR_KEY.format('visitor'), ())
+        self.assertEqual(likes.get_like_count(self.post.id), int(liked))
+        self.assertEqual(likes.like_buffer.pending(self.post.id), int(liked))
+        self.assertEqual({action for action, _ in results} - {'liked', 'unliked'}, set())
+
+    def test_flush_batches_and_never_goes_negative(self):
+        other = Post.objects.create(title='B', slug='b', content='x', author=self.post.author)
+        likes.flush_like_deltas({self.post.id: 3, other.id: -2})
+        likes.flush_like_deltas({self.post.id: -1})
+        self.assertEqual(
+            dict(PostLikeCount.objects.values_list('post_id', 'count')), {self.post.id: 2, other.id: 0}
+        )
+
+    def test_adds_during_a_flush_are_kept_for_the_next_one(self):
+        flushed = []
+
+        def slow_flush(deltas):
+            time.sleep(0.01)
+            flushed.append(deltas)
+
+        buffer = DeltaBuffer('test', slow_flush, interval=0)
+
+        def add_and_flush(i):
+            for _ in range(50):
+                buffer.add(i % 4)
+            return buffer.flush()
+
+        self.run_parallel(add_and_flush, 8)
+        buffer.flush()
+        totals = {}
+        for deltas in flushed:
+            for key, delta in deltas.items():
+                totals[key] = totals.get(key, 0) + delta
+        self.assertEqual(totals, {key: 100 for key in range(4)})
+
+
+class ViewCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with mock.patch.object(stats.view_buffer, 'flush_func'):
+            stats.view_buffer.flush()
+        author = User.objects.create_user('writer', password='x')
+        self.post = Post.objects.create(title='A', slug='a', content='x', author=author, published=True)
+
+    def test_views_are_counted_then_flushed_into_daily_buckets(self):
+        for expected in (1, 2, 3):
+            response = self.client.get(self.post.get_absolute_url())
+            self.assertEqual(response.context['view_count'], expected)
+        self.assertFalse(PostStats.objects.exists())
+
+        today = timezone.localdate()
+        self.assertEqual(stats.view_buffer.flush(), 1)
+        stats.flush_view_deltas({(self.post.id, today): 2, (self.post.id, today - timedelta(days=1)): 4})
+        self.assertEqual(stats.daily_views(self.post.id), [(today - timedelta(days=1), 4), (today, 5)])
+
+        # A cold cache is refilled from the buckets plus anything still buffered
+        stats.record_view(self.post.id)
+        cache.clear()
+        self.assertEqual(stats.view_counter.get(self.post.id), 10)
+
+    @override_settings(BLOG_TRACK_VIEWS=False)
+    def test_tracking_can_be_turned_off(self):
+        self.assertEqual(stats.record_view(self.post.id), 0)
+        self.assertEqual(stats.view_buffer.pending(), {})
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('writer', password='x')
+
+    def changed_tags(self, change):
+        tags = [caching.POSTS, caching.CATEGORIES, caching.COMMENTS]
+        before = caching.get_generations(tags)
+        change()
+        after = caching.get_generations(tags)
+        return {tag for tag in tags if before[tag] != after[tag]}
+
+    def test_each_model_bumps_only_its_own_tag(self):
+        category = Category.objects.create(name='Tech')
+        post = Post.objects.create(title='A', slug='a', content='x', author=self.author, published=True)
+        comment = Comment.objects.create(post=post, name='n', email='n@example.com', content='c')
+
+        self.assertEqual(self.changed_tags(lambda: category.save()), {caching.CATEGORIES})
+        self.assertEqual(self.changed_tags(lambda: Post.objects.get(pk=post.pk).save()), {caching.POSTS})
+        self.assertEqual(self.changed_tags(lambda: comment.save()), {caching.COMMENTS})
+        # Queryset updates bypass the signals, so these invalidate explicitly
+        self.assertEqual(
+            self.changed_tags(lambda: Comment.objects.all().set_active(False)), {caching.COMMENTS}
+        )
+        self.assertEqual(self.changed_tags(ArchiveMonth.objects.rebuild), {caching.POSTS})
+        self.assertEqual(self.changed_tags(Comment.objects.get(pk=comment.pk).delete), {caching.COMMENTS})
+
+    def test_about_page_stats_follow_changes(self):
+        self.assertEqual(self.client.get('/about/').context['stats']['total_posts'], 0)
+        self.assertEqual(self.client.get('/about/').context['stats']['total_posts'], 0)
+        Post.objects.create(title='A', slug='a', content='x', author=self.author, published=True)
+        stats = self.client.get('/about/').context['stats']
+        self.assertEqual((stats['total_posts'], stats['latest_post'].title), (1, 'A'))
+        Category.objects.create(name='Tech')
+        self.assertEqual(self.client.get('/about/').context['stats']['total_categories'], 1)
+
+
+class CommentCountTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('writer', password='x')
+        self.post = Post.objects.create(title='A', slug='a', content='x', author=author, published=True)
+        self.other = Post.objects.create(title='B', slug='b', content='x', author=author, published=True)
+
+    def counts(self):
+        return list(Post.objects.order_by('pk').values_list('active_comment_count', flat=True))
+
+    def comment(self, **kwargs):
+        return Comment.objects.create(
+            **{'post': self.post, 'name': 'n', 'email': 'n@example.com', 'content': 'c', **kwargs}
+        )
+
+    def test_create_toggle_move_and_delete(self):
+        comment = self.comment()
+        self.comment(active=False)
+        self.assertEqual(self.counts(), [1, 0])
+
+        comment.active = False
+        comment.save()
+        self.assertEqual(self.counts(), [0, 0])
+        comment.active = True
+        comment.post = self.other
+        comment.save()
+        self.assertEqual(self.counts(), [0, 1])
+
+        comment.delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_deferred_fields_are_looked_up_when_needed(self):
+        comment = self.comment()
+        loaded = Comment.objects.only('content').get(pk=comment.pk)
+        self.assertIs(loaded._counted_post_id, Comment.DEFERRED_POST)
+        self.assertEqual(str(Comment.objects.defer('active').get(pk=comment.pk)), 'Comment by n on A')
+
+        loaded.active = False
+        loaded.save()
+        self.assertEqual(self.counts(), [0, 0])
+
+        self.comment()
+        Comment.objects.only('id').filter(active=True).delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_set_active_and_reconcile(self):
+        for _ in range(3):
+            self.comment(active=False)
+        self.comment(post=self.other)
+        self.assertEqual(Comment.objects.filter(post=self.post).set_active(True), 3)
+        self.assertEqual(self.counts(), [3, 1])
+        self.assertEqual(Comment.objects.all().set_active(False), 4)
+        self.assertEqual(self.counts(), [0, 0])
+
+        Comment.objects.update(active=True)
+        call_command('reconcile_comment_counts', '--dry-run', stdout=StringIO())
+        self.assertEqual(self.counts(), [0, 0])
+        call_command('reconcile_comment_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), [3, 1])
+
+
+class RenderingTests(TestCase):
+    def test_markdown_is_rendered_and_html_escaped(self):
+        html = rendering.render_markdown(
+            'Intro with **bold** <script>x()</script>\n\n- one\n- two\n\n[bad](javascript:x())'
+        )
+        self.assertIn('<strong>bold</strong>', html)
+        self.assertIn('&lt;script&gt;', html)
+        self.assertIn('<ul><li>one</li><li>two</li></ul>', html)
+        self.assertNotIn('href="javascript', html)
+
+    def test_links_and_placeholders_survive_emphasis(self):
+        html = rendering.render_inline('[*the* docs](https://example.com/a_b_c/__init__) and `x_y_`')
+        self.assertEqual(html, (
+            '<a href="https://example.com/a_b_c/__init__" rel="nofollow"><em>the</em> docs</a> '
+            'and <code>x_y_</code>'
+        ))
+        self.assertEqual(rendering.render_inline('a \x000\x00 b'), 'a 0 b')
+
+    def test_save_stores_derived_fields(self):
+        author = User.objects.create_user('writer', password='x')
+        post = Post.objects.create(title='T', slug='t', content='word ' * 450, author=author)
+        self.assertEqual((post.word_count, post.reading_time), (450, 2))
+        post.content = '*short*'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual((post.word_count, post.content_html), (1, '<p><em>short</em></p>'))
+
+
+class ArchiveMonthTests(TestCase):
+    def counts(self):
+        return dict(((m.year, m.month), m.post_count) for m in ArchiveMonth.objects.filter(post_count__gt=0))
+
+    def test_counts_follow_publish_move_and_delete(self):
+        author = User.objects.create_user('writer', password='x')
+        march = timezone.make_aware(datetime(2024, 3, 31, 23, 30))
+        post = Post.objects.create(title='A', slug='a', content='x', author=author, created_date=march)
+        self.assertEqual(self.counts(), {})
+
+        post.published = True
+        post.save()
+        self.assertEqual(self.counts(), {(2024, 3): 1})
+
+        post = Post.objects.get(pk=post.pk)
+        post.created_date = march + timedelta(hours=1)
+        post.save()
+        self.assertEqual(self.counts(), {(2024, 4): 1})
+
+        post.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_rebuild_and_calendar_endpoint(self):
+        author = User.objects.create_user('writer', password='x')
+        for i, month in enumerate((1, 1, 2)):
+            Post.objects.create(title=f'P{i}', slug=f'p{i}', content='x', author=author, published=True,
+                                created_date=timezone.make_aware(datetime(2023, month, 10)))
+        ArchiveMonth.objects.update(post_count=0)
+        ArchiveMonth.objects.rebuild()
+
+        response = self.client.get('/ajax/archive-calendar/')
+        self.assertEqual(
+            [(m['year'], m['month'], m['post_count']) for m in response.json()['months']],
+            [(2023, 2, 1), (2023, 1, 2)],
+        )
+        response = self.client.get('/archive/2023/1/')
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(self.client.get('/archive/2023/13/').status_code, 404)
+
+
+@override_settings(BLOG_TRENDING_HALF_LIFE=3600, BLOG_TRENDING_WEIGHTS={'comment': 5, 'like': 3, 'view': 1})
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        cls.tech = Category.objects.create(name='Tech')
+        cls.life = Category.objects.create(name='Life')
+        cls.a, cls.b, cls.c = [
+            Post.objects.create(title=f'Post {name}', slug=f'post-{name}', content='x', author=author,
+                                category=category, published=True)
+            for name, category in (('a', cls.tech), ('b', cls.tech), ('c', cls.life))
+        ]
+
+    def setUp(self):
+        # Start from an empty buffer; earlier tests may have left views in it
+        trending.trending_buffer.flush()
+        TrendingScore.objects.all().delete()
+        TrendingEpoch.objects.all().delete()
+
+    def flush_at(self, when, deltas):
+        with mock.patch('django.utils.timezone.now', return_value=when):
+            trending.flush_trending_deltas(deltas)
+
+    def test_recent_activity_outranks_decayed_activity(self):
+        start = timezone.now()
+        self.flush_at(start, {self.a.id: 4, self.c.id: 1})
+        # Two half-lives later a's 4 is worth 1; b's fresh 1.5 beats it
+        self.flush_at(start + timedelta(hours=2), {self.b.id: 1.5})
+        self.assertEqual(trending.top_posts(), [self.b, self.a, self.c])
+        self.assertEqual(trending.top_posts(category_id=self.tech.id), [self.b, self.a])
+        self.assertEqual(trending.top_posts(limit=1, category_id=self.life.id), [self.c])
+
+    def test_rebase_keeps_order_and_drops_decayed_rows(self):
+        start = timezone.now()
+        rebase = trending.REBASE_AFTER
+        self.flush_at(start, {self.a.id: 1})
+        self.flush_at(start + timedelta(hours=rebase - 2), {self.b.id: 1})
+        self.flush_at(start + timedelta(hours=rebase - 1), {self.c.id: 2})
+        self.flush_at(start + timedelta(hours=rebase, minutes=30), {self.a.id: 0.01})
+        self.assertEqual(TrendingEpoch.objects.get().started, start + timedelta(hours=rebase))
+        # a's first point decayed below MIN_SCORE and was dropped before its new one was added
+        self.assertEqual(trending.top_posts(), [self.c, self.b, self.a])
+        self.assertAlmostEqual(TrendingScore.objects.get(post=self.c).score, 1.0)
+        self.assertAlmostEqual(TrendingScore.objects.get(post=self.a).score, 0.01 * 2 ** 0.5)
+
+    def test_events_are_buffered_and_follow_the_post(self):
+        Comment.objects.create(post=self.a, name='Ann', email='ann@example.com', content='Hi')
+        self.assertGreaterEqual(trending.trending_buffer.pending(self.a.id), 5)
+        trending.trending_buffer.flush()
+        self.assertEqual(trending.top_posts(), [self.a])
+
+        self.a.category = self.life
+        self.a.save()
+        self.assertEqual(trending.top_posts(category_id=self.life.id), [self.a])
+        self.a.published = False
+        self.a.save()
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_rebuild_from_comment_history(self):
+        Comment.objects.bulk_create(
+            [Comment(post=self.b, name='Ann', email='ann@example.com', content='Hi')] * 2
+            + [Comment(post=self.c, name='Ann', email='ann@example.com', content='Hi')]
+        )
+        self.assertEqual(trending.rebuild(), 2)
+        self.assertEqual(trending.top_posts(), [self.b, self.c])
+        self.assertEqual(self.client.get(f'/category/{self.tech.id}/').context['trending_posts'], [self.b])
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='x')
+        cls.tech = Category.objects.create(name='Tech')
+        for i in range(8):
+            Post.objects.create(
+                title=f'Running Django {i}' if i % 2 else f'Cooking pasta {i}', slug=f'post-{i}',
+                content='Notes', author=cls.author, category=cls.tech, published=True,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_equivalent_queries_share_an_entry(self):
+        self.assertEqual(search_cache.normalize('Running  Django'), search_cache.normalize('django runs django'))
+        self.assertNotEqual(search_cache.normalize('django'), search_cache.normalize('django pasta'))
+
+    def test_pages_are_served_from_the_cached_ids(self):
+        first = self.client.get('/?search=running+django&sort=title')
+        self.assertEqual(first.context['total_posts'], 4)
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get('/?search=DJANGO+runs&sort=title')
+        self.assertEqual([p.title for p in again.context['page_obj']], [p.title for p in first.context['page_obj']])
+        self.assertFalse([q for q in queries.captured_queries if 'blog_post_fts' in q['sql'] or 'COUNT' in q['sql']])
+        stats = search_cache.stats()
+        self.assertEqual((stats['cached searches'], stats['hits'], stats['misses']), (1, 1, 1))
+        self.assertEqual(stats['memory bytes'], 4 * 8)
+
+    def test_only_searches_a_changed_post_could_match_are_invalidated(self):
+        self.assertEqual(len(search_cache.post_ids('django')), 4)
+        self.assertEqual(len(search_cache.post_ids('pasta', sort='newest')), 4)
+
+        pasta = Post.objects.get(slug='post-0')
+        pasta.content = 'More notes'
+        pasta.save()
+        self.assertEqual(SearchCacheEntry.objects.count(), 1)
+
+        # Gaining the terms counts as well as losing them
+        pasta.title = 'Running with Django'
+        pasta.save()
+        self.assertEqual(SearchCacheEntry.objects.count(), 0)
+        self.assertEqual(len(search_cache.post_ids('django')), 5)
+
+        Post.objects.get(slug='post-1').delete()
+        self.assertEqual(len(search_cache.post_ids('django')), 4)
+
+    def test_purge_caps_the_entries_it_tracks(self):
+        for query in ('django', 'pasta', 'running', 'cooking'):
+            search_cache.post_ids(query)
+        self.assertEqual(search_cache.purge(max_entries=2), 2)
+        self.assertEqual(SearchCacheEntry.objects.count(), 2)
+        kept = [search_cache.post_ids(query) is not None for query in ('django', 'pasta', 'running', 'cooking')]
+        self.assertEqual(search_cache.stats()['hits'], 2)
+        self.assertTrue(all(kept))
+
+    @override_settings(BLOG_SEARCH_CACHE_MAX_IDS=3)
+    def test_too_broad_verdict_is_remembered(self):
+        self.assertIsNone(search_cache.post_ids('django', sort='newest'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(search_cache.post_ids('django', sort='newest'))
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(SearchCacheEntry.objects.exists())
+
+
+class SiteChromeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        cls.tech = Category.objects.create(name='Tech')
+        Category.objects.create(name='Empty')
+        Post.objects.create(title='Footer post', slug='footer-post', content='x', author=author,
+                            category=cls.tech, published=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_nothing_is_fetched_until_a_template_reads_it(self):
+        with self.assertNumQueries(0):
+            site = site_chrome(RequestFactory().get('/'))['site']
+        with self.assertNumQueries(1):
+            self.assertEqual([c.name for c in site['categories']], ['Tech'])
+
+    def test_footer_on_every_page_is_cached(self):
+        response = self.client.get(f'/category/{self.tech.id}/')
+        self.assertContains(response, 'Tech (1)')
+        self.assertContains(response, 'Footer post')
+        self.assertContains(response, '1 posts, 0 comments')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/about/')
+        self.assertFalse([q for q in queries.captured_queries if 'blog_category' in q['sql']])
+
+        Category.objects.create(name='Art')
+        Post.objects.create(title='Art post', slug='art-post', content='x', author=User.objects.get(),
+                            category=Category.objects.get(name='Art'), published=True)
+        self.assertContains(self.client.get('/about/'), 'Art (1)')
@@ -0,0 +1,183 @@
+"""
+Trending posts.
+
+Every comment, like and page view adds its weight from
+``settings.BLOG_TRENDING_WEIGHTS`` to the post's score, and scores halve
+every ``BLOG_TRENDING_HALF_LIFE`` seconds. Decaying every row on a timer
+would rewrite the whole table, so scores are stored relative to a shared
+epoch instead:
+
+    stored    = sum(weight * 2 ** ((event time - epoch) / half_life))
+    score now = stored * 2 ** -((now - epoch) / half_life)
+
+All rows share the same decay factor, so ordering by the stored value is
+ordering by the current score: recording events is a relative UPDATE and
+the top N (overall or per category) is an index scan over N rows.
+
+Stored values grow with time. Once the epoch is REBASE_AFTER half-lives
+old, every row is scaled down by the same power of two (exact in floating
+point), rows that have decayed to nothing are dropped and the epoch moves
+forward. Events are buffered per process and flushed in batches, like
+views and likes. Changing the half-life invalidates stored scores; run
+``manage.py rebuild_trending`` afterwards.
+"""
+from collections import defaultdict
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .counters import DeltaBuffer, chunked
+from .models import Comment, Post, PostStats, TrendingEpoch, TrendingScore
+
+DEFAULT_WEIGHTS = {'comment': 5.0, 'like': 3.0, 'view': 1.0}
+
+# Half-lives between rebases, and how far back rebuild() looks
+REBASE_AFTER = 8
+HISTORY = 16
+
+# Rows below this (about the current score, right after a rebase) are dropped
+MIN_SCORE = 0.05
+
+
+def weights():
+    return getattr(settings, 'BLOG_TRENDING_WEIGHTS', DEFAULT_WEIGHTS)
+
+
+def half_life():
+    return getattr(settings, 'BLOG_TRENDING_HALF_LIFE', 60 * 60 * 24)
+
+
+def growth(when, epoch):
+    """Multiplier that turns a weight at ``when`` into a stored value relative to ``epoch``"""
+    return 2.0 ** ((when - epoch).total_seconds() / half_life())
+
+
+def current_epoch(now):
+    """The epoch to store scores against, rebasing first if it is due; call inside a transaction"""
+    state, _ = TrendingEpoch.objects.select_for_update().get_or_create(pk=1, defaults={'started': now})
+    steps = int((now - state.started).total_seconds() // half_life())
+    if steps >= REBASE_AFTER:
+        TrendingScore.objects.update(score=F('score') * Value(2.0 ** -steps))
+        TrendingScore.objects.filter(score__lt=MIN_SCORE).delete()
+        state.started += timedelta(seconds=steps * half_life())
+        state.save(update_fields=['started'])
+    return state.started
+
+
+def flush_trending_deltas(deltas):
+    """Apply {post_id: weight} to TrendingScore with one UPDATE per batch"""
+    now = timezone.now()
+    with transaction.atomic():
+        scale = growth(now, current_epoch(now))
+        for batch in chunked(sorted(deltas.items()), 200):
+            # Only published posts are ranked; the category is copied for per-category lists
+            categories = dict(
+                Post.objects.filter(pk__in=[post_id for post_id, _ in batch], published=True)
+                .values_list('id', 'category_id')
+            )
+            if not categories:
+                continue
+            TrendingScore.objects.bulk_create(
+                [TrendingScore(post_id=post_id, category_id=category_id)
+                 for post_id, category_id in categories.items()],
+                ignore_conflicts=True,
+            )
+            delta = Case(
+                *[When(post_id=post_id, then=Value(weight * scale))
+                  for post_id, weight in batch if post_id in categories],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+            TrendingScore.objects.filter(post_id__in=categories).update(score=F('score') + delta)
+
+
+trending_buffer = DeltaBuffer(
+    'trending',
+    flush_trending_deltas,
+    interval=getattr(settings, 'BLOG_COUNTER_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'BLOG_COUNTER_MAX_PENDING', 1000),
+)
+
+
+def record(post_id, event):
+    """Add one 'comment', 'like' or 'view' to the post's score"""
+    weight = weights().get(event, 0)
+    if weight:
+        trending_buffer.add(post_id, weight)
+
+
+async def arecord(post_id, event):
+    """record() for async views"""
+    weight = weights().get(event, 0)
+    if weight:
+        await trending_buffer.aadd(post_id, weight)
+
+
+def sync_post(post):
+    """Follow a saved post's category, and drop it from the rankings once unpublished"""
+    if post.published:
+        TrendingScore.objects.filter(post_id=post.pk).exclude(
+            category_id=post.category_id
+        ).update(category_id=post.category_id)
+    else:
+        TrendingScore.objects.filter(post_id=post.pk).delete()
+
+
+def top_posts(limit=5, category_id=None):
+    """The ``limit`` published posts with the highest current score, best first"""
+    # Queryset updates to Post bypass sync_post, so publication is checked again here
+    scores = TrendingScore.objects.filter(score__gt=0, post__published=True)
+    if category_id is not None:
+        scores = scores.filter(category_id=category_id)
+    return [
+        score.post for score in
+        scores.select_related('post__author', 'post__category').order_by('-score')[:limit]
+    ]
+
+
+def _day_midpoint(day, now):
+    """Views are bucketed per day; count them at midday, or now for today's bucket"""
+    midday = timezone.make_aware(datetime.combine(day, day_time(12)))
+    return min(midday, now)
+
+
+def rebuild():
+    """
+    Recompute every score from stored history (active comments and daily
+    views) against a fresh epoch. Likes are stored as totals without
+    timestamps, so they only count from the next like on.
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=HISTORY * half_life())
+    event_weights = weights()
+    scores = defaultdict(float)
+
+    comment_weight = event_weights.get('comment', 0)
+    if comment_weight:
+        comments = Comment.objects.filter(
+            active=True, post__published=True, created_date__gte=since
+        ).values_list('post_id', 'created_date')
+        for post_id, created in comments.iterator(chunk_size=2000):
+            scores[post_id] += comment_weight * growth(created, now)
+
+    view_weight = event_weights.get('view', 0)
+    if view_weight:
+        views = PostStats.objects.filter(
+            post__published=True, date__gte=timezone.localdate(since)
+        ).values_list('post_id', 'date', 'views')
+        for post_id, day, count in views.iterator(chunk_size=2000):
+            scores[post_id] += view_weight * count * growth(_day_midpoint(day, now), now)
+
+    categories = dict(Post.objects.filter(published=True).values_list('id', 'category_id'))
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=post_id, category_id=categories[post_id], score=score)
+             for post_id, score in scores.items() if score >= MIN_SCORE and post_id in categories],
+            batch_size=500,
+        )
+        TrendingEpoch.objects.update_or_create(pk=1, defaults={'started': now})
+    return TrendingScore.objects.count()
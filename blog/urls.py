@@ -1,28 +1,37 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'blog'
 
-urlpatterns = [
-    # Main pages
-    path('', views.home, name='home'),
-    path('about/', views.about, name='about'),
+
+def blog_patterns(ajax_views):
+    """The blog's URL patterns, taking the AJAX endpoints from blog.views or blog.async_views"""
+    return [
+        # Main pages
+        path('', views.home, name='home'),
+        path('about/', views.about, name='about'),
     
-    # Post detail
-    path('post/<slug:slug>/', views.post_detail, name='post_detail'),
+        # Post detail
+        path('post/<slug:slug>/', views.post_detail, name='post_detail'),
     
-    # Category posts
-    path('category/<int:category_id>/', views.category_posts, name='category_posts'),
+        # Category posts
+        path('category/<int:category_id>/', views.category_posts, name='category_posts'),
     
-    # Author posts
-    path('author/<str:username>/', views.author_posts, name='author_posts'),
+        # Author posts
+        path('author/<str:username>/', views.author_posts, name='author_posts'),
     
-    # Archive views
-    path('archive/<int:year>/', views.archive_year, name='archive_year'),
-    path('archive/<int:year>/<int:month>/', views.archive_month, name='archive_month'),
+        # Archive views
+        path('archive/<int:year>/', views.archive_year, name='archive_year'),
+        path('archive/<int:year>/<int:month>/', views.archive_month, name='archive_month'),
     
-    # AJAX endpoints
-    path('ajax/like-post/<int:post_id>/', views.like_post, name='like_post'),
-    path('ajax/search-suggestions/', views.search_suggestions, name='search_suggestions'),
-    path('ajax/load-more-posts/', views.load_more_posts, name='load_more_posts'),
-]
\ No newline at end of file
+        # AJAX endpoints
+        path('ajax/like-post/<int:post_id>/', ajax_views.like_post, name='like_post'),
+        path('ajax/search-suggestions/', ajax_views.search_suggestions, name='search_suggestions'),
+        path('ajax/load-more-posts/', ajax_views.load_more_posts, name='load_more_posts'),
+        path('ajax/archive-calendar/', views.archive_calendar, name='archive_calendar'),
+    ]
+
+
+# Native async AJAX views under ASGI (see myproject/asgi.py), sync ones under WSGI
+urlpatterns = blog_patterns(async_views if getattr(settings, 'BLOG_ASYNC_AJAX', False) else views)
@@ -6,87 +6,99 @@ from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from django.core.cache import cache
 from django.conf import settings
+from django.urls import reverse
+from datetime import date, datetime
 import json
-from .models import Post, Category, Comment
+from .models import ArchiveMonth, Post, Category, Comment, RelatedPost
 from .forms import CommentForm
+from . import search, search_cache, likes, stats, caching, ratelimit, trending
+from .suggestions import title_index
+from .pagination import CountedPaginator, CursorPaginator, InvalidCursor, use_cursor_pagination
+from .middleware import query_budget
+from .ratelimit import rate_limit
+from .routers import read_from_replica
 
+@query_budget(10)
+@read_from_replica
 def home(request):
     """Enhanced home page with latest posts, trending, and better search"""
     # Base queryset with optimizations
     posts = Post.objects.select_related('author', 'category').filter(published=True)
     
-    # Get featured posts (cached for 15 minutes)
-    featured_posts = cache.get('featured_posts')
-    if featured_posts is None:
-        featured_posts = Post.objects.select_related('author', 'category').filter(
-            published=True, featured=True
-        ).order_by('-created_date')[:3]
-        cache.set('featured_posts', featured_posts, 15 * 60)
-    
-    # Get categories with post counts (cached for 30 minutes)
-    categories = cache.get('categories_with_counts')
-    if categories is None:
-        categories = Category.objects.annotate(
-            post_count=Count('post', filter=Q(post__published=True))
-        ).filter(post_count__gt=0).order_by('name')
-        cache.set('categories_with_counts', categories, 30 * 60)
-    
-    # Enhanced search functionality
+    # Sidebar blocks are cached until a Post/Category/Comment change
+    # invalidates them (see blog.signals)
+    featured_posts = caching.get_or_compute(
+        'featured_posts', [caching.POSTS], get_featured_posts
+    )
+    categories = caching.get_or_compute(
+        'categories_with_counts', [caching.POSTS, caching.CATEGORIES], get_categories_with_counts
+    )
+    
+    # Full-text search (relevance ranked by default)
     search_query = request.GET.get('search', '').strip()
     category_filter = request.GET.get('category')
-    sort_by = request.GET.get('sort', 'newest')  # newest, oldest, popular, title
-    
-    if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) | 
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query) |
-            Q(author__username__icontains=search_query)
-        ).distinct()
+    default_sort = 'relevance' if search_query else 'newest'
+    sort_by = request.GET.get('sort', default_sort)  # relevance, newest, oldest, popular, title
+    if sort_by == 'relevance' and not (search_query and search.is_available()):
+        sort_by = 'newest'
     
     # Category filtering
     if category_filter and category_filter.isdigit():
         posts = posts.filter(category_id=category_filter)
         selected_category = get_object_or_404(Category, id=category_filter)
     else:
+        category_filter = None
         selected_category = None
     
+    # Searches are served from a cached list of matching ids (see
+    # blog.search_cache); only very broad ones are filtered per request
+    cached_ids = None
+    if search_query and not use_cursor_pagination(request, sort_by):
+        cached_ids = search_cache.post_ids(search_query, category_filter, sort_by)
+    if search_query and sort_by != 'relevance' and cached_ids is None:
+        posts = search.filter_posts(posts, search_query)
+    
     # Sorting options
-    if sort_by == 'oldest':
+    if cached_ids is not None:
+        posts = search.RankedPosts(cached_ids, posts)
+    elif sort_by == 'relevance':
+        posts = search.RankedPosts(
+            search.search_post_ids(search_query, category_id=category_filter),
+            posts,
+        )
+    elif sort_by == 'oldest':
         posts = posts.order_by('created_date')
     elif sort_by == 'popular':
-        posts = posts.annotate(
-            comment_count=Count('comments', filter=Q(comments__active=True))
-        ).order_by('-comment_count', '-created_date')
+        posts = posts.order_by('-active_comment_count', '-created_date')
     elif sort_by == 'title':
         posts = posts.order_by('title')
     else:  # newest (default)
         posts = posts.order_by('-created_date')
     
     # Enhanced pagination with error handling
-    paginator = Paginator(posts, 6)
-    page_number = request.GET.get('page', 1)
-    
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-    
-    # Get trending posts (most commented in last 7 days)
-    trending_posts = cache.get('trending_posts')
-    if trending_posts is None:
-        week_ago = timezone.now() - timezone.timedelta(days=7)
-        trending_posts = Post.objects.select_related('author', 'category').filter(
-            published=True,
-            created_date__gte=week_ago
-        ).annotate(
-            comment_count=Count('comments', filter=Q(comments__active=True))
-        ).filter(comment_count__gt=0).order_by('-comment_count')[:5]
-        cache.set('trending_posts', trending_posts, 60 * 60)  # 1 hour cache
+    cursor_mode = use_cursor_pagination(request, sort_by)
+    if cursor_mode:
+        page_obj = get_cursor_page(request, posts, 6, descending=sort_by != 'oldest')
+        total_posts = None
+    else:
+        paginator = Paginator(posts, 6)
+        page_number = request.GET.get('page', 1)
+        
+        try:
+            page_obj = paginator.page(page_number)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
+        total_posts = paginator.count
+    
+    # Trending posts: a top-N read of the decayed scores (see blog.trending).
+    # Scores move with every view, so the block only lives a few minutes.
+    trending_posts = caching.get_or_compute(
+        'trending_posts', [caching.POSTS], trending.top_posts,
+        timeout=getattr(settings, 'BLOG_TRENDING_CACHE_TIMEOUT', 5 * 60),
+    )
     
     # Recent posts for sidebar
     recent_posts = Post.objects.select_related('author').filter(
@@ -95,6 +107,7 @@ def home(request):
     
     context = {
         'page_obj': page_obj,
+        'archive_months': get_cached_archive_months(),
         'featured_posts': featured_posts,
         'trending_posts': trending_posts,
         'recent_posts': recent_posts,
@@ -102,26 +115,24 @@ def home(request):
         'selected_category': selected_category,
         'search_query': search_query,
         'sort_by': sort_by,
-        'total_posts': paginator.count,
+        'total_posts': total_posts,
+        'cursor_mode': cursor_mode,
         'has_filters': bool(search_query or category_filter),
     }
     return render(request, 'blog/home.html', context)
 
+@query_budget(12)
 def post_detail(request, slug):
     """Enhanced post detail page with view tracking and better related posts"""
     # Get post with related data
     post = get_object_or_404(
-        Post.objects.select_related('author', 'category').prefetch_related(
-            'comments__author' if hasattr(Comment, 'author') else 'comments'
-        ),
+        Post.objects.select_related('author', 'category'),
         slug=slug,
         published=True
     )
     
-    # Track post views (simple implementation)
-    view_count_key = f'post_views_{post.id}'
-    views = cache.get(view_count_key, 0)
-    cache.set(view_count_key, views + 1, 60 * 60 * 24)  # 24 hours
+    # Track post views: atomic cache counter, flushed to PostStats in batches
+    view_count = stats.record_view(post.id)
     
     # Get active comments with better ordering
     comments = post.comments.filter(active=True).order_by('-created_date')
@@ -131,36 +142,37 @@ def post_detail(request, slug):
     if request.method == 'POST':
         comment_form = CommentForm(request.POST)
         if comment_form.is_valid():
-            # Check for spam (simple rate limiting)
-            user_ip = get_client_ip(request)
-            recent_comments_key = f'comments_{user_ip}'
-            recent_comments = cache.get(recent_comments_key, 0)
+            # Spam protection: sliding-window limit per IP (BLOG_RATE_LIMITS['comment'])
+            allowed, _ = ratelimit.hit('comment', ratelimit.client_key(request))
             
-            if recent_comments >= 3:  # Max 3 comments per IP per hour
+            if not allowed:
                 messages.error(request, 'You have reached the comment limit. Please try again later.')
             else:
                 comment = comment_form.save(commit=False)
                 comment.post = post
                 comment.save()
                 
-                # Update rate limiting counter
-                cache.set(recent_comments_key, recent_comments + 1, 60 * 60)
-                
                 messages.success(request, 'Your comment has been added successfully!')
                 return redirect('blog:post_detail', slug=slug)
         else:
             messages.error(request, 'Please correct the errors below.')
     
-    # Enhanced related posts algorithm
-    related_posts = []
-    if post.category:
+    # Content-similar posts precomputed by blog.related (one indexed query)
+    related_posts = [
+        link.related for link in RelatedPost.objects.filter(
+            post=post, related__published=True
+        ).select_related('related__author', 'related__category').order_by('rank')[:3]
+    ]
+    
+    # Not built yet: fall back to the newest posts in the same category
+    if not related_posts and post.category:
         # First try: same category, exclude current post
         related_posts = list(Post.objects.select_related('author', 'category').filter(
             category=post.category,
             published=True
         ).exclude(id=post.id).order_by('-created_date')[:3])
     
-    # If not enough related posts, get recent posts from other categories
+    # If still not enough related posts, get recent posts from other categories
     if len(related_posts) < 3:
         additional_posts = Post.objects.select_related('author', 'category').filter(
             published=True
@@ -186,10 +198,6 @@ def post_detail(request, slug):
     except Post.DoesNotExist:
         next_post = None
     
-    # Reading time estimation (average 200 words per minute)
-    word_count = len(post.content.split())
-    reading_time = max(1, round(word_count / 200))
-    
     context = {
         'post': post,
         'comments': comments,
@@ -197,13 +205,16 @@ def post_detail(request, slug):
         'related_posts': related_posts,
         'previous_post': previous_post,
         'next_post': next_post,
-        'view_count': cache.get(view_count_key, 0),
-        'reading_time': reading_time,
-        'word_count': word_count,
-        'comment_count': comments.count(),
+        'view_count': view_count,
+        'like_count': likes.get_like_count(post.id),
+        'reading_time': post.reading_time,
+        'word_count': post.word_count,
+        'comment_count': post.active_comment_count,
     }
     return render(request, 'blog/post_detail.html', context)
 
+@query_budget(6)
+@read_from_replica
 def category_posts(request, category_id):
     """Enhanced category posts page with better filtering and stats"""
     category = get_object_or_404(Category, id=category_id)
@@ -219,26 +230,34 @@ def category_posts(request, category_id):
     if sort_by == 'oldest':
         posts = posts.order_by('created_date')
     elif sort_by == 'popular':
-        posts = posts.annotate(
-            comment_count=Count('comments', filter=Q(comments__active=True))
-        ).order_by('-comment_count', '-created_date')
+        posts = posts.order_by('-active_comment_count', '-created_date')
     elif sort_by == 'title':
         posts = posts.order_by('title')
     else:  # newest (default)
         posts = posts.order_by('-created_date')
     
     # Enhanced pagination
-    paginator = Paginator(posts, 9)  # More posts per page for category view
-    page_number = request.GET.get('page', 1)
-    
-    try:
-        page_obj = paginator.page(page_number)
-    except (PageNotAnInteger, EmptyPage):
-        page_obj = paginator.page(1)
-    
-    # Category statistics
-    total_posts = posts.count()
+    cursor_mode = use_cursor_pagination(request, sort_by)
+    if cursor_mode:
+        page_obj = get_cursor_page(request, posts, 9, descending=sort_by != 'oldest')
+        total_posts = None
+    else:
+        paginator = Paginator(posts, 9)  # More posts per page for category view
+        page_number = request.GET.get('page', 1)
+        
+        try:
+            page_obj = paginator.page(page_number)
+        except (PageNotAnInteger, EmptyPage):
+            page_obj = paginator.page(1)
+        
+        # Category statistics
+        total_posts = paginator.count
     recent_posts = posts.order_by('-created_date')[:3]
+    trending_posts = caching.get_or_compute(
+        f'trending_posts_{category.id}', [caching.POSTS],
+        lambda: trending.top_posts(category_id=category.id),
+        timeout=getattr(settings, 'BLOG_TRENDING_CACHE_TIMEOUT', 5 * 60),
+    )
     
     # Get other categories for sidebar
     other_categories = Category.objects.exclude(id=category_id).annotate(
@@ -249,24 +268,22 @@ def category_posts(request, category_id):
         'category': category,
         'page_obj': page_obj,
         'recent_posts': recent_posts,
+        'trending_posts': trending_posts,
         'other_categories': other_categories,
         'total_posts': total_posts,
         'sort_by': sort_by,
+        'cursor_mode': cursor_mode,
     }
     return render(request, 'blog/category_posts.html', context)
 
+@query_budget(6)
+@read_from_replica
 def about(request):
     """Enhanced about page with site statistics"""
     # Get site statistics
-    stats = cache.get('site_stats')
-    if stats is None:
-        stats = {
-            'total_posts': Post.objects.filter(published=True).count(),
-            'total_categories': Category.objects.count(),
-            'total_comments': Comment.objects.filter(active=True).count(),
-            'latest_post': Post.objects.filter(published=True).order_by('-created_date').first(),
-        }
-        cache.set('site_stats', stats, 60 * 60)  # 1 hour cache
+    stats = caching.get_or_compute(
+        'site_stats', [caching.POSTS, caching.CATEGORIES, caching.COMMENTS], get_site_stats
+    )
     
     context = {
         'stats': stats,
@@ -280,43 +297,30 @@ def about(request):
 
 # AJAX Views for enhanced functionality
 
+@query_budget(3)
 @require_POST
+@rate_limit('like')
 def like_post(request, post_id):
     """AJAX view to like/unlike posts"""
     if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         raise Http404()
     
     post = get_object_or_404(Post, id=post_id, published=True)
-    user_ip = get_client_ip(request)
-    like_key = f'post_like_{post_id}_{user_ip}'
-    
-    liked = cache.get(like_key)
-    if liked:
-        # Unlike
-        cache.delete(like_key)
-        action = 'unliked'
-    else:
-        # Like (expires in 24 hours)
-        cache.set(like_key, True, 60 * 60 * 24)
-        action = 'liked'
-    
-    # Get current like count (simplified - in production use a proper model field)
-    like_count_key = f'post_likes_{post_id}'
-    current_likes = cache.get(like_count_key, 0)
     
-    if action == 'liked':
-        current_likes += 1
-    else:
-        current_likes = max(0, current_likes - 1)
-    
-    cache.set(like_count_key, current_likes, 60 * 60 * 24)
+    # Deduplicated per visitor; the total is an atomic cache counter that is
+    # flushed to PostLikeCount in batches by a write-behind buffer
+    visitor = likes.visitor_id(get_client_ip(request))
+    action, like_count = likes.toggle_like(post.id, visitor)
     
     return JsonResponse({
         'success': True,
         'action': action,
-        'likes': current_likes
+        'likes': like_count
     })
 
+@query_budget(2)
+@rate_limit('search_suggestions')
+@read_from_replica
 def search_suggestions(request):
     """AJAX view for search autocomplete"""
     if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -326,121 +330,232 @@ def search_suggestions(request):
     if len(query) < 2:
         return JsonResponse({'suggestions': []})
     
-    # Search in post titles
-    suggestions = Post.objects.filter(
-        title__icontains=query,
-        published=True
-    ).values_list('title', flat=True)[:5]
+    # Answered from the in-process title index, no database round-trip
+    suggestions = title_index.suggest(query, limit=5)
     
-    return JsonResponse({'suggestions': list(suggestions)})
+    return JsonResponse({'suggestions': suggestions})
 
+@query_budget(2)
+@read_from_replica
 def load_more_posts(request):
     """AJAX view for infinite scroll"""
     if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         raise Http404()
     
-    page = request.GET.get('page', 1)
+    cursor = request.GET.get('cursor')
     category_id = request.GET.get('category')
     
     posts = Post.objects.select_related('author', 'category').filter(published=True)
     
-    if category_id:
+    if category_id and category_id.isdigit():
         posts = posts.filter(category_id=category_id)
     
-    paginator = Paginator(posts, 6)
+    # Keyset pagination: constant cost no matter how deep the user scrolls
+    paginator = CursorPaginator(posts, 6)
     
     try:
-        page_obj = paginator.page(page)
-        has_next = page_obj.has_next()
+        page_obj = paginator.page(cursor)
         
-        posts_data = []
-        for post in page_obj:
-            posts_data.append({
-                'id': post.id,
-                'title': post.title,
-                'excerpt': post.excerpt,
-                'author': post.author.username,
-                'created_date': post.created_date.strftime('%B %d, %Y'),
-                'category': post.category.name if post.category else None,
-                'url': post.get_absolute_url(),
-            })
+        posts_data = [post_summary(post) for post in page_obj]
         
         return JsonResponse({
             'success': True,
             'posts': posts_data,
-            'has_next': has_next,
-            'next_page': page_obj.next_page_number() if has_next else None
+            'has_next': page_obj.has_next(),
+            'next_cursor': page_obj.next_cursor
         })
     
-    except (EmptyPage, PageNotAnInteger):
-        return JsonResponse({'success': False, 'message': 'Invalid page'})
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'})
+
+# Cached building blocks
+
+def get_featured_posts():
+    return Post.objects.select_related('author', 'category').filter(
+        published=True, featured=True
+    ).order_by('-created_date')[:3]
+
+def get_categories_with_counts():
+    return Category.objects.annotate(
+        post_count=Count('post', filter=Q(post__published=True))
+    ).filter(post_count__gt=0).order_by('name')
+
+def get_archive_months():
+    return [
+        dict(row, first_day=date(row['year'], row['month'], 1))
+        for row in ArchiveMonth.objects.filter(post_count__gt=0).values('year', 'month', 'post_count')
+    ]
+
+def get_cached_archive_months():
+    return caching.get_or_compute('archive_months', [caching.POSTS], get_archive_months)
+
+def get_site_stats():
+    return {
+        'total_posts': Post.objects.filter(published=True).count(),
+        'total_categories': Category.objects.count(),
+        'total_comments': Comment.objects.filter(active=True).count(),
+        'latest_post': Post.objects.filter(published=True).order_by('-created_date').first(),
+    }
 
 # Utility Functions
 
+def archive_range(year, month=None):
+    """
+    Half-open [start, end) datetimes for a year or month in the current time
+    zone. Range lookups can use the created_date index, unlike __year/__month
+    which wrap the column in date functions.
+    """
+    try:
+        start = datetime(year, month or 1, 1)
+        if month is None or month == 12:
+            end = datetime(year + 1, 1, 1)
+        else:
+            end = datetime(year, month + 1, 1)
+    except (ValueError, OverflowError):
+        raise Http404('No archive for that date')
+    return timezone.make_aware(start), timezone.make_aware(end)
+
 def get_client_ip(request):
     """Get client IP address"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    return ratelimit.client_ip(request)
+
+def post_summary(post):
+    """JSON-ready card data for infinite scroll"""
+    return {
+        'id': post.id,
+        'title': post.title,
+        'excerpt': post.excerpt,
+        'author': post.author.username,
+        'created_date': post.created_date.strftime('%B %d, %Y'),
+        'category': post.category.name if post.category else None,
+        'url': post.get_absolute_url(),
+    }
+
+def get_cursor_page(request, posts, per_page, descending=True):
+    """Keyset page for the ?cursor= token; malformed cursors show the first page"""
+    paginator = CursorPaginator(posts, per_page, descending=descending)
+    try:
+        page_obj = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page_obj = paginator.page()
+    
+    # Keep the other filters (search, category, sort) in the next/previous links
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
+    page_obj.base_query = params.urlencode()
+    return page_obj
 
 # Archive Views
 
+@query_budget(4)
+@read_from_replica
 def archive_year(request, year):
     """Posts archive by year"""
+    start, end = archive_range(year)
     posts = Post.objects.select_related('author', 'category').filter(
-        created_date__year=year,
+        created_date__gte=start,
+        created_date__lt=end,
         published=True
     ).order_by('-created_date')
     
-    paginator = Paginator(posts, 12)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    archive_months = get_cached_archive_months()
+    post_count = sum(m['post_count'] for m in archive_months if m['year'] == year)
+    
+    cursor_mode = use_cursor_pagination(request)
+    if cursor_mode:
+        page_obj = get_cursor_page(request, posts, 12)
+    else:
+        # The total comes from ArchiveMonth instead of a COUNT(*) over the range
+        paginator = CountedPaginator(posts, 12, post_count)
+        page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
         'year': year,
         'page_obj': page_obj,
-        'archive_type': 'year'
+        'post_count': post_count,
+        'archive_months': archive_months,
+        'archive_type': 'year',
+        'cursor_mode': cursor_mode,
     }
     return render(request, 'blog/archive.html', context)
 
+@query_budget(4)
+@read_from_replica
 def archive_month(request, year, month):
     """Posts archive by month"""
+    start, end = archive_range(year, month)
     posts = Post.objects.select_related('author', 'category').filter(
-        created_date__year=year,
-        created_date__month=month,
+        created_date__gte=start,
+        created_date__lt=end,
         published=True
     ).order_by('-created_date')
     
-    paginator = Paginator(posts, 12)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    archive_months = get_cached_archive_months()
+    post_count = next(
+        (m['post_count'] for m in archive_months if (m['year'], m['month']) == (year, month)), 0
+    )
+    
+    cursor_mode = use_cursor_pagination(request)
+    if cursor_mode:
+        page_obj = get_cursor_page(request, posts, 12)
+    else:
+        paginator = CountedPaginator(posts, 12, post_count)
+        page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
         'year': year,
         'month': month,
+        'month_start': start,
         'page_obj': page_obj,
-        'archive_type': 'month'
+        'post_count': post_count,
+        'archive_months': archive_months,
+        'archive_type': 'month',
+        'cursor_mode': cursor_mode,
     }
     return render(request, 'blog/archive.html', context)
 
+@query_budget(1)
+@read_from_replica
+def archive_calendar(request):
+    """JSON archive calendar: published post counts per month, newest first"""
+    months = [
+        {
+            'year': m['year'],
+            'month': m['month'],
+            'post_count': m['post_count'],
+            'url': reverse('blog:archive_month', args=[m['year'], m['month']]),
+        }
+        for m in get_cached_archive_months()
+    ]
+    return JsonResponse({'months': months})
+
 # Author profile view
+@query_budget(4)
+@read_from_replica
 def author_posts(request, username):
     """Posts by specific author"""
     from django.contrib.auth.models import User
     
     author = get_object_or_404(User, username=username)
-    posts = Post.objects.select_related('category').filter(
+    posts = Post.objects.select_related('author', 'category').filter(
         author=author,
         published=True
     ).order_by('-created_date')
     
-    paginator = Paginator(posts, 8)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    cursor_mode = use_cursor_pagination(request)
+    if cursor_mode:
+        page_obj = get_cursor_page(request, posts, 8)
+        total_posts = None
+    else:
+        paginator = Paginator(posts, 8)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        total_posts = paginator.count
     
     context = {
         'author': author,
         'page_obj': page_obj,
-        'total_posts': posts.count()
+        'total_posts': total_posts,
+        'cursor_mode': cursor_mode,
     }
     return render(request, 'blog/author_posts.html', context)
\ No newline at end of file
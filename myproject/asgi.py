@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# Serve the AJAX endpoints from blog.async_views (see BLOG_ASYNC_AJAX)
+os.environ.setdefault('BLOG_ASYNC_AJAX', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +27,8 @@ SECRET_KEY = 'django-insecure-($_w5q3erx_l&rxbl_zjr63(g4v)d%#l-_6dpnp2f-$w8f88hz
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -44,6 +48,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'blog.middleware.RequestMetricsMiddleware',
+    'blog.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,7 +62,7 @@ ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'blog.template_backends.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blog.context_processors.site_chrome',
             ],
         },
     },
@@ -82,6 +89,84 @@ DATABASES = {
     }
 }
 
+# Database profiles, picked with the BLOG_DB_PROFILE environment variable.
+# 'production' uses WAL so readers never wait for a writer, takes the write
+# lock at BEGIN (waiting up to 'timeout' seconds) instead of failing when a
+# read transaction has to upgrade, sizes mmap and the page cache for the
+# whole working set, and keeps health-checked connections open between
+# requests.
+BLOG_DB_PROFILES = {
+    'default': {},
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 5,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    },
+}
+BLOG_DB_PROFILE = os.environ.get('BLOG_DB_PROFILE', 'default')
+DATABASES['default'].update(BLOG_DB_PROFILES[BLOG_DB_PROFILE])
+
+# Local stand-in for a read replica: a SQLite snapshot of the primary,
+# refreshed by `manage.py snapshot_replica --interval N`. Read-only views
+# only use the aliases listed in BLOG_READ_REPLICAS (environment variable,
+# comma-separated); clients stay on the primary for
+# BLOG_REPLICA_STICKY_SECONDS after a write, which must exceed the lag.
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'var' / 'replica.sqlite3',
+    'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+    'CONN_HEALTH_CHECKS': DATABASES['default'].get('CONN_HEALTH_CHECKS', False),
+    'OPTIONS': {'timeout': 5, 'init_command': 'PRAGMA query_only=ON;'},
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['blog.routers.ReplicaRouter']
+BLOG_READ_REPLICAS = [alias for alias in os.environ.get('BLOG_READ_REPLICAS', '').split(',') if alias]
+BLOG_REPLICA_STICKY_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    # Generation-tagged blocks from blog.caching are also kept per process
+    # in front of the shared cache; everything else goes straight through
+    'default': {
+        'BACKEND': 'blog.cache_backends.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_KEY_PATTERN': (
+                r'^(featured_posts|categories_with_counts|latest_posts|trending_posts(_\d+)?|archive_months|site_stats):[^:]+$'
+            ),
+            'LOCAL_MAX_ENTRIES': 256,
+            'LOCAL_TIMEOUT': 60,
+        },
+    },
+    # One SQLite file (WAL mode) shared by every worker process on the host,
+    # so counters, rate limits and cached blocks agree across processes.
+    # Tests keep a fresh per-process cache instead.
+    'shared': {
+        'BACKEND': 'blog.cache_backends.InstrumentedSQLiteCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CLEANUP_INTERVAL': 60,
+        },
+    } if not TESTING else {
+        'BACKEND': 'blog.cache_backends.InstrumentedLocMemCache',
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,3 +212,113 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Blog settings
+
+# Maximum number of relevance-ranked results returned by full-text search
+BLOG_SEARCH_MAX_RESULTS = 1000
+
+# Cached search results (ordered post ids per normalized query): lifetime in
+# seconds, the match count above which a search is not cached (remembered for
+# BROAD_TIMEOUT seconds) and how many searches are kept at most
+BLOG_SEARCH_CACHE_TIMEOUT = 10 * 60
+BLOG_SEARCH_CACHE_MAX_IDS = 5000
+BLOG_SEARCH_CACHE_BROAD_TIMEOUT = 60
+BLOG_SEARCH_CACHE_MAX_QUERIES = 2000
+
+# In-process autocomplete index: memory budget (bytes), whether each process
+# builds it in the background on its first request (otherwise on the first
+# lookup) and how many index entries one query term may scan
+BLOG_SUGGESTION_INDEX_MAX_BYTES = 16 * 1024 * 1024
+BLOG_SUGGESTION_INDEX_PRELOAD = not TESTING
+BLOG_SUGGESTION_MAX_SCAN = 5000
+
+# Use keyset (cursor) pagination for the HTML post lists; ?cursor= opts in per request
+BLOG_CURSOR_PAGINATION = False
+
+# Write-behind counters (likes, views): seconds between flushes and the
+# number of pending posts that forces an early flush. Tests flush explicitly;
+# a background flush would write into whichever test happens to be running
+BLOG_COUNTER_FLUSH_INTERVAL = 10 if not TESTING else 0
+BLOG_COUNTER_MAX_PENDING = 1000
+
+# How long a visitor's likes are remembered for deduplication (seconds)
+BLOG_LIKE_DEDUP_TTL = 60 * 60 * 24 * 30
+
+# Count post_detail page views into daily PostStats buckets
+BLOG_TRACK_VIEWS = True
+
+# Sliding-window rate limits per client IP ('N/period', period in s/m/h/d,
+# e.g. '100/10m'); a missing or None scope is not limited
+BLOG_RATE_LIMITS = {
+    'comment': '3/h',
+    'like': '30/m',
+    'search_suggestions': '120/m',
+}
+
+# Trending posts: score added per event, score half-life (seconds), and how
+# long the rendered top lists are cached. Run rebuild_trending after
+# changing the half-life.
+BLOG_TRENDING_WEIGHTS = {'comment': 5.0, 'like': 3.0, 'view': 1.0}
+BLOG_TRENDING_HALF_LIFE = 60 * 60 * 24
+BLOG_TRENDING_CACHE_TIMEOUT = 5 * 60
+
+# Default timeout for cache entries invalidated through blog.caching tags
+BLOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Stampede protection for cached blocks: how long a recompute may hold the
+# lock, and how long an expired value may still be served while it runs
+BLOG_CACHE_LOCK_TIMEOUT = 30
+BLOG_CACHE_STALE_GRACE = 5 * 60
+
+# Content-similarity related posts: list length and where the TF-IDF model lives.
+# Saves refresh the lists from a background thread (in tests, on commit),
+# re-ranking only the saved post's most similar candidates
+BLOG_RELATED_TOP_K = 5
+BLOG_RELATED_INDEX_DIR = BASE_DIR / 'var'
+BLOG_RELATED_UPDATE_IN_BACKGROUND = not TESTING
+BLOG_RELATED_MAX_CANDIDATES = 200
+
+# Per-request metrics: raise QueryBudgetExceeded when a view goes over its
+# @query_budget (development and tests), otherwise only log a warning
+BLOG_QUERY_BUDGET_RAISE = DEBUG or TESTING
+
+# Where request metrics are logged (BLOG_METRICS_LOG environment variable to
+# move it; tests log nowhere). Every worker process appends to the same file,
+# so it is not rotated in-process: WatchedFileHandler reopens it once an
+# external rotation moves it away, e.g. a logrotate entry such as
+#     /srv/blog/var/request_metrics.log { daily rotate 14 compress delaycompress missingok }
+BLOG_METRICS_LOG = None if TESTING else Path(
+    os.environ.get('BLOG_METRICS_LOG') or BASE_DIR / 'var' / 'request_metrics.log'
+)
+
+# Route the AJAX endpoints to the native async views in blog.async_views;
+# myproject.asgi turns this on, WSGI deployments keep the sync views
+BLOG_ASYNC_AJAX = os.environ.get('BLOG_ASYNC_AJAX') == '1'
+
+(BASE_DIR / 'var').mkdir(exist_ok=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'metrics_file': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': BLOG_METRICS_LOG,
+            'formatter': 'message',
+        } if BLOG_METRICS_LOG else {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        'blog.metrics': {
+            'handlers': ['metrics_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}